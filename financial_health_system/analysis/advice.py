@@ -0,0 +1,222 @@
+# analysis/advice.py
+import abc
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .utils import RATIO_FIELDS
+
+logger = logging.getLogger(__name__)
+
+READY = "ready"
+PENDING = "pending"
+FALLBACK = "fallback"
+DISABLED = "disabled"
+
+DEFAULTS = {
+    "BACKEND": "analysis.advice.OpenAICompatibleBackend",
+    "BASE_URL": "https://api.openai.com/v1",
+    "MODEL": "gpt-3.5-turbo",
+    "API_KEY_ENV": "OPENAI_API_KEY",
+    "TIMEOUT": 10.0,
+    "RETRIES": 2,
+    "MAX_CONCURRENCY": 4,
+    "CACHE_TTL": 7 * 24 * 3600,
+    "FALLBACK_TTL": 300,
+    "BUCKET": 2.5,
+}
+
+PROMPT = """You are a senior financial advisor specializing in Sri Lankan small and medium enterprises (SMEs).
+Your task is to analyze the company's financial health and provide actionable advice.
+
+Here is the company's financial summary:
+{summary}
+
+Overall Financial Health Category: {category}
+
+Please provide:
+1. A short summary (4–6 lines) explaining the company's current financial situation.
+2. Identify which metric(s) are the most concerning and why.
+3. Recommend 3–5 practical actions the company can take to improve financial performance.
+4. Maintain a professional, supportive tone suitable for Sri Lankan SMEs.
+"""
+
+
+class AdviceBackendError(Exception):
+    """A backend call failed; it is retried, then the rule-based report is shown."""
+
+
+def llm_config() -> Optional[dict]:
+    """ANALYSIS_LLM_ADVICE merged over DEFAULTS; None when LLM advice is off."""
+    configured = getattr(settings, "ANALYSIS_LLM_ADVICE", None)
+    if not configured:
+        return None
+    return {**DEFAULTS, **configured}
+
+
+def bucket_ratios(ratios: Dict[str, float], size: float) -> Dict[str, float]:
+    """Round each ratio to the nearest ``size`` so similar companies share one cached answer."""
+    return {name: round((ratios.get(name) or 0.0) / size) * size for name in RATIO_FIELDS}
+
+
+def cache_key(bucketed: Dict[str, float], category: str, model: str) -> str:
+    payload = json.dumps([model, category, [bucketed[name] for name in RATIO_FIELDS]])
+    return "analysis:llm-advice:" + hashlib.sha1(payload.encode()).hexdigest()
+
+
+# ───────────────────────────────────────────────────────────────
+# Backends
+# ───────────────────────────────────────────────────────────────
+class AdviceBackend(abc.ABC):
+    """Blocking advice generator; run off the request path by AdviceService."""
+
+    def __init__(self, config: dict):
+        self.config = config
+
+    @abc.abstractmethod
+    def generate(self, ratios: Dict[str, float], category: str) -> str:
+        """Advice text for one company; raise AdviceBackendError on failure."""
+
+
+class OpenAICompatibleBackend(AdviceBackend):
+    """
+    POSTs to ``{BASE_URL}/chat/completions`` with the standard library, so
+    any OpenAI-compatible server (or a local stub) works without the SDK.
+    """
+
+    def generate(self, ratios: Dict[str, float], category: str) -> str:
+        summary = "\n".join(f"- {name.replace('_', ' ').title()}: {value:.2f}%" for name, value in ratios.items())
+        body = json.dumps({
+            "model": self.config["MODEL"],
+            "messages": [
+                {"role": "system",
+                 "content": "You are an expert SME financial advisor offering practical, data-driven advice."},
+                {"role": "user", "content": PROMPT.format(summary=summary, category=category)},
+            ],
+            "temperature": 0.7,
+            "max_tokens": 600,
+        }).encode()
+        headers = {"Content-Type": "application/json"}
+        api_key = os.getenv(self.config["API_KEY_ENV"] or "", "")
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        request = urllib.request.Request(self.config["BASE_URL"].rstrip("/") + "/chat/completions",
+                                         data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.config["TIMEOUT"]) as response:
+                data = json.load(response)
+            return data["choices"][0]["message"]["content"].strip()
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            # OSError covers URLError, HTTPError and socket timeouts
+            raise AdviceBackendError(str(e)) from e
+
+
+# ───────────────────────────────────────────────────────────────
+# Non-Blocking Service
+# ───────────────────────────────────────────────────────────────
+class AdviceService:
+    """
+    Runs backend calls on a bounded thread pool (MAX_CONCURRENCY) with
+    per-attempt timeouts and retries, and caches answers in the Django
+    cache under bucketed ratios + category. Callers never wait: ``advice``
+    returns the cached text or schedules a call and reports PENDING. A call
+    that keeps failing caches FALLBACK for FALLBACK_TTL, telling callers to
+    show the rule-based report instead.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.backend: AdviceBackend = import_string(config["BACKEND"])(config)
+        self._executor = ThreadPoolExecutor(max_workers=config["MAX_CONCURRENCY"],
+                                            thread_name_prefix="llm-advice")
+        self._in_flight: Dict[str, Future] = {}
+        # Re-entrant: a future that is already done runs its callback inside schedule()
+        self._lock = threading.RLock()
+
+    def _key(self, ratios: Dict[str, float], category: str) -> Tuple[str, Dict[str, float]]:
+        bucketed = bucket_ratios(ratios, self.config["BUCKET"])
+        return cache_key(bucketed, category, self.config["MODEL"]), bucketed
+
+    def _call(self, key: str, bucketed: Dict[str, float], category: str) -> Tuple[str, str]:
+        attempts = self.config["RETRIES"] + 1
+        for attempt in range(attempts):
+            try:
+                text = self.backend.generate(bucketed, category)
+                result = (READY, text)
+                cache.set(key, result, self.config["CACHE_TTL"])
+                return result
+            except AdviceBackendError as e:
+                logger.warning("LLM advice attempt %d/%d failed: %s", attempt + 1, attempts, e)
+                if attempt + 1 < attempts:
+                    time.sleep(min(2 ** attempt * 0.5, 5.0))
+            except Exception:
+                logger.exception("LLM advice backend crashed")
+                break
+        result = (FALLBACK, None)
+        cache.set(key, result, self.config["FALLBACK_TTL"])
+        return result
+
+    def _finished(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def schedule(self, ratios: Dict[str, float], category: str) -> Future:
+        """Start (or join) the backend call for these ratios; returns its Future of (status, text)."""
+        key, bucketed = self._key(ratios, category)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(self._call, key, bucketed, category)
+                self._in_flight[key] = future
+                future.add_done_callback(lambda f: self._finished(key, f))
+        return future
+
+    def advice(self, ratios: Dict[str, float], category: str) -> Tuple[str, Optional[str]]:
+        """(READY, text), (FALLBACK, None), or (PENDING, None) after scheduling a call."""
+        key, _ = self._key(ratios, category)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        self.schedule(ratios, category)
+        return PENDING, None
+
+
+_service: Optional[AdviceService] = None
+_service_config: Optional[dict] = None
+_service_lock = threading.Lock()
+
+
+def get_advice_service() -> Optional[AdviceService]:
+    """The process-wide service for the current settings; None when LLM advice is off."""
+    global _service, _service_config
+    config = llm_config()
+    if config is None:
+        return None
+    with _service_lock:
+        if _service is None or _service_config != config:
+            if _service is not None:
+                _service._executor.shutdown(wait=False)
+            _service, _service_config = AdviceService(config), config
+    return _service
+
+
+def llm_advice(ratios: Dict[str, float], category: str) -> Tuple[str, Optional[str]]:
+    """
+    Non-blocking LLM advice lookup: (READY, text), or (PENDING | FALLBACK |
+    DISABLED, None), where the caller shows the rule-based report.
+    """
+    service = get_advice_service()
+    if service is None:
+        return DISABLED, None
+    return service.advice(ratios, category)
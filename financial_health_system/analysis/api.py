@@ -0,0 +1,180 @@
+# analysis/api.py
+import hmac
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .extraction import FIELD_KEYWORDS, is_pnl
+from .ingest import save_parsed
+from .ml.serving import predict_ml_scores
+from .models import FinancialRecord
+from .utils import RATIO_FIELDS, advice_codes, calculate_weighted_scores, ratios_from_figures
+from .whatif import simulate
+
+FIGURE_FIELDS = ("total_income", "gross_profit", "admin_expenses", "distribution_costs", "finance_costs")
+
+
+class PayloadError(ValueError):
+    """Raised for a malformed scoring payload; reported back as HTTP 400."""
+
+
+def _number(item: dict, field: str, index: int, required: bool = True) -> float:
+    value = item.get(field)
+    if value is None and not required:
+        return 0.0
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise PayloadError(f"items[{index}].{field} must be a number")
+    return float(value)
+
+
+def _parse_items(payload) -> Tuple[List[dict], bool]:
+    """Accept a single object, a list, or {"items": [...], "persist": bool}."""
+    persist = False
+    if isinstance(payload, dict) and "items" in payload:
+        persist = bool(payload.get("persist", False))
+        items = payload["items"]
+    elif isinstance(payload, dict):
+        persist = bool(payload.pop("persist", False))
+        items = [payload]
+    else:
+        items = payload
+    if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+        raise PayloadError("Expected a non-empty list of objects")
+    max_items = getattr(settings, "ANALYSIS_API_MAX_BATCH", 10000)
+    if len(items) > max_items:
+        raise PayloadError(f"At most {max_items} items per request")
+    return items, persist
+
+
+def _ratio_columns(items: List[dict]) -> Dict[str, np.ndarray]:
+    """
+    Build the five ratio columns for all items. Items carrying raw figures
+    (``total_income`` …) have their ratios computed in one vectorized pass;
+    the others must supply the ratios directly.
+    """
+    columns = {name: np.zeros(len(items)) for name in RATIO_FIELDS}
+    figure_rows = [i for i, item in enumerate(items) if "total_income" in item]
+    ratio_rows = [i for i, item in enumerate(items) if "total_income" not in item]
+
+    if figure_rows:
+        figures = {f: [_number(items[i], f, i) for i in figure_rows] for f in FIGURE_FIELDS}
+        net_profit = [
+            _number(items[i], "net_profit", i) if "net_profit" in items[i]
+            else figures["gross_profit"][n] - (figures["admin_expenses"][n] + figures["distribution_costs"][n]
+                                               + figures["finance_costs"][n])
+            for n, i in enumerate(figure_rows)
+        ]
+        growth = [_number(items[i], "revenue_growth_rate", i, required=False) for i in figure_rows]
+        computed = ratios_from_figures(figures["total_income"], figures["gross_profit"], figures["admin_expenses"],
+                                       figures["distribution_costs"], figures["finance_costs"], net_profit, growth)
+        for name in RATIO_FIELDS:
+            columns[name][figure_rows] = computed[name]
+
+    for i in ratio_rows:
+        for name in RATIO_FIELDS:
+            columns[name][i] = _number(items[i], name, i, required=(name != "revenue_growth_rate"))
+    return columns
+
+
+def _persist_allowed(request) -> bool:
+    token = getattr(settings, "ANALYSIS_API_TOKEN", None)
+    scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+    return bool(token) and scheme.lower() == "bearer" and hmac.compare_digest(supplied.strip(), token)
+
+
+def _persist(items: List[dict]) -> List[dict]:
+    """
+    Save figure items through the bulk ingest path (growth from history
+    when the item has none, previous-period links, company trends).
+    Returns the items with the growth rate each record was stored with.
+    """
+    parsed = []
+    for i, item in enumerate(items):
+        values = {field: item.get(field) for field in FIELD_KEYWORDS}
+        if "net_profit" in item:
+            values["net_profit"] = item["net_profit"]
+        if not is_pnl(values):
+            raise PayloadError(f"items[{i}]: Missing key fields like 'Total Income' or 'Gross Profit'.")
+        parsed.append(({"file": f"items[{i}]", "company": str(item.get("company_name", "Unknown")),
+                        "period": str(item.get("period", "N/A")), "status": "error", "error": None}, values))
+    report = save_parsed(parsed)
+    growth = dict(FinancialRecord.objects.filter(id__in=[entry["record_id"] for entry in report])
+                  .values_list("id", "revenue_growth_rate"))
+    return [dict(item, revenue_growth_rate=growth[entry["record_id"]] or 0.0, record_id=entry["record_id"])
+            for item, entry in zip(items, report)]
+
+
+@csrf_exempt
+@require_POST
+def score_api(request):
+    """
+    Stateless JSON scoring. POST one object, a list, or
+    ``{"items": [...], "persist": false}``. Each item carries either raw
+    P&L figures or the five ratios. Nothing is saved unless ``persist`` is
+    true, which needs raw figures plus company_name/period and a bearer
+    token matching ANALYSIS_API_TOKEN. Saved items are scored with the
+    growth rate they were stored with, so the response matches the rows.
+    """
+    try:
+        items, persist = _parse_items(json.loads(request.body or b"null"))
+        columns = _ratio_columns(items)
+        if persist and any("total_income" not in item for item in items):
+            raise PayloadError("persist requires raw figures (total_income, gross_profit, ...) for every item")
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if persist:
+        if not _persist_allowed(request):
+            return JsonResponse({"error": "persist requires a valid API token"}, status=403)
+        try:
+            items = _persist(items)
+        except PayloadError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        columns = _ratio_columns(items)
+
+    batch = calculate_weighted_scores(columns)
+    ml_scores, ml_version = predict_ml_scores(columns)
+
+    results = []
+    for i, item in enumerate(items):
+        ratios = {name: float(columns[name][i]) for name in RATIO_FIELDS}
+        category = str(batch.categories[i])
+        results.append({
+            "score": float(batch.scores[i]),
+            "category": category,
+            "contributions": {label: float(values[i]) for label, values in batch.contributions.items()},
+            "ratios": ratios,
+            "advice_codes": list(advice_codes(ratios, category)),
+            "ml_score": float(ml_scores[i]) if ml_scores is not None else None,
+        })
+        if persist:
+            results[-1]["record_id"] = item["record_id"]
+
+    return JsonResponse({"count": len(results), "ml_model_version": ml_version or None, "results": results})
+
+
+@csrf_exempt
+@require_POST
+def whatif_api(request, record_id):
+    """
+    What-if grid for a saved record. POST ``{"ranges": {"admin_expenses":
+    {"min": -20, "max": 0, "steps": 5}, ...}, "grid": false}``; figures
+    move in percent, revenue_growth_rate in percentage points. Returns the
+    sensitivity per input and the smallest changes that cross a category
+    threshold (see analysis/whatif.py). Nothing is saved.
+    """
+    record = get_object_or_404(FinancialRecord, pk=record_id)
+    try:
+        payload = json.loads(request.body or b"{}")
+        if not isinstance(payload, dict):
+            raise PayloadError("Expected a JSON object")
+        result = simulate(record, payload.get("ranges"), include_grid=bool(payload.get("grid", False)))
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(result)
@@ -1,6 +1,33 @@
+import django
 from django.apps import AppConfig
 
 
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Pre-5.1 stand-in for the sqlite init_command option."""
+    from django.conf import settings
+
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            for pragma in settings.ANALYSIS_SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+
+
 class AnalysisConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "analysis"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+        from . import summaries
+        from .models import FinancialScore
+
+        # Keep ScoreSummary current for single saves and deletes; bulk paths call summaries directly
+        pre_save.connect(summaries.score_pre_save, sender=FinancialScore, dispatch_uid="summary_pre_save")
+        post_save.connect(summaries.score_post_save, sender=FinancialScore, dispatch_uid="summary_post_save")
+        pre_delete.connect(summaries.score_pre_delete, sender=FinancialScore, dispatch_uid="summary_pre_delete")
+        post_delete.connect(summaries.score_post_delete, sender=FinancialScore, dispatch_uid="summary_post_delete")
+
+        if django.VERSION < (5, 1):
+            connection_created.connect(apply_sqlite_pragmas, dispatch_uid="analysis_sqlite_pragmas")
@@ -0,0 +1,359 @@
+# analysis/benchmark.py
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.db import transaction
+
+from .extraction import FIELD_KEYWORDS, extract_fields, keyword_pattern, read_pnl_fields
+
+# Row labels that match none of the FIELD_KEYWORDS patterns
+FILLER_LABELS = (
+    "Opening Stock", "Purchases", "Closing Stock", "Depreciation", "Rent & Rates", "Salaries & Wages",
+    "Electricity", "Telephone", "Printing & Stationery", "Repairs & Maintenance", "Audit Fee",
+    "Bank Charges", "Insurance", "Motor Vehicle Running", "Donations", "Sundry",
+)
+
+# Must not be imported by starting Django and loading the URLconf / JSON API;
+# only the code paths that use them import them
+HEAVY_MODULES = ("pandas", "openpyxl", "openai", "dotenv", "sklearn", "joblib")
+
+_STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+import analysis.urls, analysis.api
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+# csv_extract / parquet_extract cover reading and extraction, like read_excel + extract_fields
+STAGES = ("read_excel", "get_value_anywhere", "extract_fields", "csv_extract", "parquet_extract",
+          "calculate_weighted_score", "generate_rule_based_advice", "db_write", "upload_pnl")
+
+
+# ───────────────────────────────────────────────────────────────
+# Synthetic P&L Workbooks
+# ───────────────────────────────────────────────────────────────
+def generate_workbook(rows: int, seed: int = 0, years: int = 3, merged: bool = True) -> Tuple[bytes, Dict[str, float]]:
+    """
+    Deterministic synthetic P&L sheet with about ``rows`` rows. For a given
+    seed it varies the label column, which keyword synonym names each
+    field, where the field rows sit among filler rows, and (with ``merged``)
+    merges title and label cells. Returns (xlsx bytes, expected field values).
+    """
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    width = 2 + years
+
+    expected = {
+        "total_income": float(rng.randrange(50_000, 5_000_000)),
+        "revenue_growth_rate": round(rng.uniform(-20, 40), 2),
+    }
+    expected["gross_profit"] = round(expected["total_income"] * rng.uniform(0.2, 0.6), 2)
+    for name, share in (("admin_expenses", 0.2), ("distribution_costs", 0.1), ("finance_costs", 0.05)):
+        expected[name] = round(expected["gross_profit"] * rng.uniform(0.01, share * 2), 2)
+
+    field_rows = {}
+    for name, keywords in FIELD_KEYWORDS.items():
+        # The first synonym that matches decides the value, so use exactly one per field
+        field_rows[name] = rng.choice(keywords)
+    positions = sorted(rng.sample(range(2, max(rows, len(field_rows) + 2)), len(field_rows)))
+    placement = dict(zip(positions, rng.sample(list(field_rows), len(field_rows))))
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append([f"Synthetic Co {seed} (Pvt) Ltd"])
+    sheet.append(["Profit & Loss Statement", None] + [str(2025 - years + 1 + y) for y in range(years)])
+    if merged:
+        sheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=width)
+
+    for position in range(2, max(rows, len(field_rows) + 2)):
+        label_column = rng.randrange(2)
+        history = [round(rng.uniform(0, 10_000), 2) for _ in range(years)]
+        if position in placement:
+            name = placement[position]
+            label = field_rows[name]
+            label = rng.choice((label, label.upper(), f"  {label} ", label.replace(" ", "\u00a0")))
+            history[-1] = expected[name]
+        else:
+            label = rng.choice(FILLER_LABELS)
+        cells = [None, None] + history
+        cells[label_column] = label
+        sheet.append(cells)
+        if merged and label_column == 0 and rng.random() < 0.2:
+            sheet.merge_cells(start_row=sheet.max_row, start_column=1, end_row=sheet.max_row, end_column=2)
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue(), expected
+
+
+def _check_filler_labels() -> None:
+    patterns = [keyword_pattern(k) for keywords in FIELD_KEYWORDS.values() for k in keywords]
+    clashes = [label for label in FILLER_LABELS if any(p.search(label.lower()) for p in patterns)]
+    assert not clashes, f"Filler labels match field keywords: {clashes}"
+
+
+# ───────────────────────────────────────────────────────────────
+# Stage Timings
+# ───────────────────────────────────────────────────────────────
+def _timed(fn: Callable, *args, **kwargs) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "runs": len(samples),
+    }
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _exports(df) -> Dict[str, bytes]:
+    """The sheet as the CSV (and, with pyarrow, Parquet) export a client would send."""
+    exports = {"csv_extract": df.to_csv(header=False, index=False).encode()}
+    if _has_pyarrow():
+        buffer = io.BytesIO()
+        # Parquet columns are typed: mixed text/number columns become text, as an export would write them
+        typed = df.apply(lambda column: column.astype("string") if column.dtype == object else column)
+        typed.columns = [f"c{i}" for i in range(typed.shape[1])]
+        typed.to_parquet(buffer, index=False)
+        exports["parquet_extract"] = buffer.getvalue()
+    return exports
+
+
+def benchmark_size(rows: int, iterations: int, client, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """Time every stage on ``iterations`` distinct workbooks of ``rows`` rows (stages without samples are left out)."""
+    import pandas as pd
+    from django.urls import reverse
+
+    from .ingest import build_result, compute_ratios
+    from .utils import calculate_weighted_score, generate_rule_based_advice
+    from .views import get_value_anywhere
+
+    samples = {stage: [] for stage in STAGES}
+    for i in range(iterations):
+        # A fresh workbook per iteration, so the duplicate-upload cache never short-circuits parsing
+        data, _ = generate_workbook(rows, seed=seed * 1_000_003 + rows * 1_009 + i)
+
+        elapsed, df = _timed(pd.read_excel, io.BytesIO(data), header=None)
+        samples["read_excel"].append(elapsed)
+
+        start = time.perf_counter()
+        values = {name: get_value_anywhere(df, keywords) for name, keywords in FIELD_KEYWORDS.items()}
+        samples["get_value_anywhere"].append(time.perf_counter() - start)
+
+        samples["extract_fields"].append(_timed(extract_fields, df)[0])
+
+        for stage, export in _exports(df).items():
+            elapsed, export_values = _timed(read_pnl_fields, io.BytesIO(export))
+            if export_values != values:
+                raise RuntimeError(f"{stage} extracted {export_values}, the workbook {values}")
+            samples[stage].append(elapsed)
+
+        record, financial_score, _ = build_result(f"Bench {i}", "2025", values)
+        elapsed, (_, category, _, _) = _timed(calculate_weighted_score, record)
+        samples["calculate_weighted_score"].append(elapsed)
+        samples["generate_rule_based_advice"].append(
+            _timed(generate_rule_based_advice, compute_ratios(record), category)[0])
+
+        try:
+            with transaction.atomic():
+                start = time.perf_counter()
+                record.save()
+                financial_score.record = record
+                financial_score.save()
+                samples["db_write"].append(time.perf_counter() - start)
+
+                upload = io.BytesIO(data)
+                upload.name = "bench.xlsx"
+                elapsed, response = _timed(client.post, reverse("upload_pnl"),
+                                           {"company_name": f"Bench {i}", "period": "2025", "file": upload})
+                if b"Financial Health Report" not in response.content:
+                    raise RuntimeError(f"upload_pnl did not produce a report for a {rows}-row workbook")
+                samples["upload_pnl"].append(elapsed)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    return {stage: _summary(values) for stage, values in samples.items() if values}
+
+
+# ───────────────────────────────────────────────────────────────
+# Concurrent Writes
+# ───────────────────────────────────────────────────────────────
+_CONCURRENT_UPLOAD = b"Total Income,1000\nGross Profit,400\nAdministrative Expenses,120\nFinance Costs,25\n"
+
+
+def _write_uploads(prefix: str, count: int) -> List[str]:
+    """Worker-process job: ``count`` full uploads (extract, score, atomic save); returns the errors."""
+    from django.db import connections
+
+    from .ingest import process_upload
+
+    errors = []
+    try:
+        for i in range(count):
+            try:
+                process_upload(io.BytesIO(_CONCURRENT_UPLOAD), f"{prefix}-{i}", "2025")
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+    finally:
+        connections.close_all()
+    return errors
+
+
+def benchmark_concurrent_writes(workers=(1, 2, 4, 8), uploads: int = 200,
+                                runs: int = 1) -> Dict[str, Dict[str, float]]:
+    """
+    Upload throughput with N worker processes writing at once, each on its
+    own connection. Per N: seconds per upload (summary over ``runs``),
+    uploads/second of the best run, and failed uploads ("database is
+    locked"). Needs a database other processes can open, so not an
+    in-memory SQLite one.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from django.db import connection, connections
+
+    if connection.vendor == "sqlite" and connection.is_in_memory_db():
+        raise RuntimeError("Concurrent writes need a file or server database, not in-memory SQLite")
+
+    results = {}
+    for count in workers:
+        samples, errors = [], []
+        for run in range(runs):
+            # Forked workers must not share the parent's connection
+            connections.close_all()
+            shares = [uploads // count + (1 if i < uploads % count else 0) for i in range(count)]
+            with ProcessPoolExecutor(max_workers=count) as pool:
+                start = time.perf_counter()
+                futures = [pool.submit(_write_uploads, f"Concurrent {count}.{run}.{i}", share)
+                           for i, share in enumerate(shares)]
+                for future in futures:
+                    errors.extend(future.result())
+                samples.append((time.perf_counter() - start) / uploads)
+        results[f"workers_{count}"] = dict(_summary(samples), uploads_per_second=1 / min(samples),
+                                           errors=len(errors))
+        if errors:
+            results[f"workers_{count}"]["first_error"] = errors[0]
+    return results
+
+
+def probe_startup() -> dict:
+    """
+    Cold start in a fresh interpreter: django.setup() plus importing the
+    URLconf and the JSON API. Returns {"seconds": ..., "heavy": [modules]}.
+    """
+    from django.conf import settings
+
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE",
+                                                                 "financial_health_system.settings"))
+    result = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=str(settings.BASE_DIR), env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark_startup(runs: int = 5) -> Dict[str, Dict[str, float]]:
+    probes = [probe_startup() for _ in range(runs)]
+    heavy = sorted({module for probe in probes for module in probe["heavy"]})
+    if heavy:
+        raise RuntimeError(f"Startup imports heavy modules eagerly: {', '.join(heavy)}")
+    return {"django_setup_and_urls": _summary([probe["seconds"] for probe in probes])}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=(50, 1000, 10000), iterations: int = 5, client=None, seed: int = 0,
+                   progress: Optional[Callable[[int], None]] = None, startup_runs: int = 5,
+                   concurrency=(), concurrent_uploads: int = 200) -> dict:
+    """
+    Benchmark cold startup, every sheet size and, for each worker count in
+    ``concurrency``, concurrent upload writes; the returned dict is the JSON
+    report. Raises RuntimeError if any concurrent upload failed.
+    """
+    import django
+    import pandas as pd
+    from django.test import Client
+
+    _check_filler_labels()
+    client = client or Client()
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "pandas": pd.__version__,
+            "iterations": iterations,
+            "seed": seed,
+        },
+        "results": {},
+    }
+    if startup_runs:
+        report["results"]["startup"] = benchmark_startup(startup_runs)
+    for rows in sizes:
+        if progress:
+            progress(rows)
+        report["results"][str(rows)] = benchmark_size(rows, iterations, client, seed)
+    if concurrency:
+        writes = benchmark_concurrent_writes(concurrency, concurrent_uploads, runs=iterations)
+        report["results"]["concurrent_writes"] = writes
+        failed = {name: result["first_error"] for name, result in writes.items() if result["errors"]}
+        if failed:
+            raise RuntimeError(f"Concurrent uploads failed: {failed}")
+    return report
+
+
+def compare_reports(baseline: dict, current: dict, tolerance: float = 0.25, statistic: str = "median",
+                    min_seconds: float = 1e-4) -> List[Dict[str, object]]:
+    """
+    Stages whose ``statistic`` grew by more than ``tolerance`` (0.25 = 25%)
+    over the baseline. Stages faster than ``min_seconds`` in both reports
+    are timer noise and never count.
+    """
+    regressions = []
+    for size, stages in current["results"].items():
+        for stage, timing in stages.items():
+            before = baseline.get("results", {}).get(size, {}).get(stage)
+            if not before or not before.get(statistic):
+                continue
+            if max(timing[statistic], before[statistic]) < min_seconds:
+                continue
+            ratio = timing[statistic] / before[statistic]
+            if ratio > 1 + tolerance:
+                regressions.append({"rows": size, "stage": stage, "baseline": before[statistic],
+                                    "current": timing[statistic], "ratio": ratio})
+    return regressions
@@ -0,0 +1,95 @@
+# analysis/charts.py
+import hashlib
+import json
+import uuid
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import FinancialScore, ScoreSummary
+from .trends import period_sort_key
+
+VERSION_KEY = "analysis:chart-data:version"
+
+
+def _ttl() -> int:
+    return getattr(settings, "ANALYSIS_CHART_CACHE_SECONDS", 300)
+
+
+# ───────────────────────────────────────────────────────────────
+# Data Version (cache only, never the database)
+# ───────────────────────────────────────────────────────────────
+def data_version() -> str:
+    """
+    Token that changes whenever scores are added, rescored or deleted
+    (summaries.apply_deltas bumps it on commit). It lives in the cache with
+    the chart payloads, so an unknown or evicted version just starts a new
+    one. Serves as the chart ETag.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex[:16], _ttl())
+        version = cache.get(VERSION_KEY) or ""
+    return version
+
+
+def bump_data_version() -> None:
+    cache.set(VERSION_KEY, uuid.uuid4().hex[:16], _ttl())
+
+
+def cached_payload(name: str, params: dict, build: Callable[[], dict]) -> str:
+    """JSON for one chart, built once per data version and parameter set."""
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    key = f"analysis:chart:{name}:{data_version()}:{digest}"
+    body = cache.get(key)
+    if body is None:
+        body = json.dumps(build())
+        cache.set(key, body, _ttl())
+    return body
+
+
+# ───────────────────────────────────────────────────────────────
+# Chart Payloads
+# ───────────────────────────────────────────────────────────────
+def score_distribution(period: Optional[str] = None, bins: int = 10) -> dict:
+    """Histogram of weighted_score from the in-memory peer index."""
+    from .ranking import score_histogram
+
+    histogram = score_histogram(period, bins)
+    return {
+        "period": period,
+        "labels": [f"{b['low']:.0f}-{b['high']:.0f}" for b in histogram],
+        "counts": [b["count"] for b in histogram],
+    }
+
+
+def category_mix(limit: int = 24) -> dict:
+    """
+    High/Medium/Low counts for the latest ``limit`` periods, oldest first,
+    from ScoreSummary. Periods are ordered parsed ("Dec 2024" before
+    "Jan 2025"), not as label text.
+    """
+    rows = sorted(ScoreSummary.objects.filter(dimension=ScoreSummary.PERIOD, count__gt=0)
+                  .values_list("key", "high_count", "medium_count", "low_count"),
+                  key=lambda row: period_sort_key(row[0]))[-limit:]
+    return {
+        "periods": [row[0] for row in rows],
+        "High": [row[1] for row in rows],
+        "Medium": [row[2] for row in rows],
+        "Low": [row[3] for row in rows],
+    }
+
+
+def company_series(company: str) -> dict:
+    """One company's scores by parsed period (record_company_period_idx), then upload order."""
+    rows = sorted(FinancialScore.objects.filter(record__company_name=company)
+                  .order_by("record_id")
+                  .values_list("record__period", "weighted_score", "category"),
+                  key=lambda row: period_sort_key(row[0])) if company else []
+    return {
+        "company": company,
+        "periods": [row[0] for row in rows],
+        "scores": [row[1] for row in rows],
+        "categories": [row[2] for row in rows],
+    }
@@ -0,0 +1,144 @@
+# analysis/export.py
+import csv
+import io
+import tempfile
+from datetime import timezone as dt_timezone
+from typing import Iterable, Iterator, Tuple
+
+from django.utils import timezone
+
+from .filters import filter_scores
+from .models import FinancialScore
+
+CSV = "csv"
+XLSX = "xlsx"
+EXPORT_FORMATS = (CSV, XLSX)
+
+CONTENT_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# (header, lookup from FinancialScore)
+EXPORT_COLUMNS = (
+    ("record_id", "record_id"),
+    ("company_name", "record__company_name"),
+    ("period", "record__period"),
+    ("uploaded_at", "record__uploaded_at"),
+    ("total_income", "record__total_income"),
+    ("gross_profit", "record__gross_profit"),
+    ("admin_expenses", "record__admin_expenses"),
+    ("distribution_costs", "record__distribution_costs"),
+    ("finance_costs", "record__finance_costs"),
+    ("net_profit", "record__net_profit"),
+    ("revenue_growth_rate", "record__revenue_growth_rate"),
+    ("net_profit_margin", "net_profit_margin"),
+    ("expense_ratio", "expense_ratio"),
+    ("gross_profit_margin", "gross_profit_margin"),
+    ("finance_cost_ratio", "finance_cost_ratio"),
+    ("weighted_score", "weighted_score"),
+    ("category", "category"),
+)
+HEADERS = tuple(header for header, _ in EXPORT_COLUMNS)
+_UPLOADED_AT = HEADERS.index("uploaded_at")
+
+EXPORT_CHUNK_SIZE = 2000
+CSV_BATCH_ROWS = 1000
+XLSX_READ_BYTES = 64 * 1024
+# Excel's row limit, header included; longer exports continue on a new sheet
+XLSX_MAX_ROWS = 1_048_576
+
+
+# ───────────────────────────────────────────────────────────────
+# Rows (one joined query, read through a server-side cursor)
+# ───────────────────────────────────────────────────────────────
+def export_rows(params, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Filtered record + score rows in id order, with the dashboard filters.
+    ``values_list`` over the record join and ``.iterator()`` keep memory at
+    one chunk of tuples however many rows match.
+    """
+    scores, _ = filter_scores(FinancialScore.objects.all(), params)
+    return scores.order_by("id").values_list(*(lookup for _, lookup in EXPORT_COLUMNS)).iterator(
+        chunk_size=chunk_size)
+
+
+def export_filename(fmt: str) -> str:
+    return f"financial_scores_{timezone.now():%Y%m%d_%H%M%S}.{fmt}"
+
+
+# ───────────────────────────────────────────────────────────────
+# Writers
+# ───────────────────────────────────────────────────────────────
+def iter_csv(rows: Iterable[tuple], batch_rows: int = CSV_BATCH_ROWS) -> Iterator[str]:
+    """CSV text: the header at once, then one string per ``batch_rows`` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADERS)
+    yield _drain(buffer)
+
+    pending = 0
+    for row in rows:
+        uploaded_at = row[_UPLOADED_AT]
+        if uploaded_at is not None:
+            row = (*row[:_UPLOADED_AT], uploaded_at.isoformat(), *row[_UPLOADED_AT + 1:])
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_rows:
+            yield _drain(buffer)
+            pending = 0
+    if pending:
+        yield _drain(buffer)
+
+
+def _drain(buffer: io.StringIO) -> str:
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+
+def _xlsx_row(row: tuple) -> tuple:
+    uploaded_at = row[_UPLOADED_AT]
+    if uploaded_at is not None and timezone.is_aware(uploaded_at):
+        # Excel has no time zones; cells hold UTC
+        row = (*row[:_UPLOADED_AT], timezone.make_naive(uploaded_at, dt_timezone.utc), *row[_UPLOADED_AT + 1:])
+    return row
+
+
+def iter_xlsx(rows: Iterable[tuple], read_bytes: int = XLSX_READ_BYTES) -> Iterator[bytes]:
+    """
+    XLSX bytes from an openpyxl write-only workbook. Rows go straight to
+    the workbook's temporary sheet files, so memory stays flat; the zip is
+    only complete once every row is written, so bytes start after that.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows = None, XLSX_MAX_ROWS
+    for row in rows:
+        if sheet_rows >= XLSX_MAX_ROWS:
+            sheet = workbook.create_sheet(f"scores_{len(workbook.worksheets) + 1}" if sheet else "scores")
+            sheet.append(HEADERS)
+            sheet_rows = 1
+        sheet.append(_xlsx_row(row))
+        sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet("scores").append(HEADERS)
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(read_bytes)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_stream(params, fmt: str = CSV) -> Tuple[Iterator, str]:
+    """(chunk iterator, content type) for one export; nothing is queried until iteration starts."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}.")
+    writer = iter_xlsx if fmt == XLSX else iter_csv
+    return writer(export_rows(params)), CONTENT_TYPES[fmt]
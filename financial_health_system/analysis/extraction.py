@@ -0,0 +1,469 @@
+# analysis/extraction.py
+import csv
+import hashlib
+import io
+import json
+import math
+import numbers
+import re
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .metrics import observe_upload, stage
+
+# ───────────────────────────────────────────────────────────────
+# P&L Field Keywords (checked in priority order per field)
+# ───────────────────────────────────────────────────────────────
+FIELD_KEYWORDS: Dict[str, List[str]] = {
+    "total_income": ["Total Income", "Total Revenue", "Income"],
+    "gross_profit": ["Gross Profit"],
+    "admin_expenses": ["Total ADMINISTRATIVE EXPENSES", "Administrative Expenses", "Administration"],
+    "distribution_costs": ["Total DISTRIBUTION COSTS", "Distribution Costs", "Selling & Distribution"],
+    "finance_costs": ["Total FINANCE AND OTHER", "Finance Costs", "Financial Expenses", "Interest"],
+    "revenue_growth_rate": ["Revenue Growth", "Growth Rate"],
+}
+
+# Fields a sheet may leave out on purpose: ingest reads them with default=None
+# so "no growth row" (filled from history) differs from an explicit 0%
+OPTIONAL_FIELDS = ("revenue_growth_rate",)
+
+# Bump when matching rules change in a way the keyword lists do not show
+EXTRACTOR_REVISION = 1
+
+# Identifies the extraction rules; cached results from other versions are ignored
+EXTRACTION_VERSION = hashlib.sha1(
+    json.dumps([EXTRACTOR_REVISION, FIELD_KEYWORDS], sort_keys=True).encode()
+).hexdigest()[:12]
+
+
+def normalize_label(text: str) -> str:
+    """Normalize a text cell the same way for indexing and matching."""
+    return text.strip().replace("\u00A0", " ").lower()
+
+
+def keyword_pattern(keyword: str) -> "re.Pattern":
+    """Flexible regex for partial matches (handles missing or extra spaces)."""
+    return re.compile(keyword.lower().replace(" ", ".*"))
+
+
+def as_number(value) -> Optional[float]:
+    """Coerce a cell to float like ``pd.to_numeric(errors="coerce")``; None if not numeric."""
+    if isinstance(value, str):
+        if "_" in value:
+            return None
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+    elif isinstance(value, numbers.Number):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+    else:
+        return None
+    return None if math.isnan(number) else number
+
+
+def split_row(cells: Iterable) -> tuple:
+    """Return (normalized text labels, rightmost numeric value) for one sheet row."""
+    labels = []
+    rightmost = None
+    for cell in cells:
+        if cell is None:
+            continue
+        if type(cell) is float:
+            # Fast path for the common case; NaN is an empty cell
+            if cell == cell:
+                rightmost = cell
+            continue
+        if isinstance(cell, str):
+            labels.append(normalize_label(cell))
+        number = as_number(cell)
+        if number is not None:
+            rightmost = number
+    return labels, rightmost
+
+
+# ───────────────────────────────────────────────────────────────
+# Single-Pass Label Index
+# ───────────────────────────────────────────────────────────────
+class LabelIndex:
+    """
+    Label → row index built in one pass over a sheet.
+
+    Every distinct normalized text cell maps to the rightmost numeric value
+    of the first row it appears in (None if that row has no numbers).
+    Insertion order follows row order, so the first label matching a
+    keyword is the first matching row of the sheet.
+    """
+
+    def __init__(self):
+        self._labels: Dict[str, Optional[float]] = {}
+
+    def add_row(self, cells: Iterable) -> None:
+        labels, rightmost = split_row(cells)
+        for label in labels:
+            self._labels.setdefault(label, rightmost)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> "LabelIndex":
+        index = cls()
+        for row in rows:
+            index.add_row(row)
+        return index
+
+    @classmethod
+    def from_dataframe(cls, df) -> "LabelIndex":
+        return cls.from_rows(df.itertuples(index=False, name=None))
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def lookup(self, keywords: Sequence[str], default: Optional[float] = 0.0) -> Optional[float]:
+        """
+        Resolve one field: the first row matching the first keyword that has
+        any match wins, and its rightmost number is returned. A matched row
+        without numbers falls through to the next keyword.
+        """
+        for keyword in keywords:
+            pattern = keyword_pattern(keyword)
+            for label, value in self._labels.items():
+                if pattern.search(label):
+                    if value is not None:
+                        return value
+                    break
+        return default
+
+    def extract(self, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                default: Optional[float] = 0.0) -> Dict[str, Optional[float]]:
+        return {name: self.lookup(keywords, default) for name, keywords in fields.items()}
+
+
+def extract_fields(df, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                   default: Optional[float] = 0.0) -> Dict[str, Optional[float]]:
+    """Normalize the sheet once and resolve every requested field from the label index."""
+    return LabelIndex.from_dataframe(df).extract(fields, default)
+
+
+# ───────────────────────────────────────────────────────────────
+# Streaming, Early-Exit Extraction
+# ───────────────────────────────────────────────────────────────
+_PENDING = object()
+
+
+class StreamingExtractor:
+    """
+    Resolves fields row by row as a sheet is read.
+
+    Only the keyword hits are kept (one value per keyword), never the rows.
+    A field is final once every keyword ahead of its best hit has matched,
+    so ``feed`` can report when nothing left in the sheet can change the
+    result and the reader may stop.
+    """
+
+    def __init__(self, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS):
+        self._patterns = {name: [keyword_pattern(k) for k in keywords] for name, keywords in fields.items()}
+        self._hits = {name: [_PENDING] * len(keywords) for name, keywords in fields.items()}
+        self._open = set(fields)
+        self.rows_read = 0
+
+    @property
+    def done(self) -> bool:
+        return not self._open
+
+    def feed(self, cells: Iterable) -> bool:
+        """Consume one row; returns True once every field is final."""
+        self.rows_read += 1
+        labels, rightmost = split_row(cells)
+        if not labels:
+            return self.done
+
+        for name in list(self._open):
+            hits = self._hits[name]
+            for i, pattern in enumerate(self._patterns[name]):
+                if hits[i] is _PENDING and any(pattern.search(label) for label in labels):
+                    hits[i] = rightmost
+                if hits[i] is not None and hits[i] is not _PENDING:
+                    break
+            if self._is_final(hits):
+                self._open.discard(name)
+        return self.done
+
+    @staticmethod
+    def _is_final(hits: list) -> bool:
+        for hit in hits:
+            if hit is _PENDING:
+                return False
+            if hit is not None:
+                return True
+        return True
+
+    def result(self, default: Optional[float] = 0.0) -> Dict[str, Optional[float]]:
+        values = {}
+        for name, hits in self._hits.items():
+            values[name] = next((h for h in hits if h is not None and h is not _PENDING), default)
+        return values
+
+
+# ───────────────────────────────────────────────────────────────
+# Format Detection
+# ───────────────────────────────────────────────────────────────
+XLSX = "xlsx"
+XLS = "xls"
+CSV = "csv"
+PARQUET = "parquet"
+
+_SIGNATURES = (
+    (b"PK\x03\x04", XLSX),
+    (b"PAR1", PARQUET),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", XLS),
+)
+
+
+def detect_format(file) -> str:
+    """Sniff the file signature without consuming the file; anything unrecognised is read as CSV text."""
+    head = file.read(8)
+    file.seek(0)
+    for signature, name in _SIGNATURES:
+        if head.startswith(signature):
+            return name
+    return CSV
+
+
+def is_xlsx(file) -> bool:
+    """Sniff the zip signature of an OOXML workbook without consuming the file."""
+    return detect_format(file) == XLSX
+
+
+def fill_missing(values: Dict[str, Optional[float]], default: float = 0.0) -> Dict[str, Optional[float]]:
+    """Replace missing (None) figures with ``default``, leaving OPTIONAL_FIELDS as None."""
+    return {name: default if value is None and name not in OPTIONAL_FIELDS else value
+            for name, value in values.items()}
+
+
+def is_pnl(values: Dict[str, Optional[float]]) -> bool:
+    """A sheet is a P&L when it yields both essential figures."""
+    return bool(values.get("total_income")) and bool(values.get("gross_profit"))
+
+
+def stream_extract(file, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                   default: Optional[float] = 0.0, sheet: Optional[str] = None) -> Dict[str, Optional[float]]:
+    """
+    Read one sheet (the first unless ``sheet`` names another) of an .xlsx
+    workbook in openpyxl read-only mode and stop as soon as every field is
+    resolved. Peak memory does not grow with the number of rows.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        return _stream_worksheet(worksheet, fields, default)
+    finally:
+        workbook.close()
+
+
+def _stream_worksheet(worksheet, fields: Dict[str, Sequence[str]],
+                      default: Optional[float]) -> Dict[str, Optional[float]]:
+    extractor = StreamingExtractor(fields)
+    for row in worksheet.iter_rows(values_only=True):
+        if extractor.feed(row):
+            break
+    observe_upload(rows=extractor.rows_read)
+    return extractor.result(default)
+
+
+# --- CSV / Parquet exports: same label matching, no Excel parsing ---
+_NUMBER_START = frozenset("0123456789-+. ")
+_NUMBER = re.compile(r"-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d*)?|-?\.\d+")
+
+
+def csv_cell(text: str):
+    """
+    One CSV field as the matching Excel cell would read: empty → None, a
+    number, including accounting formats ("1,250.00", "(300)"), → float,
+    text as is. Numbers must not stay text, or every figure would be
+    matched against the keywords as a label.
+    """
+    if not text:
+        return None
+    if text[0] in _NUMBER_START and "_" not in text:
+        try:
+            return float(text)
+        except ValueError:
+            pass
+    if "," not in text and "(" not in text:
+        return text
+    stripped = text.strip()
+    negative = stripped.startswith("(") and stripped.endswith(")")
+    body = stripped[1:-1].strip() if negative else stripped
+    if _NUMBER.fullmatch(body):
+        number = float(body.replace(",", ""))
+        return -number if negative else number
+    return text
+
+
+def sniff_delimiter(sample: str, candidates: str = ",;\t|") -> str:
+    """
+    The candidate that splits the most of the first 50 lines (comma on a
+    tie). ``csv.Sniffer`` gives up on ragged P&L exports with empty cells.
+    """
+    lines = sample.splitlines()[:50]
+    return max(candidates, key=lambda d: sum(1 for row in csv.reader(lines, delimiter=d) if len(row) > 1))
+
+
+def csv_extract(file, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                default: Optional[float] = 0.0) -> Dict[str, Optional[float]]:
+    """
+    Stream a CSV export row by row through StreamingExtractor, stopping as
+    soon as every field is resolved. The delimiter is sniffed from the
+    first 64 KB.
+    """
+    delimiter = sniff_delimiter(file.read(65536).decode("utf-8-sig", errors="replace"))
+    file.seek(0)
+
+    extractor = StreamingExtractor(fields)
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        for row in csv.reader(text, delimiter=delimiter):
+            if extractor.feed([csv_cell(cell) for cell in row]):
+                break
+    finally:
+        # Leave the caller's file open
+        text.detach()
+    observe_upload(rows=extractor.rows_read)
+    return extractor.result(default)
+
+
+def parquet_extract(file, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                    default: Optional[float] = 0.0, batch_size: int = 4096) -> Dict[str, Optional[float]]:
+    """
+    Read a Parquet export by record batch, projecting only the text (label)
+    and numeric (figure) columns. Numeric columns without nulls reach numpy
+    without a copy. Stops after the batch in which every field is resolved.
+    """
+    try:
+        import pyarrow.parquet as pq
+        import pyarrow.types as pat
+    except ImportError:
+        raise ValueError("Reading Parquet requires pyarrow (pip install pyarrow)")
+
+    def wanted(data_type) -> bool:
+        if pat.is_dictionary(data_type):
+            data_type = data_type.value_type
+        return (pat.is_string(data_type) or pat.is_large_string(data_type) or pat.is_integer(data_type)
+                or pat.is_floating(data_type) or pat.is_decimal(data_type))
+
+    parquet = pq.ParquetFile(file)
+    columns = [field.name for field in parquet.schema_arrow if wanted(field.type)]
+    extractor = StreamingExtractor(fields)
+    if columns:
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+            arrays = [column.to_numpy(zero_copy_only=False) for column in batch.columns]
+            if any(extractor.feed(row) for row in zip(*arrays)):
+                break
+    observe_upload(rows=extractor.rows_read)
+    return extractor.result(default)
+
+
+def read_pnl_fields(file, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                    default: Optional[float] = 0.0, streaming: bool = True,
+                    sheet: Optional[str] = None) -> Dict[str, Optional[float]]:
+    """
+    Extract P&L fields from an uploaded workbook or CSV/Parquet export,
+    streaming when the format allows it. ``sheet`` applies to workbooks only.
+    """
+    file_format = detect_format(file)
+    if file_format == CSV:
+        with stage("csv_extract"):
+            return csv_extract(file, fields, default)
+    if file_format == PARQUET:
+        with stage("parquet_extract"):
+            return parquet_extract(file, fields, default)
+    if streaming and file_format == XLSX:
+        with stage("stream_extract"):
+            return stream_extract(file, fields, default, sheet)
+
+    import pandas as pd
+    with stage("read_excel"):
+        df = pd.read_excel(file, header=None, sheet_name=sheet if sheet is not None else 0)
+    observe_upload(rows=len(df))
+    with stage("extract"):
+        return extract_fields(df, fields, default)
+
+
+def _open_source(source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else open(source, "rb")
+
+
+def read_pnl_file(source, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                  default: Optional[float] = 0.0, streaming: bool = True,
+                  sheet: Optional[str] = None) -> Dict[str, Optional[float]]:
+    """
+    Picklable entry point for worker processes: ``source`` is a filesystem
+    path or the raw bytes of a workbook. Does not touch Django.
+    """
+    with _open_source(source) as file:
+        return read_pnl_fields(file, fields, default, streaming, sheet)
+
+
+# ───────────────────────────────────────────────────────────────
+# Multi-Sheet Workbooks
+# ───────────────────────────────────────────────────────────────
+def list_sheets(source) -> Optional[List[str]]:
+    """
+    Sheet names of an .xlsx workbook, read from the workbook part only (no
+    sheet is parsed). None for other formats, which cannot be read one
+    sheet at a time; use ``read_all_sheets`` for those.
+    """
+    from openpyxl import load_workbook
+
+    with _open_source(source) as file:
+        if not is_xlsx(file):
+            return None
+        workbook = load_workbook(file, read_only=True, data_only=True, keep_links=False)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+
+
+def read_pnl_sheets(source, sheets: Sequence[str], fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                    default: Optional[float] = 0.0) -> List[tuple]:
+    """
+    Picklable job for a batch of sheets of one .xlsx source: the workbook
+    (and its shared strings) is opened once and each named sheet streamed
+    in turn. Returns (sheet, values, error) per sheet, in the given order;
+    a sheet that fails to parse does not stop the others.
+    """
+    from openpyxl import load_workbook
+
+    results = []
+    with _open_source(source) as file:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            for sheet in sheets:
+                try:
+                    results.append((sheet, _stream_worksheet(workbook[sheet], fields, default), None))
+                except Exception as e:
+                    results.append((sheet, None, str(e)))
+        finally:
+            workbook.close()
+    return results
+
+
+def read_all_sheets(source, fields: Dict[str, Sequence[str]] = FIELD_KEYWORDS,
+                    default: Optional[float] = 0.0) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Fields of every sheet of a workbook from a single ``pd.read_excel`` pass
+    (sheet → values). A CSV or Parquet export is one unnamed sheet ("").
+    """
+    import pandas as pd
+
+    with _open_source(source) as file:
+        if detect_format(file) in (CSV, PARQUET):
+            return {"": read_pnl_fields(file, fields, default)}
+        with stage("read_excel"):
+            frames = pd.read_excel(file, header=None, sheet_name=None)
+    with stage("extract"):
+        return {str(name): extract_fields(df, fields, default) for name, df in frames.items()}
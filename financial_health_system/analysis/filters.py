@@ -0,0 +1,49 @@
+# analysis/filters.py
+from typing import Optional, Tuple
+
+from django.db.models import QuerySet
+
+FILTER_PARAMS = ("company", "period", "category", "min_score", "max_score")
+
+
+def parse_float(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def parse_int(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def filter_scores(queryset: QuerySet, params, record_prefix: str = "record__",
+                  score_prefix: str = "") -> Tuple[QuerySet, dict]:
+    """
+    Apply the dashboard filters (company, period, category, score range),
+    shared by the dashboard, exports and the export_scores command.
+    ``queryset`` is of FinancialScore by default; pass record_prefix="" and
+    score_prefix="financialscore__" to filter a FinancialRecord queryset.
+    Returns the filtered queryset and the cleaned filter values.
+    """
+    filters = {
+        "company": (params.get("company") or "").strip(),
+        "period": (params.get("period") or "").strip(),
+        "category": (params.get("category") or "").strip(),
+        "min_score": parse_float(params.get("min_score")),
+        "max_score": parse_float(params.get("max_score")),
+    }
+    if filters["company"]:
+        queryset = queryset.filter(**{f"{record_prefix}company_name": filters["company"]})
+    if filters["period"]:
+        queryset = queryset.filter(**{f"{record_prefix}period": filters["period"]})
+    if filters["category"]:
+        queryset = queryset.filter(**{f"{score_prefix}category": filters["category"]})
+    if filters["min_score"] is not None:
+        queryset = queryset.filter(**{f"{score_prefix}weighted_score__gte": filters["min_score"]})
+    if filters["max_score"] is not None:
+        queryset = queryset.filter(**{f"{score_prefix}weighted_score__lte": filters["max_score"]})
+    return queryset, filters
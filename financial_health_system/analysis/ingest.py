@@ -0,0 +1,386 @@
+# analysis/ingest.py
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .extraction import (EXTRACTION_VERSION, FIELD_KEYWORDS, fill_missing, is_pnl, list_sheets, read_all_sheets,
+                         read_pnl_file, read_pnl_fields, read_pnl_sheets)
+from .metrics import stage
+from .ml.serving import apply_ml_scores
+from .models import FinancialRecord, FinancialScore, UploadFingerprint
+from .summaries import score_row, scores_added
+from .trends import backfill_trends, is_ordered_period, resolve_growth, update_company_trend
+from .utils import calculate_weighted_score, compact_advice, render_advice
+
+# Workbooks plus the CSV / Parquet exports read_pnl_fields detects
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm", ".xls", ".csv", ".parquet", ".pq")
+
+
+class IngestError(ValueError):
+    """Raised when a workbook cannot be turned into a financial record."""
+
+
+# ───────────────────────────────────────────────────────────────
+# Record Building (shared by single and bulk uploads)
+# ───────────────────────────────────────────────────────────────
+def compute_ratios(record) -> Dict[str, float]:
+    """Ratios stored on FinancialScore and fed to the advisory engine."""
+    return {
+        "net_profit_margin": (record.net_profit / record.total_income) * 100,
+        "expense_ratio": ((record.admin_expenses + record.distribution_costs + record.finance_costs) / record.total_income) * 100,
+        "gross_profit_margin": (record.gross_profit / record.total_income) * 100,
+        "finance_cost_ratio": (record.finance_costs / record.total_income) * 100,
+        "revenue_growth_rate": record.revenue_growth_rate or 0
+    }
+
+
+def build_result(company: str, period: str, values: Dict[str, float]) -> Tuple[FinancialRecord, FinancialScore, dict]:
+    """
+    Build unsaved FinancialRecord/FinancialScore objects from extracted figures.
+    Returns (record, score, details) where details carries the contributions,
+    ratios and advisory text for display.
+    """
+    total_income = values["total_income"]
+    gross_profit = values["gross_profit"]
+
+    # --- Validate essential fields ---
+    if total_income == 0 or gross_profit == 0:
+        raise IngestError("Missing key fields like 'Total Income' or 'Gross Profit'.")
+
+    # --- Compute derived metric (unless the caller supplies it, as the JSON API may) ---
+    net_profit = values.get("net_profit")
+    if net_profit is None:
+        net_profit = gross_profit - (values["admin_expenses"] + values["distribution_costs"] + values["finance_costs"])
+
+    record = FinancialRecord(
+        company_name=company,
+        period=period,
+        total_income=total_income,
+        gross_profit=gross_profit,
+        admin_expenses=values["admin_expenses"],
+        distribution_costs=values["distribution_costs"],
+        finance_costs=values["finance_costs"],
+        net_profit=net_profit,
+        revenue_growth_rate=values["revenue_growth_rate"] or 0
+    )
+
+    with stage("score"):
+        score, category, suggestion, contributions = calculate_weighted_score(record)
+        ratios = compute_ratios(record)
+    with stage("advice"):
+        codes, _ = compact_advice(ratios, category)
+        advisory = render_advice(codes, ratios)
+
+    financial_score = FinancialScore(
+        record=record,
+        net_profit_margin=ratios["net_profit_margin"],
+        expense_ratio=ratios["expense_ratio"],
+        gross_profit_margin=ratios["gross_profit_margin"],
+        finance_cost_ratio=ratios["finance_cost_ratio"],
+        weighted_score=score,
+        category=category,
+        advice_codes=",".join(codes)
+    )
+    return record, financial_score, {"contributions": contributions, "ratios": ratios, "advisory": advisory}
+
+
+def describe_result(record: FinancialRecord, financial_score: FinancialScore) -> dict:
+    """Display details for an already-saved result, without re-reading the workbook."""
+    _, _, _, contributions = calculate_weighted_score(record)
+    return {"contributions": contributions, "ratios": compute_ratios(record), "advisory": financial_score.advice}
+
+
+# ───────────────────────────────────────────────────────────────
+# Duplicate Upload Cache (content hash → record)
+# ───────────────────────────────────────────────────────────────
+def find_duplicate(digest: str) -> Optional[FinancialRecord]:
+    """Record previously extracted from identical bytes under the current keyword lists."""
+    fingerprint = (UploadFingerprint.objects
+                   .select_related("record__financialscore")
+                   .filter(digest=digest, extraction_version=EXTRACTION_VERSION)
+                   .first())
+    return fingerprint.record if fingerprint else None
+
+
+def remember_upload(digest: str, record: FinancialRecord) -> None:
+    try:
+        with transaction.atomic():
+            UploadFingerprint.objects.create(digest=digest, extraction_version=EXTRACTION_VERSION, record=record)
+    except IntegrityError:
+        # A concurrent upload of the same bytes got there first
+        pass
+
+
+def values_from_record(record: FinancialRecord) -> Dict[str, Optional[float]]:
+    """
+    The extracted figures of a saved record, keyed like FIELD_KEYWORDS.
+    Growth only carries over when it came from the sheet; growth derived
+    from the record's own history is None, to be resolved for the copy.
+    """
+    values = {name: getattr(record, name) for name in FIELD_KEYWORDS}
+    from_sheet = record.growth_source == FinancialRecord.GROWTH_FROM_SHEET or (
+        record.growth_source == "" and record.revenue_growth_rate)
+    if not from_sheet:
+        values["revenue_growth_rate"] = None
+    return values
+
+
+def process_upload(file, company: str, period: str,
+                   digest: Optional[str] = None) -> Tuple[FinancialRecord, FinancialScore, dict]:
+    """
+    Turn one uploaded workbook into a saved record and score, reusing the
+    duplicate cache when ``digest`` is known. The "reuse" policy returns the
+    earlier record only when its company and period match too; otherwise
+    the cached figures are copied to a new record, as with "copy". Raises
+    IngestError when the essential fields are missing.
+    """
+    with stage("dedup_lookup"):
+        duplicate = find_duplicate(digest) if digest else None
+    policy = getattr(settings, "ANALYSIS_DUPLICATE_UPLOAD_POLICY", "reuse")
+
+    if (duplicate is not None and policy == "reuse"
+            and (duplicate.company_name, duplicate.period) == (company, period)):
+        return duplicate, duplicate.financialscore, describe_result(duplicate, duplicate.financialscore)
+
+    if duplicate is not None:
+        values = values_from_record(duplicate)
+    else:
+        # --- Extract key metrics dynamically (one pass over the sheet) ---
+        values = fill_missing(read_pnl_fields(file, default=None,
+                                              streaming=getattr(settings, "ANALYSIS_STREAMING_EXTRACTION", True)))
+
+    with stage("history"):
+        values, previous, growth_source = resolve_growth(company, period, values)
+    record, financial_score, details = build_result(company, period, values)
+    record.previous_record, record.growth_source = previous, growth_source
+    with stage("ml_score"):
+        apply_ml_scores([financial_score])
+
+    # --- Save financial record and score ---
+    with stage("db_write"), transaction.atomic():
+        record.save()
+        financial_score.record = record
+        financial_score.save()
+        update_company_trend(record, financial_score)
+        if digest and duplicate is None:
+            remember_upload(digest, record)
+    return record, financial_score, details
+
+
+# ───────────────────────────────────────────────────────────────
+# Bulk Ingestion
+# ───────────────────────────────────────────────────────────────
+def infer_company_period(name: str, default_period: str = "N/A") -> Tuple[str, str]:
+    """``Company__Period.xlsx`` → (Company, Period); otherwise the file stem is the company."""
+    stem = Path(name).stem
+    if "__" in stem:
+        company, period = stem.split("__", 1)
+        return company.strip() or stem, period.strip() or default_period
+    return stem, default_period
+
+
+def _is_workbook(name: str) -> bool:
+    base = os.path.basename(name)
+    return (name.lower().endswith(WORKBOOK_EXTENSIONS)
+            and not base.startswith((".", "~$"))
+            and not name.startswith("__MACOSX/"))
+
+
+def iter_sources(path) -> Iterator[Tuple[str, object]]:
+    """
+    Yield (name, source) pairs from a directory, a ZIP archive (path or
+    file object) or a single workbook path. ``source`` is a path or bytes,
+    both of which can be sent to a worker process.
+    """
+    if isinstance(path, (str, os.PathLike)) and os.path.isdir(path):
+        for entry in sorted(Path(path).rglob("*")):
+            if entry.is_file() and _is_workbook(entry.name):
+                yield str(entry.relative_to(path)), str(entry)
+        return
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            # An .xlsx is itself a zip; only treat archives without a workbook part as bundles
+            if "[Content_Types].xml" not in archive.namelist():
+                for info in archive.infolist():
+                    if not info.is_dir() and _is_workbook(info.filename):
+                        yield info.filename, archive.read(info)
+                return
+
+    if isinstance(path, (str, os.PathLike)):
+        yield os.path.basename(path), str(path)
+    else:
+        path.seek(0)
+        yield os.path.basename(getattr(path, "name", None) or "upload.xlsx"), path.read()
+
+
+def _worker_count(workers: Optional[int] = None) -> int:
+    return workers or getattr(settings, "ANALYSIS_BULK_WORKERS", None) or os.cpu_count() or 1
+
+
+def _run_parsers(parser, jobs: List[Tuple[str, tuple]],
+                 workers: Optional[int] = None) -> List[Tuple[str, Optional[dict], Optional[str]]]:
+    """Run ``parser(*args)`` for each (name, args) job in a process pool; (name, values, error) in input order."""
+    workers = _worker_count(workers)
+    results = []
+    if workers == 1 or len(jobs) < 2:
+        for name, args in jobs:
+            try:
+                results.append((name, parser(*args), None))
+            except Exception as e:
+                results.append((name, None, str(e)))
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [(name, pool.submit(parser, *args)) for name, args in jobs]
+        for name, future in futures:
+            try:
+                results.append((name, future.result(), None))
+            except Exception as e:
+                results.append((name, None, str(e)))
+    return results
+
+
+def parse_sources(sources: List[Tuple[str, object]], workers: Optional[int] = None) -> List[Tuple[str, Optional[dict], Optional[str]]]:
+    """Extract every workbook in a process pool; returns (name, values, error) in input order."""
+    return _run_parsers(read_pnl_file, [(name, (source, FIELD_KEYWORDS, None)) for name, source in sources], workers)
+
+
+def bulk_save(results: List[Tuple[FinancialRecord, FinancialScore]], chunk_size: int = 500) -> None:
+    """Insert unsaved (record, score) pairs with chunked bulk_create in one transaction."""
+    with transaction.atomic():
+        records = FinancialRecord.objects.bulk_create([record for record, _ in results], batch_size=chunk_size)
+        for (_, score), record in zip(results, records):
+            score.record = record
+        FinancialScore.objects.bulk_create([score for _, score in results], batch_size=chunk_size)
+        scores_added(score_row(score, record) for record, score in results)
+
+
+def save_parsed(parsed: List[Tuple[dict, Optional[dict]]], chunk_size: int = 500) -> List[dict]:
+    """
+    Score each (report entry, values) pair whose entry has no error yet,
+    write them with chunked ``bulk_create`` in one transaction and fill in
+    the entries. Returns the entries.
+    """
+    report = []
+    pending = []
+    for entry, values in parsed:
+        if entry["error"] is None:
+            try:
+                values = fill_missing(values)
+                record, score, _ = build_result(entry["company"], entry["period"], values)
+                if values["revenue_growth_rate"] is not None:
+                    record.growth_source = FinancialRecord.GROWTH_FROM_SHEET
+                pending.append((entry, record, score))
+            except IngestError as e:
+                entry["error"] = str(e)
+        report.append(entry)
+
+    apply_ml_scores(score for _, _, score in pending)
+    bulk_save([(record, score) for _, record, score in pending], chunk_size)
+
+    # Growth from earlier periods (possibly in the same batch), and company trends, in one vectorized pass
+    if pending:
+        backfill_trends({record.company_name for _, record, _ in pending})
+    final = {score.record_id: score for score in FinancialScore.objects.filter(
+        record_id__in=[record.pk for _, record, _ in pending])}
+
+    for entry, record, score in pending:
+        score = final.get(record.pk, score)
+        entry.update(status="ok", record_id=record.pk, score=score.weighted_score, category=score.category,
+                     ml_score=score.ml_score)
+    return report
+
+
+def ingest_sources(sources: List[Tuple[str, object]], period: str = "N/A",
+                   workers: Optional[int] = None, chunk_size: int = 500) -> List[dict]:
+    """
+    Parse workbooks in parallel, then write all records and scores with
+    chunked ``bulk_create`` in one transaction. Returns a per-file report.
+    """
+    parsed = []
+    for name, values, error in parse_sources(sources, workers):
+        company, file_period = infer_company_period(name, period)
+        parsed.append(({"file": name, "company": company, "period": file_period, "status": "error",
+                        "error": error}, values))
+    return save_parsed(parsed, chunk_size)
+
+
+# ───────────────────────────────────────────────────────────────
+# Multi-Sheet Workbooks (one record per P&L sheet)
+# ───────────────────────────────────────────────────────────────
+def infer_sheet_company_period(sheet: str, company: str, period: str) -> Tuple[str, str]:
+    """
+    ``Company__Period`` sheets set both; a sheet name with a year-like
+    number ("2024", "Mar 2025") is the period of ``company``; any other
+    name ("Subsidiary A") is the company for ``period``.
+    """
+    name = sheet.strip()
+    if "__" in name:
+        sheet_company, sheet_period = name.split("__", 1)
+        return sheet_company.strip() or company, sheet_period.strip() or period
+    if is_ordered_period(name):
+        return company, name
+    return name or company, period
+
+
+def parse_sheets(source, workers: Optional[int] = None) -> List[Tuple[str, Optional[dict], Optional[str]]]:
+    """
+    Extract every sheet of one workbook; (sheet, values, error) in sheet
+    order. The .xlsx sheets are split into one contiguous batch per pool
+    worker, and each worker opens the workbook once for its whole batch.
+    Bytes are spilled to a temporary file first, so jobs carry a path rather
+    than a copy of the workbook. Other formats are read in one
+    ``read_excel`` pass.
+    """
+    sheets = list_sheets(source)
+    if sheets is None:
+        return [(sheet, values, None) for sheet, values in read_all_sheets(source, default=None).items()]
+
+    parts = max(1, min(_worker_count(workers), len(sheets)))
+    step, extra = divmod(len(sheets), parts)
+    batches, start = [], 0
+    for i in range(parts):
+        end = start + step + (1 if i < extra else 0)
+        batches.append(sheets[start:end])
+        start = end
+
+    spilled = None
+    if parts > 1 and isinstance(source, (bytes, bytearray)):
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as spill:
+            spill.write(source)
+        source = spilled = spill.name
+    try:
+        jobs = [(str(i), (source, batch, FIELD_KEYWORDS, None)) for i, batch in enumerate(batches)]
+        results = []
+        for batch, (_, batch_results, error) in zip(batches, _run_parsers(read_pnl_sheets, jobs, parts)):
+            # A batch fails as a whole only when the workbook itself cannot be opened
+            results.extend(batch_results if error is None else [(sheet, None, error) for sheet in batch])
+        return results
+    finally:
+        if spilled:
+            os.remove(spilled)
+
+
+def ingest_sheets(name: str, source, company: str, period: str = "N/A",
+                  workers: Optional[int] = None, chunk_size: int = 500) -> List[dict]:
+    """
+    Score every P&L sheet of one workbook as its own record; sheets without
+    the essential figures (notes, balance sheets) are reported as skipped.
+    Returns a per-sheet report like ``ingest_sources``.
+    """
+    parsed = []
+    for sheet, values, error in parse_sheets(source, workers):
+        sheet_company, sheet_period = infer_sheet_company_period(sheet, company, period)
+        entry = {"file": f"{name} [{sheet}]" if sheet else name, "sheet": sheet, "company": sheet_company, "period": sheet_period,
+                 "status": "error", "error": error}
+        if error is None and not is_pnl(values):
+            entry.update(status="skipped", error="No P&L figures on this sheet")
+        parsed.append((entry, values))
+    return save_parsed(parsed, chunk_size)
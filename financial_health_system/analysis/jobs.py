@@ -0,0 +1,121 @@
+# analysis/jobs.py
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .ingest import IngestError, process_upload
+from .models import UploadJob
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+# ───────────────────────────────────────────────────────────────
+# DB-Backed Upload Queue
+# ───────────────────────────────────────────────────────────────
+def enqueue_upload(file, company: str, period: str, digest: str = "") -> UploadJob:
+    """Store the uploaded file and queue it; returns immediately."""
+    job = UploadJob(company_name=company, period=period, digest=digest)
+    job.file.save(file.name, file, save=False)
+    job.save()
+    if _inprocess_workers():
+        transaction.on_commit(lambda: _get_executor().submit(_drain_queue))
+    return job
+
+
+def claim_next_job() -> Optional[UploadJob]:
+    """
+    Atomically move the oldest pending job to running. The conditional
+    UPDATE makes this safe across threads and processes without row locks.
+    """
+    while True:
+        job = UploadJob.objects.filter(status=UploadJob.PENDING).order_by("created_at").first()
+        if job is None:
+            return None
+        claimed = (UploadJob.objects
+                   .filter(pk=job.pk, status=UploadJob.PENDING)
+                   .update(status=UploadJob.RUNNING, started_at=timezone.now()))
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job: UploadJob) -> UploadJob:
+    """
+    Parse, score and save one claimed job, recording the outcome on it.
+    Failed jobs are not retried, so the stored file is deleted either way.
+    """
+    try:
+        with job.file.open("rb") as file:
+            record, _, _ = process_upload(file, job.company_name, job.period, digest=job.digest or None)
+    except IngestError as e:
+        job.status, job.error = UploadJob.FAILED, str(e)
+    except Exception as e:
+        logger.exception("Upload job %s failed", job.pk)
+        job.status, job.error = UploadJob.FAILED, f"Error: {e}"
+    else:
+        job.status, job.record = UploadJob.DONE, record
+    job.file.delete(save=False)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "record", "file", "finished_at"])
+    return job
+
+
+def requeue_stale_jobs(timeout_seconds: int) -> int:
+    """Return jobs stuck in running (e.g. their worker died) to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    return (UploadJob.objects
+            .filter(status=UploadJob.RUNNING, started_at__lt=cutoff)
+            .update(status=UploadJob.PENDING, started_at=None))
+
+
+def run_worker(poll_interval: float = 1.0, once: bool = False, stale_after: int = 600) -> int:
+    """
+    Process jobs until the queue is empty (``once``) or forever. Returns
+    jobs processed. Jobs left running by a dead worker are requeued on
+    start and then every ``stale_after / 2`` seconds, so they don't wait
+    for the next restart.
+    """
+    processed = 0
+    next_requeue = 0.0
+    while True:
+        close_old_connections()
+        if time.monotonic() >= next_requeue:
+            requeue_stale_jobs(stale_after)
+            next_requeue = time.monotonic() + stale_after / 2
+        job = claim_next_job()
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+
+
+# ───────────────────────────────────────────────────────────────
+# Optional In-Process Worker Pool
+# ───────────────────────────────────────────────────────────────
+def _inprocess_workers() -> int:
+    return getattr(settings, "ANALYSIS_JOB_INPROCESS_WORKERS", 0)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_inprocess_workers(), thread_name_prefix="upload-job")
+    return _executor
+
+
+def _drain_queue() -> None:
+    try:
+        run_worker(once=True)
+    finally:
+        close_old_connections()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from analysis.trends import backfill_trends
+
+
+class Command(BaseCommand):
+    help = ("Link every record to its company's previous period, fill missing revenue growth from it, "
+            "rescore the records that changed and rebuild CompanyTrend.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", action="append", default=None,
+                            help="Only this company (repeatable; default: all)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Companies loaded per pass")
+
+    def handle(self, *args, **options):
+        def progress(totals):
+            self.stdout.write(f"{totals['companies']} companies, {totals['records_updated']} records updated, "
+                              f"{totals['scores_changed']} scores changed")
+
+        totals = backfill_trends(options["company"], options["batch_size"], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {totals['companies']} companies: {totals['records_updated']} records updated, "
+            f"{totals['scores_changed']} scores changed."))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.export import CSV, EXPORT_FORMATS, XLSX, export_stream
+from analysis.filters import FILTER_PARAMS
+
+
+class Command(BaseCommand):
+    help = ("Stream every record and score matching the dashboard filters to CSV or XLSX, "
+            "reading rows in chunks so memory stays flat.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default=None,
+                            help="Output format (default: from the --output extension, else csv)")
+        parser.add_argument("--output", default=None, help="File to write; CSV goes to stdout when omitted")
+        parser.add_argument("--company", default="")
+        parser.add_argument("--period", default="")
+        parser.add_argument("--category", default="")
+        parser.add_argument("--min-score", default="")
+        parser.add_argument("--max-score", default="")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        fmt = options["format"] or (XLSX if output and output.lower().endswith(".xlsx") else CSV)
+        if fmt == XLSX and not output:
+            raise CommandError("XLSX exports need --output.")
+
+        chunks, _ = export_stream({name: options[name] for name in FILTER_PARAMS}, fmt)
+        if output is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+
+        if fmt == XLSX:
+            with open(output, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            with open(output, "w", newline="", encoding="utf-8") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported to {output}."))
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.ingest import infer_company_period, ingest_sheets, ingest_sources, iter_sources
+
+
+class Command(BaseCommand):
+    help = "Score every P&L workbook in a directory or ZIP archive using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Directory, ZIP archive or single workbook")
+        parser.add_argument("--period", default="N/A", help="Period for files not named Company__Period.xlsx")
+        parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Rows per bulk_create batch")
+        parser.add_argument("--all-sheets", action="store_true",
+                            help="Score every P&L sheet of each workbook; sheet names set the company or period")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            sources = list(iter_sources(options["path"]))
+        except OSError as e:
+            raise CommandError(str(e))
+        if not sources:
+            raise CommandError(f"No workbooks found in {options['path']}")
+
+        if options["all_sheets"]:
+            report = []
+            for name, source in sources:
+                company, period = infer_company_period(name, options["period"])
+                report.extend(ingest_sheets(name, source, company, period, workers=options["workers"],
+                                            chunk_size=options["chunk_size"]))
+        else:
+            report = ingest_sources(sources, period=options["period"], workers=options["workers"],
+                                    chunk_size=options["chunk_size"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for entry in report:
+            if entry["status"] == "ok":
+                self.stdout.write(f"OK     {entry['file']}: {entry['score']} ({entry['category']})")
+            elif entry["status"] == "skipped":
+                self.stdout.write(f"SKIP   {entry['file']}: {entry['error']}")
+            else:
+                self.stdout.write(self.style.ERROR(f"ERROR  {entry['file']}: {entry['error']}"))
+        ok = sum(1 for entry in report if entry["status"] == "ok")
+        self.stdout.write(self.style.SUCCESS(f"{ok}/{len(report)} workbooks scored"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from analysis.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = ("Recompute every ScoreSummary row (overall, per period, per company) from FinancialScore "
+            "with GROUP BY queries, replacing the incrementally maintained totals.")
+
+    def handle(self, *args, **options):
+        groups = rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {groups} summary groups."))
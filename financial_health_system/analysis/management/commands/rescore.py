@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import queue
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from analysis.rescoring import checkpoint_path, pending_checkpoints, record_id_bounds, rescore_range, split_id_range
+
+
+def _run_worker(args):
+    # Runs in a child process; each child opens its own DB connection
+    import django
+    django.setup()
+
+    start_id, end_id, chunk_size, checkpoint, messages = args
+    label = f"[{start_id}-{end_id}]"
+
+    def progress(processed, updated, last_id):
+        # The parent writes these to its stdout, which call_command callers may redirect
+        messages.put(f"{label} {processed} rows processed, {updated} updated (last id {last_id})")
+
+    return rescore_range(start_id, end_id, chunk_size, checkpoint, progress)
+
+
+class Command(BaseCommand):
+    help = "Recompute every FinancialScore after WEIGHTS or category thresholds change."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows scored and written per batch")
+        parser.add_argument("--start-id", type=int, default=None, help="First FinancialRecord id to rescore")
+        parser.add_argument("--end-id", type=int, default=None, help="Last FinancialRecord id to rescore")
+        parser.add_argument("--workers", type=int, default=1, help="Processes, each given its own id range")
+        parser.add_argument("--checkpoint", default=None,
+                            help="Checkpoint file prefix; rerunning an interrupted run with the same value resumes")
+        parser.add_argument("--reset", action="store_true",
+                            help="Discard existing checkpoints for --checkpoint and start over")
+
+    def handle(self, *args, **options):
+        checkpoint = options["checkpoint"]
+        pending = pending_checkpoints(checkpoint) if checkpoint else []
+        if pending and options["reset"]:
+            for path, _, _ in pending:
+                os.remove(path)
+            self.stdout.write(f"Removed {len(pending)} checkpoint file(s).")
+            pending = []
+
+        chunk_size = options["chunk_size"]
+        if pending:
+            # An interrupted run keeps its own ranges, even if rows were added since
+            self.stdout.write(f"Resuming {len(pending)} unfinished id range(s) from checkpoint {checkpoint} "
+                              f"(--reset to start over).")
+            jobs = [(start, end, chunk_size, path) for path, start, end in pending]
+        else:
+            lo, hi = record_id_bounds()
+            if lo is None:
+                self.stdout.write("No scores to rescore.")
+                return
+            start_id = options["start_id"] if options["start_id"] is not None else lo
+            end_id = options["end_id"] if options["end_id"] is not None else hi
+            jobs = [
+                (start, end, chunk_size, checkpoint_path(checkpoint, i) if checkpoint else None)
+                for i, (start, end) in enumerate(split_id_range(start_id, end_id, options["workers"]))
+            ]
+
+        if len(jobs) == 1:
+            def progress(processed, updated, last_id):
+                self.stdout.write(f"{processed} rows processed, {updated} updated (last id {last_id})")
+
+            processed, updated = rescore_range(*jobs[0], progress=progress)
+        else:
+            # Children must not inherit the parent's open connection
+            connections.close_all()
+            with multiprocessing.Manager() as manager, multiprocessing.Pool(len(jobs)) as pool:
+                messages = manager.Queue()
+                pending_results = pool.map_async(_run_worker, [job + (messages,) for job in jobs])
+                # Checked in this order, an empty queue after ready() means every message was written
+                while not pending_results.ready() or not messages.empty():
+                    try:
+                        self.stdout.write(messages.get(timeout=0.2))
+                    except queue.Empty:
+                        pass
+                results = pending_results.get()
+            processed = sum(r[0] for r in results)
+            updated = sum(r[1] for r in results)
+
+        self.stdout.write(self.style.SUCCESS(f"Rescored {processed} records; {updated} scores changed."))
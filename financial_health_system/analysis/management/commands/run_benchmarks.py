@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+from analysis.benchmark import compare_reports, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Time each upload stage on synthetic P&L workbooks and write the results as JSON. "
+            "Runs against a throwaway test database, never the configured one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="50,1000,10000", help="Comma-separated sheet row counts")
+        parser.add_argument("--iterations", type=int, default=5, help="Workbooks timed per size")
+        parser.add_argument("--startup-runs", type=int, default=5,
+                            help="Fresh interpreters timed for cold startup (0 = skip)")
+        parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+        parser.add_argument("--concurrency", default="1,2,4,8",
+                            help="Comma-separated upload worker counts for the concurrent-write test (empty = skip)")
+        parser.add_argument("--concurrent-uploads", type=int, default=200,
+                            help="Uploads written per concurrent-write run")
+        parser.add_argument("--output", default=None, help="Write the JSON report here (default: stdout)")
+        parser.add_argument("--compare", default=None, help="Baseline JSON report to check for regressions")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Allowed median slowdown against the baseline (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+            concurrency = [int(count) for count in options["concurrency"].split(",") if count.strip()]
+        except ValueError:
+            raise CommandError("--sizes and --concurrency must be comma-separated integers")
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = run_benchmarks(sizes, options["iterations"], seed=options["seed"],
+                                    progress=lambda rows: self.stderr.write(f"Benchmarking {rows}-row workbooks"),
+                                    startup_runs=options["startup_runs"], concurrency=concurrency,
+                                    concurrent_uploads=options["concurrent_uploads"])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stderr.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        for rows, stages in report["results"].items():
+            line = ", ".join(f"{stage} {timing['median'] * 1000:.2f}ms" for stage, timing in stages.items())
+            self.stderr.write(f"{rows} rows: {line}" if rows.isdigit() else f"{rows}: {line}")
+
+        if baseline is not None:
+            regressions = compare_reports(baseline, report, options["tolerance"])
+            for r in regressions:
+                self.stderr.write(self.style.ERROR(
+                    f"REGRESSION {r['stage']} @ {r['rows']} rows: {r['baseline'] * 1000:.2f}ms -> "
+                    f"{r['current'] * 1000:.2f}ms (x{r['ratio']:.2f})"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} stage(s) slower than the baseline")
+            self.stderr.write(self.style.SUCCESS("No regressions against the baseline"))
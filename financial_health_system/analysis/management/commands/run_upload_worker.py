@@ -0,0 +1,41 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from analysis.jobs import run_worker
+
+
+def _worker_process(poll_interval, once, stale_after):
+    import django
+    django.setup()
+    run_worker(poll_interval, once, stale_after)
+
+
+class Command(BaseCommand):
+    help = "Process queued background uploads (UploadJob rows) with a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between queue polls when idle")
+        parser.add_argument("--stale-after", type=int, default=600,
+                            help="Requeue jobs left running longer than this many seconds "
+                                 "(checked on start and every half of it)")
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+
+    def handle(self, *args, **options):
+        poll, once, stale = options["poll_interval"], options["once"], options["stale_after"]
+        if options["workers"] <= 1:
+            processed = run_worker(poll, once, stale)
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
+            return
+
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_worker_process, args=(poll, once, stale), daemon=True)
+            for _ in range(options["workers"])
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
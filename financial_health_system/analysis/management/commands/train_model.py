@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.ml.training import TrainingError, db_source, file_source, save_artifact, train_streaming
+
+
+class Command(BaseCommand):
+    help = ("Train the health-score model incrementally from stored FinancialScore rows or a "
+            "chunked CSV/Parquet file, report holdout metrics and write a versioned artifact.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--input", default=None,
+                            help="CSV or Parquet file to train from (default: the FinancialScore table)")
+        parser.add_argument("--target", default=None,
+                            help="Target column (default: health_score for files; required for the database, "
+                                 "where weighted_score only relearns the rule-based score)")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows held in memory per chunk")
+        parser.add_argument("--epochs", type=int, default=3, help="Passes over the training rows")
+        parser.add_argument("--holdout", type=float, default=0.1, help="Fraction of rows kept for evaluation")
+        parser.add_argument("--output", default=None, help="Artifact path (default: ANALYSIS_ML_MODEL_PATH)")
+        parser.add_argument("--dry-run", action="store_true", help="Report metrics without writing the artifact")
+
+    def handle(self, *args, **options):
+        if not 0 <= options["holdout"] < 1:
+            raise CommandError("--holdout must be in [0, 1)")
+        try:
+            if options["input"]:
+                source = file_source(options["input"], options["target"] or "health_score",
+                                     options["chunk_size"] or 100000)
+            else:
+                if not options["target"]:
+                    raise CommandError("--target is required when training from the database. weighted_score "
+                                       "is computed from the same ratios, so it only suits a smoke test.")
+                source = db_source(options["target"], options["chunk_size"] or 10000)
+
+            def progress(stage, rows):
+                self.stdout.write(f"{stage}: {rows} training rows")
+
+            model, metadata = train_streaming(source, options["epochs"], options["holdout"], progress=progress)
+        except TrainingError as e:
+            raise CommandError(str(e))
+        metadata["source"] = options["input"] or "database"
+
+        holdout = metadata["holdout"]
+        if holdout["rows"]:
+            r2 = "n/a" if holdout["r2"] is None else f"{holdout['r2']:.4f}"
+            self.stdout.write(f"Holdout ({holdout['rows']} rows): MAE {holdout['mae']:.3f}, "
+                              f"RMSE {holdout['rmse']:.3f}, R² {r2}")
+        if options["dry_run"]:
+            self.stdout.write(json.dumps(metadata, indent=2))
+            return
+
+        output = options["output"] or settings.ANALYSIS_ML_MODEL_PATH
+        metadata = save_artifact(model, metadata, output)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output} (version {metadata['version']})"))
@@ -0,0 +1,182 @@
+# analysis/metrics.py
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger("analysis.slow_requests")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+ROW_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ───────────────────────────────────────────────────────────────
+# Metric Types (per process; thread-safe)
+# ───────────────────────────────────────────────────────────────
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = _labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in snapshot)
+        return lines
+
+
+REGISTRY: list = []
+
+request_seconds = Histogram("analysis_request_seconds", "End-to-end view latency.", LATENCY_BUCKETS, ("view",))
+stage_seconds = Histogram("analysis_stage_seconds", "Time spent in each processing stage.",
+                          LATENCY_BUCKETS, ("view", "stage"))
+upload_bytes = Histogram("analysis_upload_bytes", "Size of uploaded workbooks.", BYTE_BUCKETS, ("view",))
+upload_rows = Histogram("analysis_upload_rows", "Sheet rows read per workbook (streaming stops early).",
+                        ROW_BUCKETS, ("view",))
+slow_requests = Counter("analysis_slow_requests_total", "Requests over ANALYSIS_SLOW_REQUEST_SECONDS.", ("view",))
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ───────────────────────────────────────────────────────────────
+# Request / Stage Timing
+# ───────────────────────────────────────────────────────────────
+class RequestTimer:
+    """Stage breakdown of the request being handled in this context."""
+
+    def __init__(self, view: str):
+        self.view = view
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, float] = {}
+
+
+_current: contextvars.ContextVar[Optional[RequestTimer]] = contextvars.ContextVar("analysis_request_timer",
+                                                                                 default=None)
+
+
+def _view_label() -> str:
+    timer = _current.get()
+    return timer.view if timer else "background"
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into ``analysis_stage_seconds`` and the current request's breakdown."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timer = _current.get()
+        stage_seconds.observe(elapsed, _view_label(), name)
+        if timer is not None:
+            timer.stages[name] += elapsed
+
+
+def observe_upload(size_bytes: Optional[int] = None, rows: Optional[int] = None) -> None:
+    view = _view_label()
+    timer = _current.get()
+    if size_bytes is not None:
+        upload_bytes.observe(size_bytes, view)
+        if timer is not None:
+            timer.counts["bytes"] = size_bytes
+    if rows is not None:
+        upload_rows.observe(rows, view)
+        if timer is not None:
+            timer.counts["rows"] = rows
+
+
+def instrument(view_name: str):
+    """
+    Decorator for views: records total latency, makes ``stage`` timings
+    attributable to this view, and logs the stage breakdown of requests
+    slower than ANALYSIS_SLOW_REQUEST_SECONDS (unset = no log).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timer = RequestTimer(view_name)
+            token = _current.set(timer)
+            start = time.perf_counter()
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _current.reset(token)
+                request_seconds.observe(elapsed, view_name)
+                threshold = getattr(settings, "ANALYSIS_SLOW_REQUEST_SECONDS", None)
+                if threshold is not None and elapsed >= threshold:
+                    slow_requests.inc(view_name)
+                    breakdown = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in timer.stages.items())
+                    counts = ", ".join(f"{name}={value}" for name, value in timer.counts.items())
+                    logger.warning("Slow %s %s: %.1fms [%s] %s", request.method, request.path, elapsed * 1000,
+                                   breakdown, counts)
+        return wrapper
+    return decorator
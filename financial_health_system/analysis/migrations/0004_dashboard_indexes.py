@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0003_uploadjob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="financialrecord",
+            index=models.Index(
+                fields=["company_name", "uploaded_at"],
+                name="record_company_uploaded_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="financialscore",
+            index=models.Index(
+                fields=["category", "weighted_score"], name="score_category_score_idx"
+            ),
+        ),
+    ]
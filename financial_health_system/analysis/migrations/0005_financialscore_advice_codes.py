@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0004_dashboard_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="financialscore",
+            name="advice_codes",
+            field=models.CharField(blank=True, default="", max_length=32),
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+CHUNK_SIZE = 1000
+
+
+def _ratios(score):
+    return {
+        "net_profit_margin": score.net_profit_margin,
+        "expense_ratio": score.expense_ratio,
+        "gross_profit_margin": score.gross_profit_margin,
+        "finance_cost_ratio": score.finance_cost_ratio,
+        "revenue_growth_rate": score.record.revenue_growth_rate or 0,
+    }
+
+
+def compact_advice(apps, schema_editor):
+    """
+    Replace stored advice text with rule codes wherever the codes render
+    back to exactly the same text. Anything else (older report formats,
+    hand-edited text) is left untouched.
+    """
+    from analysis.utils import advice_codes, render_advice
+
+    FinancialScore = apps.get_model("analysis", "FinancialScore")
+    queryset = (FinancialScore.objects.select_related("record")
+                .filter(advice_codes="", suggestion__isnull=False).order_by("id"))
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        converted = []
+        for score in chunk:
+            ratios = _ratios(score)
+            codes = advice_codes(ratios, score.category)
+            if render_advice(codes, ratios) == score.suggestion:
+                score.advice_codes, score.suggestion = ",".join(codes), None
+                converted.append(score)
+        FinancialScore.objects.bulk_update(converted, ["advice_codes", "suggestion"])
+        last_id = chunk[-1].id
+
+
+def expand_advice(apps, schema_editor):
+    from analysis.utils import render_advice
+
+    FinancialScore = apps.get_model("analysis", "FinancialScore")
+    queryset = FinancialScore.objects.select_related("record").exclude(advice_codes="").order_by("id")
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        for score in chunk:
+            score.suggestion = render_advice(tuple(score.advice_codes.split(",")), _ratios(score))
+            score.advice_codes = ""
+        FinancialScore.objects.bulk_update(chunk, ["advice_codes", "suggestion"])
+        last_id = chunk[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0005_financialscore_advice_codes"),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_advice, expand_advice),
+    ]
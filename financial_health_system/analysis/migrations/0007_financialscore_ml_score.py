@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0006_compact_existing_advice"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="financialscore",
+            name="ml_model_version",
+            field=models.CharField(blank=True, default="", max_length=16),
+        ),
+        migrations.AddField(
+            model_name="financialscore",
+            name="ml_score",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
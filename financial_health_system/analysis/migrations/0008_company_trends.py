@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0007_financialscore_ml_score"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompanyTrend",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("company_name", models.CharField(max_length=100, unique=True)),
+                ("periods", models.PositiveIntegerField(default=0)),
+                ("score_mean", models.FloatField(default=0.0)),
+                ("score_m2", models.FloatField(default=0.0)),
+                ("recent", models.JSONField(default=list)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="financialrecord",
+            name="growth_source",
+            field=models.CharField(
+                blank=True,
+                choices=[("sheet", "Sheet"), ("history", "Previous period")],
+                default="",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="financialrecord",
+            name="previous_record",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="next_records",
+                to="analysis.financialrecord",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="financialrecord",
+            index=models.Index(
+                fields=["company_name", "period"], name="record_company_period_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="companytrend",
+            name="last_record",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="analysis.financialrecord",
+            ),
+        ),
+    ]
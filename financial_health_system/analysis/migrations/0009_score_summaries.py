@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+def build_summaries(apps, schema_editor):
+    """Start the running totals from the scores already stored."""
+    from analysis.summaries import summary_rows
+
+    ScoreSummary = apps.get_model("analysis", "ScoreSummary")
+    rows = summary_rows(apps.get_model("analysis", "FinancialScore"), ScoreSummary)
+    ScoreSummary.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0008_company_trends"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("all", "All scores"),
+                            ("period", "Period"),
+                            ("company", "Company"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("key", models.CharField(blank=True, max_length=100)),
+                ("count", models.IntegerField(default=0)),
+                ("high_count", models.IntegerField(default=0)),
+                ("medium_count", models.IntegerField(default=0)),
+                ("low_count", models.IntegerField(default=0)),
+                ("weighted_score_sum", models.FloatField(default=0.0)),
+                ("weighted_score_sumsq", models.FloatField(default=0.0)),
+                ("net_profit_margin_sum", models.FloatField(default=0.0)),
+                ("net_profit_margin_sumsq", models.FloatField(default=0.0)),
+                ("expense_ratio_sum", models.FloatField(default=0.0)),
+                ("expense_ratio_sumsq", models.FloatField(default=0.0)),
+                ("gross_profit_margin_sum", models.FloatField(default=0.0)),
+                ("gross_profit_margin_sumsq", models.FloatField(default=0.0)),
+                ("finance_cost_ratio_sum", models.FloatField(default=0.0)),
+                ("finance_cost_ratio_sumsq", models.FloatField(default=0.0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("dimension", "key"), name="unique_score_summary"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0009_score_summaries"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="financialrecord",
+            index=models.Index(fields=["uploaded_at"], name="record_uploaded_idx"),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0010_record_uploaded_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="financialrecord",
+            name="record_company_uploaded_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="financialrecord",
+            name="record_company_period_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="financialscore",
+            name="score_category_score_idx",
+        ),
+        migrations.AddIndex(
+            model_name="financialrecord",
+            index=models.Index(fields=["company_name", "id"], name="record_company_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="financialrecord",
+            index=models.Index(fields=["period", "id"], name="record_period_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="financialrecord",
+            index=models.Index(fields=["company_name", "period", "id"], name="record_company_period_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="financialscore",
+            index=models.Index(fields=["category", "record"], name="score_category_record_idx"),
+        ),
+    ]
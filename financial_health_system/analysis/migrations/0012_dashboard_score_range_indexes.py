@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analysis", "0011_dashboard_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="financialscore",
+            index=models.Index(fields=["weighted_score", "record"], name="score_score_record_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="financialscore",
+            index=models.Index(fields=["category", "weighted_score", "record"], name="score_category_score_idx"),
+        ),
+    ]
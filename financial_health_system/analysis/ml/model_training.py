@@ -1,3 +1,8 @@
+# One-off fit from a CSV held in memory. For training from stored scores or
+# files larger than RAM use `manage.py train_model` (analysis/ml/training.py).
+
+import os
+
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
@@ -10,4 +15,6 @@ y = df['health_score']
 
 model = LinearRegression()
 model.fit(X, y)
-joblib.dump(model, "financial_health_model.pkl")
+# Write then rename, so running servers never load a half-written artifact
+joblib.dump(model, "financial_health_model.pkl.tmp")
+os.replace("financial_health_model.pkl.tmp", "financial_health_model.pkl")
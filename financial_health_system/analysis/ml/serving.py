@@ -0,0 +1,155 @@
+# analysis/ml/serving.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from ..utils import RATIO_FIELDS, _round2_array
+
+logger = logging.getLogger(__name__)
+
+
+class LoadedModel(NamedTuple):
+    estimator: object
+    version: str
+    features: Tuple[str, ...]
+
+
+def model_path() -> str:
+    return str(getattr(settings, "ANALYSIS_ML_MODEL_PATH", settings.BASE_DIR / "financial_health_model.pkl"))
+
+
+def file_version(path: str) -> str:
+    """Content hash of the artifact, so identical re-dumps keep their version."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+# ───────────────────────────────────────────────────────────────
+# Hot-Reloading Model Server (one per worker process)
+# ───────────────────────────────────────────────────────────────
+class ModelServer:
+    """
+    Holds the trained model for one artifact path.
+
+    The artifact is loaded lazily on first use with ``mmap_mode="r"`` (large
+    numpy arrays in uncompressed dumps stay on disk and are shared between
+    workers through the page cache). At most every ``check_interval``
+    seconds the file's mtime/size is compared with the loaded copy, and a
+    changed artifact is swapped in without restarting the worker. If the new
+    file cannot be loaded (e.g. it is still being written) the previous
+    model keeps serving.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._loaded: Optional[LoadedModel] = None
+        self._stat: Optional[Tuple[int, int]] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _disk_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self, stat: Tuple[int, int]) -> None:
+        import joblib
+
+        try:
+            estimator = joblib.load(self.path, mmap_mode="r")
+            version = file_version(self.path)
+        except Exception:
+            logger.exception("Could not load model artifact %s; keeping version %s",
+                             self.path, self._loaded.version if self._loaded else None)
+            return
+        features = tuple(getattr(estimator, "feature_names_in_", RATIO_FIELDS))
+        self._loaded = LoadedModel(estimator, version, features)
+        self._stat = stat
+        logger.info("Loaded model %s (version %s)", self.path, version)
+
+    def current(self) -> Optional[LoadedModel]:
+        """The model to serve, reloading first if the artifact changed on disk."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._loaded
+        with self._lock:
+            if now - self._checked_at >= self.check_interval:
+                stat = self._disk_stat()
+                if stat is None:
+                    self._loaded, self._stat = None, None
+                elif stat != self._stat:
+                    self._load(stat)
+                self._checked_at = now
+        return self._loaded
+
+    def predict(self, ratios: Dict[str, Iterable[float]]) -> Tuple[Optional[np.ndarray], str]:
+        """
+        Batch prediction from ratio columns (keyed like RATIO_FIELDS).
+        Returns (scores clipped to 0-100 and rounded like weighted_score,
+        model version), or (None, "") when no usable model is available.
+        """
+        loaded = self.current()
+        if loaded is None:
+            return None, ""
+        import pandas as pd
+
+        try:
+            frame = pd.DataFrame({name: np.asarray(ratios[name], dtype=float) for name in loaded.features})
+            predicted = np.asarray(loaded.estimator.predict(frame), dtype=float)
+        except Exception:
+            logger.exception("Model version %s failed to predict", loaded.version)
+            return None, ""
+        return _round2_array(np.clip(np.nan_to_num(predicted), 0.0, 100.0)), loaded.version
+
+
+_servers: Dict[str, ModelServer] = {}
+_servers_lock = threading.Lock()
+
+
+def get_model_server() -> ModelServer:
+    """The process-wide server for the configured artifact path."""
+    path = model_path()
+    server = _servers.get(path)
+    if server is None:
+        with _servers_lock:
+            server = _servers.setdefault(
+                path, ModelServer(path, getattr(settings, "ANALYSIS_ML_RELOAD_INTERVAL", 5.0)))
+    return server
+
+
+# ───────────────────────────────────────────────────────────────
+# Prediction Helpers
+# ───────────────────────────────────────────────────────────────
+def predict_ml_scores(ratios: Dict[str, Iterable[float]]) -> Tuple[Optional[np.ndarray], str]:
+    """Batch ML health scores for ratio columns; (None, "") without a model."""
+    return get_model_server().predict(ratios)
+
+
+def apply_ml_scores(financial_scores) -> None:
+    """Set ml_score/ml_model_version on (unsaved) FinancialScore objects in one batch."""
+    financial_scores = list(financial_scores)
+    if not financial_scores:
+        return
+    columns = {
+        "net_profit_margin": [s.net_profit_margin for s in financial_scores],
+        "expense_ratio": [s.expense_ratio for s in financial_scores],
+        "gross_profit_margin": [s.gross_profit_margin for s in financial_scores],
+        "finance_cost_ratio": [s.finance_cost_ratio for s in financial_scores],
+        "revenue_growth_rate": [s.record.revenue_growth_rate or 0.0 for s in financial_scores],
+    }
+    scores, version = predict_ml_scores(columns)
+    for i, financial_score in enumerate(financial_scores):
+        financial_score.ml_score = float(scores[i]) if scores is not None else None
+        financial_score.ml_model_version = version
@@ -0,0 +1,204 @@
+# analysis/ml/training.py
+import datetime
+import json
+import math
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from ..utils import RATIO_FIELDS
+from .serving import file_version
+
+# One chunk of training data: (row keys used for the holdout split, features, target)
+Chunk = Tuple[np.ndarray, "object", np.ndarray]
+ChunkSource = Callable[[], Iterator[Chunk]]
+
+
+class TrainingError(ValueError):
+    """Raised when a training source is unusable (missing columns, no rows, ...)."""
+
+
+# ───────────────────────────────────────────────────────────────
+# Chunked Sources (re-iterable; every pass streams from the start)
+# ───────────────────────────────────────────────────────────────
+def db_source(target: str, chunk_size: int = 10000) -> ChunkSource:
+    """
+    Ratio columns of stored FinancialScore rows, read in id-ordered keyset
+    chunks, against the FinancialScore column ``target``. There is no
+    default: weighted_score is a fixed linear formula of these same ratios,
+    so a model trained on it only relearns the rule-based score and is good
+    for smoke tests only.
+    """
+    import pandas as pd
+
+    from ..models import FinancialScore
+
+    columns = ("id", "net_profit_margin", "expense_ratio", "gross_profit_margin", "finance_cost_ratio",
+               "record__revenue_growth_rate", target)
+
+    def chunks() -> Iterator[Chunk]:
+        queryset = FinancialScore.objects.order_by("id").values_list(*columns)
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id)[:chunk_size])
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            frame = pd.DataFrame(rows, columns=("id",) + RATIO_FIELDS + ("target",))
+            yield _split_frame(frame, frame["id"].to_numpy(), "target")
+
+    return chunks
+
+
+def file_source(path: str, target: str = "health_score", chunk_size: int = 100000) -> ChunkSource:
+    """CSV (read with ``chunksize``) or Parquet (read by record batch; needs pyarrow)."""
+    import pandas as pd
+
+    if not os.path.exists(path):
+        raise TrainingError(f"{path} does not exist")
+    usecols = list(RATIO_FIELDS) + [target]
+
+    def frames() -> Iterator["pd.DataFrame"]:
+        if str(path).lower().endswith((".parquet", ".pq")):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise TrainingError("Reading Parquet requires pyarrow (pip install pyarrow)")
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=usecols):
+                yield batch.to_pandas()
+        else:
+            try:
+                yield from pd.read_csv(path, usecols=usecols, chunksize=chunk_size)
+            except ValueError as e:
+                raise TrainingError(f"{path}: {e}")
+
+    def chunks() -> Iterator[Chunk]:
+        offset = 0
+        for frame in frames():
+            keys = np.arange(offset, offset + len(frame))
+            offset += len(frame)
+            yield _split_frame(frame, keys, target)
+
+    return chunks
+
+
+def _split_frame(frame, keys: np.ndarray, target: str) -> Chunk:
+    features = frame[list(RATIO_FIELDS)].astype(float).fillna({"revenue_growth_rate": 0.0})
+    y = frame[target].to_numpy(dtype=float)
+    valid = np.isfinite(y) & np.isfinite(features.to_numpy()).all(axis=1)
+    return keys[valid], features[valid].reset_index(drop=True), y[valid]
+
+
+def is_holdout(keys: np.ndarray, fraction: float) -> np.ndarray:
+    """Stable pseudo-random split on row keys, identical on every pass and every run."""
+    mixed = (keys.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(1 << 32)
+    return mixed < np.uint64(int(fraction * (1 << 32)))
+
+
+# ───────────────────────────────────────────────────────────────
+# Incremental Training
+# ───────────────────────────────────────────────────────────────
+class StreamingMetrics:
+    """MAE / RMSE / R² accumulated chunk by chunk."""
+
+    def __init__(self):
+        self.n = 0
+        self.abs_err = self.sq_err = self.y_sum = self.y_sq = 0.0
+
+    def update(self, y: np.ndarray, predicted: np.ndarray) -> None:
+        err = predicted - y
+        self.n += len(y)
+        self.abs_err += float(np.abs(err).sum())
+        self.sq_err += float((err ** 2).sum())
+        self.y_sum += float(y.sum())
+        self.y_sq += float((y ** 2).sum())
+
+    def result(self) -> Dict[str, Optional[float]]:
+        if not self.n:
+            return {"rows": 0, "mae": None, "rmse": None, "r2": None}
+        variance = self.y_sq - self.y_sum ** 2 / self.n
+        return {
+            "rows": self.n,
+            "mae": self.abs_err / self.n,
+            "rmse": math.sqrt(self.sq_err / self.n),
+            "r2": 1 - self.sq_err / variance if variance > 0 else None,
+        }
+
+
+def train_streaming(source: ChunkSource, epochs: int = 3, holdout: float = 0.1, random_state: int = 0,
+                    progress: Optional[Callable[[str, int], None]] = None):
+    """
+    Fit a scaler + SGDRegressor pipeline with ``partial_fit`` over a chunked
+    source. Pass 1 fits the scaler, the next ``epochs`` passes fit the
+    regressor on training rows, and a final pass scores the holdout rows.
+    Only one chunk is in memory at a time. Returns (model, metadata).
+    """
+    from sklearn.linear_model import SGDRegressor
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    regressor = SGDRegressor(random_state=random_state)
+
+    train_rows = 0
+    for keys, X, y in source():
+        mask = ~is_holdout(keys, holdout)
+        if mask.any():
+            scaler.partial_fit(X[mask])
+            train_rows += int(mask.sum())
+    if not train_rows:
+        raise TrainingError("No training rows in the source")
+    if progress:
+        progress("scaler", train_rows)
+
+    for epoch in range(epochs):
+        for keys, X, y in source():
+            mask = ~is_holdout(keys, holdout)
+            if mask.any():
+                regressor.partial_fit(scaler.transform(X[mask]), y[mask])
+        if progress:
+            progress(f"epoch {epoch + 1}/{epochs}", train_rows)
+
+    model = Pipeline([("scaler", scaler), ("regressor", regressor)])
+    metrics = StreamingMetrics()
+    for keys, X, y in source():
+        mask = is_holdout(keys, holdout)
+        if mask.any():
+            metrics.update(y[mask], model.predict(X[mask]))
+
+    metadata = {
+        "trained_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "estimator": "StandardScaler+SGDRegressor",
+        "features": list(RATIO_FIELDS),
+        "epochs": epochs,
+        "holdout_fraction": holdout,
+        "train_rows": train_rows,
+        "holdout": metrics.result(),
+    }
+    return model, metadata
+
+
+def save_artifact(model, metadata: dict, path) -> dict:
+    """
+    Write the model (uncompressed, so serving can mmap it) with an atomic
+    rename, plus a ``<name>.json`` metadata sidecar and a copy named after
+    the version. Returns the metadata including the version.
+    """
+    import joblib
+
+    path = Path(path)
+    model.training_metadata_ = metadata
+    tmp = path.with_name(path.name + ".tmp")
+    joblib.dump(model, tmp)
+    metadata["version"] = file_version(str(tmp))
+    os.replace(tmp, path)
+
+    versioned = path.with_name(f"{path.stem}-{metadata['version']}{path.suffix}")
+    if not versioned.exists():
+        shutil.copyfile(path, versioned)
+    with open(path.with_name(path.name + ".json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
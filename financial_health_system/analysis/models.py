@@ -1,5 +1,9 @@
+import uuid
+
 from django.db import models
 
+from .utils import ADVICE_TEMPLATES, render_advice
+
 class FinancialRecord(models.Model):
     company_name = models.CharField(max_length=100)
     period = models.CharField(max_length=50)
@@ -11,6 +15,25 @@ class FinancialRecord(models.Model):
     net_profit = models.FloatField()
     revenue_growth_rate = models.FloatField(null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Same company's record for the latest earlier period (see analysis/trends.py)
+    previous_record = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL,
+                                        related_name="next_records")
+    GROWTH_FROM_SHEET = "sheet"
+    GROWTH_FROM_HISTORY = "history"
+    growth_source = models.CharField(max_length=10, blank=True, default="", choices=[
+        (GROWTH_FROM_SHEET, "Sheet"),
+        (GROWTH_FROM_HISTORY, "Previous period"),
+    ])
+
+    class Meta:
+        indexes = [
+            # Dashboard pages are keyset-ordered on the record id; each filter has an index in that order
+            models.Index(fields=["company_name", "id"], name="record_company_id_idx"),
+            models.Index(fields=["period", "id"], name="record_period_id_idx"),
+            models.Index(fields=["company_name", "period", "id"], name="record_company_period_idx"),
+            # Percentile index catch-up reads rows uploaded since its watermark
+            models.Index(fields=["uploaded_at"], name="record_uploaded_idx"),
+        ]
 
     def __str__(self):
         return f"{self.company_name} - {self.period}"
@@ -27,4 +50,176 @@ class FinancialScore(models.Model):
         ('Medium', 'Medium'),
         ('Low', 'Low')
     ])
+    # Legacy full advice text; new rows store advice_codes and render on demand
     suggestion = models.TextField(blank=True, null=True)
+    advice_codes = models.CharField(max_length=32, blank=True, default="")
+    # Prediction of the trained regression model (analysis/ml), when one is deployed
+    ml_score = models.FloatField(null=True, blank=True)
+    ml_model_version = models.CharField(max_length=16, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["category", "record"], name="score_category_record_idx"),
+            # Dashboard pages over a score range, keyed on (weighted_score, record)
+            models.Index(fields=["weighted_score", "record"], name="score_score_record_idx"),
+            models.Index(fields=["category", "weighted_score", "record"], name="score_category_score_idx"),
+        ]
+
+    def advice_ratios(self):
+        return {
+            "net_profit_margin": self.net_profit_margin,
+            "expense_ratio": self.expense_ratio,
+            "gross_profit_margin": self.gross_profit_margin,
+            "finance_cost_ratio": self.finance_cost_ratio,
+            "revenue_growth_rate": self.record.revenue_growth_rate or 0,
+        }
+
+    @property
+    def advice(self) -> str:
+        """Full advisory report, rendered from the stored rule codes."""
+        if self.advice_codes:
+            return render_advice(tuple(self.advice_codes.split(",")), self.advice_ratios())
+        return self.suggestion or ""
+
+    @property
+    def advice_summary(self) -> str:
+        """One-line overall verdict for list views."""
+        if self.advice_codes:
+            overall = self.advice_codes.split(",")[0]
+            return ADVICE_TEMPLATES[overall].format(npm=self.net_profit_margin, gpm=self.gross_profit_margin).strip()
+        return (self.suggestion or "").strip().split("\n")[0]
+
+
+class UploadFingerprint(models.Model):
+    """Maps the SHA-256 of an uploaded workbook to the record it produced."""
+    digest = models.CharField(max_length=64)
+    extraction_version = models.CharField(max_length=16)
+    record = models.ForeignKey(FinancialRecord, on_delete=models.CASCADE, related_name="fingerprints")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["digest", "extraction_version"], name="unique_upload_fingerprint"),
+        ]
+
+    def __str__(self):
+        return f"{self.digest[:12]} → {self.record}"
+
+
+class CompanyTrend(models.Model):
+    """
+    Running statistics of one company's weighted scores, updated as each
+    record is saved: all-time mean/variance (Welford) plus the latest
+    scores by period for rolling figures.
+    """
+    company_name = models.CharField(max_length=100, unique=True)
+    periods = models.PositiveIntegerField(default=0)
+    score_mean = models.FloatField(default=0.0)
+    score_m2 = models.FloatField(default=0.0)
+    # [[period, weighted_score, revenue_growth_rate], ...] oldest first, at most ANALYSIS_TREND_WINDOW
+    recent = models.JSONField(default=list)
+    last_record = models.ForeignKey(FinancialRecord, null=True, blank=True, on_delete=models.SET_NULL,
+                                    related_name="+")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.company_name} ({self.periods} periods)"
+
+    @property
+    def score_std(self) -> float:
+        return (self.score_m2 / self.periods) ** 0.5 if self.periods else 0.0
+
+    @property
+    def rolling_score_mean(self):
+        return sum(entry[1] for entry in self.recent) / len(self.recent) if self.recent else None
+
+    @property
+    def rolling_growth_mean(self):
+        return sum(entry[2] for entry in self.recent) / len(self.recent) if self.recent else None
+
+
+class ScoreSummary(models.Model):
+    """
+    Running count, sum and sum of squares of FinancialScore metrics overall,
+    per period and per company, kept current as scores are saved, rescored
+    or deleted (analysis/summaries.py). Dashboard statistics read one row
+    per group instead of aggregating every score.
+    """
+    OVERALL = "all"
+    PERIOD = "period"
+    COMPANY = "company"
+    DIMENSION_CHOICES = [
+        (OVERALL, "All scores"),
+        (PERIOD, "Period"),
+        (COMPANY, "Company"),
+    ]
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    # The period or company name; "" for the overall row
+    key = models.CharField(max_length=100, blank=True)
+    count = models.IntegerField(default=0)
+    high_count = models.IntegerField(default=0)
+    medium_count = models.IntegerField(default=0)
+    low_count = models.IntegerField(default=0)
+    weighted_score_sum = models.FloatField(default=0.0)
+    weighted_score_sumsq = models.FloatField(default=0.0)
+    net_profit_margin_sum = models.FloatField(default=0.0)
+    net_profit_margin_sumsq = models.FloatField(default=0.0)
+    expense_ratio_sum = models.FloatField(default=0.0)
+    expense_ratio_sumsq = models.FloatField(default=0.0)
+    gross_profit_margin_sum = models.FloatField(default=0.0)
+    gross_profit_margin_sumsq = models.FloatField(default=0.0)
+    finance_cost_ratio_sum = models.FloatField(default=0.0)
+    finance_cost_ratio_sumsq = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["dimension", "key"], name="unique_score_summary")]
+
+    def __str__(self):
+        return f"{self.get_dimension_display()} {self.key} ({self.count} scores)".replace("  ", " ")
+
+    def mean(self, metric: str = "weighted_score"):
+        return getattr(self, f"{metric}_sum") / self.count if self.count else None
+
+    def std(self, metric: str = "weighted_score"):
+        """Population standard deviation; float drift is clamped at zero."""
+        if not self.count:
+            return None
+        mean = self.mean(metric)
+        return max(getattr(self, f"{metric}_sumsq") / self.count - mean * mean, 0.0) ** 0.5
+
+    @property
+    def category_counts(self):
+        return {"High": self.high_count, "Medium": self.medium_count, "Low": self.low_count}
+
+
+class UploadJob(models.Model):
+    """A stored upload waiting to be parsed and scored off the request path."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    company_name = models.CharField(max_length=100)
+    period = models.CharField(max_length=50)
+    file = models.FileField(upload_to="upload_jobs/%Y/%m/", blank=True)
+    digest = models.CharField(max_length=64, blank=True)
+    record = models.ForeignKey(FinancialRecord, null=True, blank=True, on_delete=models.SET_NULL)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"], name="uploadjob_status_created_idx")]
+
+    def __str__(self):
+        return f"{self.company_name} - {self.period} ({self.status})"
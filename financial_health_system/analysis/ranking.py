@@ -0,0 +1,252 @@
+# analysis/ranking.py
+import itertools
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from .models import FinancialScore
+
+logger = logging.getLogger(__name__)
+
+RANKED_METRICS = ("weighted_score", "net_profit_margin", "expense_ratio", "gross_profit_margin",
+                  "finance_cost_ratio", "revenue_growth_rate")
+
+# For these a lower value is the better result
+LOWER_IS_BETTER = frozenset({"expense_ratio", "finance_cost_ratio"})
+
+ALL_PERIODS = None
+
+_COLUMNS = ("id",) + RANKED_METRICS[:5] + ("record__revenue_growth_rate", "record__uploaded_at", "record__period")
+
+# Catch-up re-reads rows uploaded this long before the newest one seen, so a
+# row whose transaction commits late (a long bulk ingest) is still picked up
+CATCH_UP_OVERLAP = timedelta(minutes=5)
+
+_CHUNK = 5000
+
+
+# ───────────────────────────────────────────────────────────────
+# Sorted Peer Index (per process)
+# ───────────────────────────────────────────────────────────────
+class PercentileIndex:
+    """
+    Sorted float64 arrays of every ranked metric, overall and per period.
+
+    Built from FinancialScore in one pass on first use. When the data
+    version (charts.data_version, bumped on every score write) has moved
+    since the last look, the next query merges in the rows uploaded since
+    as one sorted batch per array, so ranks are current without rescanning
+    the table; otherwise queries touch no database at all. A query that
+    finds another one already catching up uses the arrays as they are
+    rather than wait. A rank is then two binary searches. Updates and
+    deletes (e.g. ``manage.py rescore``) are picked up by a full rebuild
+    every ANALYSIS_PERCENTILE_REBUILD_SECONDS, which runs in a background
+    thread and swaps the new arrays in, so requests never wait on it.
+    """
+
+    def __init__(self, rebuild_after: Optional[float] = None):
+        self.rebuild_after = rebuild_after
+        self._sorted: Dict[Tuple[str, Optional[str]], "np.ndarray"] = {}
+        self._watermark = None
+        self._recent: Dict[int, object] = {}
+        self._version: Optional[str] = None
+        self._built = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilder: Optional[threading.Thread] = None
+
+    def _interval(self) -> Optional[float]:
+        if self.rebuild_after is not None:
+            return self.rebuild_after
+        return getattr(settings, "ANALYSIS_PERCENTILE_REBUILD_SECONDS", 3600)
+
+    @staticmethod
+    def _rows(since=None):
+        queryset = FinancialScore.objects.all()
+        if since is not None:
+            queryset = queryset.filter(record__uploaded_at__gte=since)
+        return queryset.values_list(*_COLUMNS).iterator(chunk_size=_CHUNK)
+
+    @staticmethod
+    def _read(rows, skip=()) -> Tuple[Dict[int, object], List[Optional[str]], "np.ndarray"]:
+        """({id: uploaded_at}, periods, (n, len(RANKED_METRICS)) values) of the rows not in ``skip``."""
+        import numpy as np
+
+        stamps, periods, blocks = {}, [], []
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, _CHUNK))
+            if not batch:
+                break
+            chunk = [row for row in batch if row[0] not in skip]
+            for row in chunk:
+                stamps[row[0]] = row[7]
+                periods.append(row[8])
+            blocks.append(np.array([row[1:6] + (row[6] or 0.0,) for row in chunk], dtype=float)
+                          .reshape(-1, len(RANKED_METRICS)))
+        values = np.concatenate(blocks) if blocks else np.empty((0, len(RANKED_METRICS)))
+        return stamps, periods, values
+
+    @staticmethod
+    def _group(periods: List[Optional[str]], values) -> Dict[Tuple[str, Optional[str]], "np.ndarray"]:
+        """Sorted array per (metric, ALL_PERIODS) and (metric, period)."""
+        import numpy as np
+
+        if not periods:
+            return {}
+        codes = {}
+        period_codes = np.fromiter((codes.setdefault(p, len(codes)) for p in periods), dtype=np.int64,
+                                   count=len(periods))
+        order = np.argsort(period_codes, kind="stable")
+        bounds = np.searchsorted(period_codes[order], np.arange(len(codes) + 1))
+        groups = {}
+        for j, metric in enumerate(RANKED_METRICS):
+            column = values[:, j]
+            groups[(metric, ALL_PERIODS)] = np.sort(column)
+            for period, code in codes.items():
+                groups[(metric, period)] = np.sort(column[order[bounds[code]:bounds[code + 1]]])
+        return groups
+
+    def _advance(self, stamps: Dict[int, object]) -> None:
+        """Move the catch-up watermark past ``stamps`` and forget ids older than the overlap."""
+        if stamps:
+            newest = max(stamps.values())
+            self._watermark = newest if self._watermark is None else max(self._watermark, newest)
+        self._recent.update(stamps)
+        if self._watermark is not None:
+            horizon = self._watermark - CATCH_UP_OVERLAP
+            self._recent = {pk: stamp for pk, stamp in self._recent.items() if stamp >= horizon}
+
+    def rebuild(self) -> None:
+        """Build fresh arrays off to the side and swap them in; queries use the old ones meanwhile."""
+        from .charts import data_version
+
+        version = data_version()
+        stamps, periods, values = self._read(self._rows())
+        groups = self._group(periods, values)
+        with self._lock:
+            self._sorted, self._watermark, self._recent = groups, None, {}
+            self._advance(stamps)
+            self._version = version
+            self._built = True
+
+    def _catch_up(self, version: str) -> None:
+        import numpy as np
+
+        since = self._watermark - CATCH_UP_OVERLAP if self._watermark is not None else None
+        stamps, periods, values = self._read(self._rows(since), skip=self._recent)
+        for key, new in self._group(periods, values).items():
+            current = self._sorted.get(key)
+            # New arrays replace old ones, so readers never see a half-merged array
+            self._sorted[key] = new if current is None else np.insert(current, np.searchsorted(current, new), new)
+        self._advance(stamps)
+        # Read before the rows, so a write committed meanwhile moves it again
+        self._version = version
+
+    def _rebuild_loop(self, interval: float) -> None:
+        from django.db import connection
+
+        while True:
+            time.sleep(interval)
+            try:
+                self.rebuild()
+            except Exception:
+                logger.exception("Percentile index rebuild failed")
+            finally:
+                connection.close()
+
+    def _start_rebuilder(self) -> None:
+        interval = self._interval()
+        if not interval or (self._rebuilder is not None and self._rebuilder.is_alive()):
+            return
+        self._rebuilder = threading.Thread(target=self._rebuild_loop, args=(interval,),
+                                           name="percentile-index-rebuild", daemon=True)
+        self._rebuilder.start()
+
+    def invalidate(self) -> None:
+        """Force a full rebuild on the next query."""
+        self._built = False
+
+    def refresh(self) -> None:
+        from .charts import data_version
+
+        if not self._built:
+            # Only a cold (or invalidated) index is built on the request path
+            with self._build_lock:
+                if not self._built:
+                    self.rebuild()
+                self._start_rebuilder()
+            return
+        version = data_version()
+        if version == self._version or not self._lock.acquire(blocking=False):
+            return
+        try:
+            if version != self._version:
+                self._catch_up(version)
+        finally:
+            self._lock.release()
+
+    def _values(self, metric: str, period: Optional[str]):
+        import numpy as np
+
+        return self._sorted.get((metric, period), np.empty(0))
+
+    def percentile(self, metric: str, value: float, period: Optional[str] = ALL_PERIODS) -> Optional[float]:
+        """
+        Share of peers (0-100) this value does better than, ties counting
+        half; "better" is higher except for LOWER_IS_BETTER metrics.
+        None when there are no peers.
+        """
+        import numpy as np
+
+        values = self._values(metric, period)
+        if len(values) == 0:
+            return None
+        below = int(np.searchsorted(values, value, side="left"))
+        ties = int(np.searchsorted(values, value, side="right")) - below
+        rank = (below + ties / 2) / len(values) * 100
+        return 100 - rank if metric in LOWER_IS_BETTER else rank
+
+    def count(self, metric: str = "weighted_score", period: Optional[str] = ALL_PERIODS) -> int:
+        return len(self._values(metric, period))
+
+    def histogram(self, metric: str, edges: Sequence[float], period: Optional[str] = ALL_PERIODS) -> List[int]:
+        """Counts per [edges[i], edges[i + 1]) bin, the last bin closed; one vectorised search over the edges."""
+        import numpy as np
+
+        values = self._values(metric, period)
+        positions = np.searchsorted(values, edges[:-1], side="left").tolist()
+        positions.append(int(np.searchsorted(values, edges[-1], side="right")))
+        return [positions[i + 1] - positions[i] for i in range(len(edges) - 1)]
+
+
+percentile_index = PercentileIndex()
+
+
+def peer_standing(financial_score: FinancialScore) -> Dict[str, Dict[str, Optional[float]]]:
+    """Percentile of each ranked metric against all results and against the same period."""
+    percentile_index.refresh()
+    period = financial_score.record.period
+    values = {metric: getattr(financial_score, metric, None) for metric in RANKED_METRICS[:5]}
+    values["revenue_growth_rate"] = financial_score.record.revenue_growth_rate or 0.0
+    return {
+        metric: {
+            "all": percentile_index.percentile(metric, value),
+            "period": percentile_index.percentile(metric, value, period),
+        }
+        for metric, value in values.items()
+    }
+
+
+def score_histogram(period: Optional[str] = ALL_PERIODS, bins: int = 10) -> List[Dict[str, float]]:
+    """Peer distribution of weighted_score over 0-100 for the dashboard."""
+    percentile_index.refresh()
+    edges = [100 * i / bins for i in range(bins + 1)]
+    counts = percentile_index.histogram("weighted_score", edges, period)
+    peak = max(counts) if counts and max(counts) else 1
+    return [{"low": edges[i], "high": edges[i + 1], "count": count, "width": round(100 * count / peak, 1)}
+            for i, count in enumerate(counts)]
@@ -0,0 +1,171 @@
+# analysis/rescoring.py
+import glob
+import json
+import logging
+import math
+import os
+from typing import Callable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .ml.serving import predict_ml_scores
+from .models import FinancialRecord, FinancialScore
+from .summaries import scores_changed
+from .utils import advice_codes, calculate_weighted_scores, ratios_from_figures
+
+logger = logging.getLogger(__name__)
+
+RECORD_COLUMNS = (
+    "id", "total_income", "gross_profit", "admin_expenses", "distribution_costs",
+    "finance_costs", "net_profit", "revenue_growth_rate",
+    "financialscore__id", "financialscore__weighted_score", "financialscore__category",
+    "financialscore__ml_score", "financialscore__ml_model_version", "company_name", "period",
+    "financialscore__net_profit_margin", "financialscore__expense_ratio", "financialscore__gross_profit_margin",
+    "financialscore__finance_cost_ratio", "financialscore__advice_codes",
+)
+
+STORED_RATIOS = ("net_profit_margin", "expense_ratio", "gross_profit_margin", "finance_cost_ratio")
+
+
+def record_id_bounds() -> Tuple[Optional[int], Optional[int]]:
+    bounds = FinancialRecord.objects.filter(financialscore__isnull=False).aggregate(lo=Min("id"), hi=Max("id"))
+    return bounds["lo"], bounds["hi"]
+
+
+def split_id_range(lo: int, hi: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [lo, hi] into ``parts`` contiguous, non-overlapping id ranges."""
+    parts = max(1, min(parts, hi - lo + 1))
+    step = (hi - lo + 1) // parts
+    ranges = []
+    for i in range(parts):
+        start = lo + i * step
+        end = hi if i == parts - 1 else start + step - 1
+        ranges.append((start, end))
+    return ranges
+
+
+def checkpoint_path(prefix: str, index: int) -> str:
+    """Checkpoint file of worker ``index``; named by position, not id range, so new rows don't orphan it."""
+    return f"{prefix}.{index}.json"
+
+
+def pending_checkpoints(prefix: str) -> List[Tuple[str, int, int]]:
+    """(path, start_id, end_id) of each worker range an interrupted run left unfinished."""
+    pending = []
+    for path in sorted(glob.glob(f"{glob.escape(prefix)}.*.json")):
+        with open(path) as f:
+            state = json.load(f)
+        pending.append((path, state["start_id"], state["end_id"]))
+    return pending
+
+
+def _read_checkpoint(path: Optional[str], start_id: int, end_id: int) -> Optional[int]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if (state.get("start_id"), state.get("end_id")) != (start_id, end_id):
+        raise ValueError(f"Checkpoint {path} is for ids [{state.get('start_id')}, {state.get('end_id')}], "
+                         f"not [{start_id}, {end_id}]; delete it to start over")
+    return state["last_id"]
+
+
+def _write_checkpoint(path: Optional[str], start_id: int, end_id: int, last_id: int) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"start_id": start_id, "end_id": end_id, "last_id": last_id}, f)
+    os.replace(tmp, path)
+
+
+def rescore_chunk(rows: List[tuple], growth_changed: bool = False) -> int:
+    """
+    Score one chunk of RECORD_COLUMNS rows in batch and write back the
+    changed scores. Advice codes are re-picked when the category or a ratio
+    moved, or for every row when the caller changed their growth rates
+    (``growth_changed``), since the growth branch reads the record's rate.
+    """
+    columns = list(zip(*rows))
+    ratios = ratios_from_figures(*columns[1:8])
+    batch = calculate_weighted_scores(ratios)
+    ml_scores, model_version = predict_ml_scores(ratios)
+
+    changed, readvised = [], []
+    old_rows, new_rows = [], []
+    for i, row in enumerate(rows):
+        score_id, old_score, old_category, old_ml_score, old_ml_version, company, period = row[8:15]
+        old_ratios, old_codes = row[15:19], row[19]
+        score, category = float(batch.scores[i]), batch.categories[i]
+        new_ratios = tuple(float(ratios[name][i]) for name in STORED_RATIOS)
+        ml_score = float(ml_scores[i]) if ml_scores is not None else old_ml_score
+        ml_version = model_version or old_ml_version
+        ratios_moved = any(not math.isclose(old, new, abs_tol=1e-9) for old, new in zip(old_ratios, new_ratios))
+        rescored = ratios_moved or (score, category, ml_score, ml_version) != (
+            old_score, old_category, old_ml_score, old_ml_version)
+        obj = FinancialScore(id=score_id, weighted_score=score, category=category,
+                             ml_score=ml_score, ml_model_version=ml_version,
+                             **dict(zip(STORED_RATIOS, new_ratios)))
+        if rescored:
+            changed.append(obj)
+            old_rows.append((company, period, old_category, old_score, *old_ratios))
+            new_rows.append((company, period, category, score, *new_ratios))
+        if growth_changed or ratios_moved or category != old_category:
+            codes = ",".join(advice_codes({k: float(v[i]) for k, v in ratios.items()}, category))
+            if codes != old_codes:
+                obj.advice_codes, obj.suggestion = codes, None
+                readvised.append(obj)
+
+    with transaction.atomic():
+        FinancialScore.objects.bulk_update(changed, ["weighted_score", "category", "ml_score", "ml_model_version",
+                                                     *STORED_RATIOS])
+        FinancialScore.objects.bulk_update(readvised, ["advice_codes", "suggestion"])
+        scores_changed(old_rows, new_rows)
+    return len({obj.id for obj in changed + readvised})
+
+
+def rescore_range(start_id: int, end_id: int, chunk_size: int = 2000, checkpoint: Optional[str] = None,
+                  progress: Optional[Callable[[int, int, int], None]] = None) -> Tuple[int, int]:
+    """
+    Recompute weighted_score/category (and ml_score, when a model is
+    deployed) for records with ids in [start_id, end_id].
+    Rows are streamed in id-ordered chunks with ``.iterator()`` and written
+    per chunk, so memory does not grow with table size. With ``checkpoint``
+    the range and last finished id are saved after each chunk, a rerun over
+    the same range resumes after it, and the file is removed once the range
+    is done. Returns (rows processed, rows updated).
+    """
+    range_start = start_id
+    resume_after = _read_checkpoint(checkpoint, range_start, end_id)
+    if resume_after is not None:
+        logger.info("Resuming ids [%d, %d] after id %d from %s", range_start, end_id, resume_after, checkpoint)
+        start_id = max(start_id, resume_after + 1)
+    else:
+        # Recorded up front so a run killed before its first chunk still resumes this range
+        _write_checkpoint(checkpoint, range_start, end_id, range_start - 1)
+
+    queryset = (
+        FinancialRecord.objects
+        .filter(id__lte=end_id, financialscore__isnull=False)
+        .order_by("id")
+        .values_list(*RECORD_COLUMNS)
+    )
+
+    processed = updated = 0
+    last_id = start_id - 1
+    while True:
+        # Keyset window: the cursor is drained before writing, so no read
+        # lock is held while this (or another worker) updates the table
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size].iterator(chunk_size=chunk_size))
+        if not chunk:
+            break
+        updated += rescore_chunk(chunk)
+        processed += len(chunk)
+        last_id = chunk[-1][0]
+        _write_checkpoint(checkpoint, range_start, end_id, last_id)
+        if progress:
+            progress(processed, updated, last_id)
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return processed, updated
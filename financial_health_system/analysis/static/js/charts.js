@@ -0,0 +1,69 @@
+// analysis/static/js/charts.js
+// Dashboard charts drawn client-side (Chart.js) from the /charts/ JSON endpoints.
+// Each <canvas data-chart="..." data-url="..."> is fetched on load and polled;
+// fetch revalidates with If-None-Match, so unchanged data costs a 304.
+(function () {
+  "use strict";
+
+  const POLL_MS = 30000;
+  const COLORS = { High: "#16a34a", Medium: "#f59e0b", Low: "#dc2626" };
+  const charts = {};
+  const lastBody = {};
+
+  const builders = {
+    distribution: (d) => ({
+      type: "bar",
+      data: {
+        labels: d.labels,
+        datasets: [{ label: "Scores", data: d.counts, backgroundColor: "#3b82f6" }],
+      },
+      options: { plugins: { legend: { display: false } } },
+    }),
+    categories: (d) => ({
+      type: "bar",
+      data: {
+        labels: d.periods,
+        datasets: ["High", "Medium", "Low"].map((c) => ({ label: c, data: d[c], backgroundColor: COLORS[c] })),
+      },
+      options: { scales: { x: { stacked: true }, y: { stacked: true } } },
+    }),
+    company: (d) => ({
+      type: "line",
+      data: {
+        labels: d.periods,
+        datasets: [{ label: d.company, data: d.scores, borderColor: "#3b82f6", tension: 0.2 }],
+      },
+      options: { scales: { y: { min: 0, max: 100 } } },
+    }),
+  };
+
+  async function refresh(canvas) {
+    try {
+      // "no-cache": use the stored copy only after the server confirms it (304)
+      const response = await fetch(canvas.dataset.url, { cache: "no-cache", headers: { Accept: "application/json" } });
+      if (!response.ok) throw new Error(canvas.dataset.url + ": HTTP " + response.status);
+      const body = await response.text();
+      if (body === lastBody[canvas.id]) return;
+      lastBody[canvas.id] = body;
+
+      const config = builders[canvas.dataset.chart](JSON.parse(body));
+      if (charts[canvas.id]) {
+        charts[canvas.id].data = config.data;
+        charts[canvas.id].update();
+      } else {
+        charts[canvas.id] = new Chart(canvas, config);
+      }
+    } catch (error) {
+      console.warn("Chart refresh failed", error);
+    }
+  }
+
+  function start() {
+    if (typeof Chart === "undefined") return;
+    const canvases = Array.from(document.querySelectorAll("canvas[data-chart]"));
+    canvases.forEach(refresh);
+    setInterval(() => canvases.forEach(refresh), POLL_MS);
+  }
+
+  document.addEventListener("DOMContentLoaded", start);
+})();
@@ -0,0 +1,82 @@
+// analysis/static/js/whatif.js
+// What-if panel on the result card: posts the ranges in #whatif-form to
+// /api/whatif/<record_id>/ and renders the sensitivities and the smallest
+// changes that move the record into another category.
+(function () {
+  "use strict";
+
+  function label(field) {
+    return field.replace(/_/g, " ").replace(/\b\w/g, (c) => c.toUpperCase());
+  }
+
+  function describeChanges(changes, units) {
+    const parts = Object.entries(changes)
+      .filter(([, value]) => value !== 0)
+      .map(([field, value]) => `${label(field)} ${value > 0 ? "+" : ""}${value}${units[field] || "%"}`);
+    return parts.length ? parts.join(", ") : "no change";
+  }
+
+  function ranges(form) {
+    const result = {};
+    form.querySelectorAll("tr[data-field]").forEach((row) => {
+      const min = parseFloat(row.querySelector("[name=min]").value);
+      const max = parseFloat(row.querySelector("[name=max]").value);
+      const steps = parseInt(row.querySelector("[name=steps]").value, 10);
+      if (isNaN(min) || isNaN(max) || (min === 0 && max === 0)) return;
+      result[row.dataset.field] = { min: min, max: max, steps: isNaN(steps) ? 1 : steps };
+    });
+    return result;
+  }
+
+  function render(data) {
+    const units = {};
+    Object.entries(data.ranges).forEach(([field, range]) => { units[field] = range.unit; });
+
+    const rows = data.sensitivity.map((s) => `<tr><td>${label(s.input)}</td>
+      <td style="text-align:right">${s.points_per_unit.toFixed(3)} / ${s.unit}</td>
+      <td style="text-align:right">${s.score_at_min !== undefined ? s.score_at_min.toFixed(2) + " – " + s.score_at_max.toFixed(2) : "–"}</td></tr>`);
+
+    const crossings = data.crossings.map((c) => {
+      const single = Object.entries(c.single_input)
+        .map(([field, value]) => `${label(field)} ${value > 0 ? "+" : ""}${value}${units[field] || "%"}`);
+      return `<li><strong>${c.category}</strong> (${c.direction}):
+        ${single.length ? "one input alone: " + single.join(" or ") : "no single input in range"};
+        ${c.combined ? "fewest combined changes: " + describeChanges(c.combined.changes, units)
+                       + ` → ${c.combined.score.toFixed(2)}` : "not reachable in the grid"}</li>`;
+    });
+
+    return `<p>Baseline ${data.baseline.score.toFixed(2)} (${data.baseline.category}) ·
+      ${data.scenarios} scenarios scoring ${data.score_min.toFixed(2)} – ${data.score_max.toFixed(2)} ·
+      High ${data.categories.High} / Medium ${data.categories.Medium} / Low ${data.categories.Low}</p>
+      <p>Best: ${describeChanges(data.best.changes, units)} → ${data.best.score.toFixed(2)} (${data.best.category})</p>
+      <table><tr><th>Input</th><th style="text-align:right">Score points per unit</th>
+      <th style="text-align:right">Score over range</th></tr>${rows.join("")}</table>
+      <h5>Category thresholds</h5><ul>${crossings.join("")}</ul>`;
+  }
+
+  async function run(event) {
+    event.preventDefault();
+    const form = event.target;
+    const status = document.getElementById("whatif-status");
+    status.textContent = "Scoring…";
+    try {
+      const started = performance.now();
+      const response = await fetch(form.dataset.url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ ranges: ranges(form) }),
+      });
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error || "HTTP " + response.status);
+      status.textContent = `Done in ${Math.round(performance.now() - started)} ms.`;
+      document.getElementById("whatif-result").innerHTML = render(data);
+    } catch (error) {
+      status.textContent = "What-if failed: " + error.message;
+    }
+  }
+
+  document.addEventListener("DOMContentLoaded", () => {
+    const form = document.getElementById("whatif-form");
+    if (form) form.addEventListener("submit", run);
+  });
+})();
@@ -0,0 +1,181 @@
+# analysis/summaries.py
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .charts import bump_data_version
+from .models import FinancialRecord, FinancialScore, ScoreSummary
+from .trends import period_sort_key
+
+SUMMARY_METRICS = ("weighted_score", "net_profit_margin", "expense_ratio", "gross_profit_margin",
+                   "finance_cost_ratio")
+
+CATEGORY_FIELDS = {"High": "high_count", "Medium": "medium_count", "Low": "low_count"}
+
+# (company, period, category, *SUMMARY_METRICS)
+SummaryRow = Tuple[str, str, str, float, float, float, float, float]
+
+Deltas = Dict[Tuple[str, str], Dict[str, float]]
+
+
+def _groups(company: str, period: str) -> Tuple[Tuple[str, str], ...]:
+    return (ScoreSummary.OVERALL, ""), (ScoreSummary.PERIOD, period), (ScoreSummary.COMPANY, company)
+
+
+def score_row(financial_score: FinancialScore, record: Optional[FinancialRecord] = None) -> SummaryRow:
+    record = record or financial_score.record
+    return (record.company_name, record.period, financial_score.category,
+            *(getattr(financial_score, metric) for metric in SUMMARY_METRICS))
+
+
+# ───────────────────────────────────────────────────────────────
+# Incremental Updates
+# ───────────────────────────────────────────────────────────────
+def add_rows(deltas: Deltas, rows: Iterable[SummaryRow], sign: int = 1) -> Deltas:
+    """Fold score rows into ``deltas`` (sign -1 takes them out); returns ``deltas``."""
+    for company, period, category, *values in rows:
+        for group in _groups(company, period):
+            delta = deltas[group]
+            delta["count"] += sign
+            if category in CATEGORY_FIELDS:
+                delta[CATEGORY_FIELDS[category]] += sign
+            for metric, value in zip(SUMMARY_METRICS, values):
+                delta[f"{metric}_sum"] += sign * value
+                delta[f"{metric}_sumsq"] += sign * value * value
+    return deltas
+
+
+def new_deltas() -> Deltas:
+    return defaultdict(lambda: defaultdict(float))
+
+
+def apply_deltas(deltas: Deltas) -> None:
+    """
+    One ``UPDATE ... SET x = x + delta`` per touched group (created when
+    missing), so concurrent writers never lose an increment. Groups are
+    updated in a fixed order to avoid lock-order deadlocks. Cached chart
+    data is invalidated once the change commits.
+    """
+    changed = False
+    with transaction.atomic():
+        for (dimension, key), delta in sorted(deltas.items()):
+            delta = {field: value for field, value in delta.items() if value}
+            if not delta:
+                continue
+            changed = True
+            changes = {field: F(field) + value for field, value in delta.items()}
+            summaries = ScoreSummary.objects.filter(dimension=dimension, key=key)
+            if summaries.update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    ScoreSummary.objects.create(dimension=dimension, key=key, **delta)
+            except IntegrityError:
+                # Another writer created the group first
+                summaries.update(**changes)
+        if changed:
+            transaction.on_commit(bump_data_version)
+
+
+def scores_added(rows: Iterable[SummaryRow]) -> None:
+    apply_deltas(add_rows(new_deltas(), rows))
+
+
+def scores_removed(rows: Iterable[SummaryRow]) -> None:
+    apply_deltas(add_rows(new_deltas(), rows, sign=-1))
+
+
+def scores_changed(old_rows: Iterable[SummaryRow], new_rows: Iterable[SummaryRow]) -> None:
+    apply_deltas(add_rows(add_rows(new_deltas(), old_rows, sign=-1), new_rows))
+
+
+# --- Signal receivers (connected in AnalysisConfig.ready) ---
+def _stored_row(score_id: int) -> Optional[SummaryRow]:
+    return (FinancialScore.objects.filter(pk=score_id)
+            .values_list("record__company_name", "record__period", "category", *SUMMARY_METRICS).first())
+
+
+def score_pre_save(sender, instance: FinancialScore, raw=False, **kwargs) -> None:
+    instance._summary_before = None if raw or instance.pk is None else _stored_row(instance.pk)
+
+
+def score_post_save(sender, instance: FinancialScore, created: bool, raw=False, **kwargs) -> None:
+    if raw:
+        return
+    before = getattr(instance, "_summary_before", None)
+    scores_changed([before] if before else [], [score_row(instance)])
+
+
+def score_pre_delete(sender, instance: FinancialScore, **kwargs) -> None:
+    # Read now: a cascading delete may remove the record before post_delete
+    instance._summary_before = _stored_row(instance.pk)
+
+
+def score_post_delete(sender, instance: FinancialScore, **kwargs) -> None:
+    before = getattr(instance, "_summary_before", None)
+    if before:
+        scores_removed([before])
+
+
+# ───────────────────────────────────────────────────────────────
+# Full Rebuild (GROUP BY, one query per dimension)
+# ───────────────────────────────────────────────────────────────
+def summary_rows(score_model=FinancialScore, summary_model=ScoreSummary) -> List[ScoreSummary]:
+    """Unsaved summary rows for every group, aggregated in the database (also used by the migration)."""
+    aggregates = {
+        "count": Count("id"),
+        **{field: Count("id", filter=Q(category=category)) for category, field in CATEGORY_FIELDS.items()},
+    }
+    for metric in SUMMARY_METRICS:
+        aggregates[f"{metric}_sum"] = Sum(metric)
+        aggregates[f"{metric}_sumsq"] = Sum(F(metric) * F(metric))
+
+    rows = []
+    scores = score_model.objects.order_by()
+    # The class constants, as migrations pass historical models without them
+    for dimension, key_field in ((ScoreSummary.OVERALL, None), (ScoreSummary.PERIOD, "record__period"),
+                                 (ScoreSummary.COMPANY, "record__company_name")):
+        if key_field is None:
+            grouped = [("", scores.aggregate(**aggregates))]
+        else:
+            grouped = [(row.pop(key_field), row)
+                       for row in scores.values(key_field).annotate(**aggregates).values(key_field, *aggregates)]
+        rows.extend(summary_model(dimension=dimension, key=key, **{field: value or 0 for field, value in totals.items()})
+                    for key, totals in grouped if totals["count"])
+    return rows
+
+
+def rebuild_summaries() -> int:
+    """Replace every ScoreSummary row with exact figures; returns the number of groups."""
+    with transaction.atomic():
+        rows = summary_rows()
+        ScoreSummary.objects.all().delete()
+        ScoreSummary.objects.bulk_create(rows, batch_size=500)
+        transaction.on_commit(bump_data_version)
+    return len(rows)
+
+
+# ───────────────────────────────────────────────────────────────
+# Reads (one row per group)
+# ───────────────────────────────────────────────────────────────
+def get_summary(dimension: str = ScoreSummary.OVERALL, key: str = "") -> Optional[ScoreSummary]:
+    return ScoreSummary.objects.filter(dimension=dimension, key=key, count__gt=0).first()
+
+
+def period_summaries(limit: int = 12) -> List[ScoreSummary]:
+    """Latest periods first, by parsed period ("Jan 2025" after "Dec 2024"), not label text."""
+    rows = ScoreSummary.objects.filter(dimension=ScoreSummary.PERIOD, count__gt=0)
+    return sorted(rows, key=lambda summary: period_sort_key(summary.key), reverse=True)[:limit]
+
+
+def describe(summary: ScoreSummary) -> dict:
+    """Template-friendly figures of one group."""
+    return {
+        "key": summary.key,
+        "count": summary.count,
+        "categories": summary.category_counts,
+        **{f"{metric}_mean": summary.mean(metric) for metric in SUMMARY_METRICS},
+        "weighted_score_std": summary.std(),
+    }
@@ -1,3 +1,1074 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.core.management import CommandError, call_command
+from openpyxl import Workbook, load_workbook
+
+from .advice import FALLBACK, PENDING, READY, get_advice_service, llm_advice
+from .benchmark import (benchmark_concurrent_writes, compare_reports, generate_workbook, probe_startup,
+                        run_benchmarks)
+from .extraction import (CSV, PARQUET, XLSX, LabelIndex, StreamingExtractor, detect_format, extract_fields,
+                         read_pnl_fields, stream_extract)
+from . import ingest
+from .ingest import build_result, infer_sheet_company_period, ingest_sources
+from .jobs import enqueue_upload, requeue_stale_jobs, run_worker
+from .ml.serving import predict_ml_scores
+from .ml.training import db_source, save_artifact, train_streaming
+from .models import CompanyTrend, FinancialRecord, FinancialScore, ScoreSummary, UploadFingerprint, UploadJob
+from .ranking import PercentileIndex, percentile_index
+from .rescoring import rescore_range
+from .summaries import period_summaries, rebuild_summaries, summary_rows
+from .trends import backfill_trends, find_previous
+from .utils import (advice_codes, calculate_weighted_score, calculate_weighted_scores, generate_rule_based_advice,
+                    ratios_from_figures, render_advice)
+from .whatif import baseline_figures, score_changes
+
+
+def _pnl_rows():
+    return [
+        ["ABC (Pvt) Ltd", None, None, None],
+        ["Profit & Loss Statement", None, "2024", "2025"],
+        [None, "Income", 900.0, 1000.0],
+        [None, "Gross Profit", 350.0, 400.0],
+        [None, "Administrative Expenses", None, 120.0],
+        ["Selling & Distribution", None, None, None],
+        [None, "  Distribution Costs ", 50.0, "60"],
+        [None, "Finance Costs", 20.0, 25.0],
+        [None, "Total Income", None, 1100.0],
+    ]
+
+
+def _workbook_bytes(rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+class ExtractionTests(SimpleTestCase):
+    def test_first_match_rightmost_number(self):
+        values = extract_fields(pd.DataFrame(_pnl_rows()))
+        self.assertEqual(values["total_income"], 1100.0)
+        self.assertEqual(values["gross_profit"], 400.0)
+        self.assertEqual(values["admin_expenses"], 120.0)
+        self.assertEqual(values["distribution_costs"], 60.0)
+        self.assertEqual(values["finance_costs"], 25.0)
+        self.assertEqual(values["revenue_growth_rate"], 0.0)
+
+    def test_matched_row_without_numbers_falls_through(self):
+        index = LabelIndex.from_rows(_pnl_rows())
+        self.assertEqual(index.lookup(["Selling & Distribution", "Distribution Costs"]), 60.0)
+        self.assertIsNone(index.lookup(["Revenue Growth"], default=None))
+
+    def test_streaming_matches_dataframe_path(self):
+        rows = _pnl_rows() + [[None, "Revenue Growth", 4.5]]
+        streamed = stream_extract(_workbook_bytes(rows))
+        self.assertEqual(streamed, extract_fields(pd.read_excel(_workbook_bytes(rows), header=None)))
+
+    def test_streaming_stops_once_all_fields_resolved(self):
+        rows = _pnl_rows() + [[f"Account {i}", i] for i in range(100)]
+        extractor = StreamingExtractor({"gross_profit": ["Gross Profit"], "total_income": ["Total Income", "Income"]})
+        for row in rows:
+            if extractor.feed(row):
+                break
+        self.assertEqual(extractor.rows_read, len(_pnl_rows()))
+        self.assertEqual(extractor.result(), {"gross_profit": 400.0, "total_income": 1100.0})
+
+    def test_csv_export_matches_workbook(self):
+        rows = _pnl_rows() + [[None, "Revenue Growth", "(4.5)"], [None, "Total Income", "1,100.00"]]
+        text = io.StringIO()
+        csv.writer(text, delimiter=";").writerows(rows)
+        export = io.BytesIO(text.getvalue().encode())
+        self.assertEqual(detect_format(export), CSV)
+        self.assertEqual(detect_format(_workbook_bytes(rows)), XLSX)
+        expected = dict(stream_extract(_workbook_bytes(_pnl_rows())), revenue_growth_rate=-4.5)
+        self.assertEqual(read_pnl_fields(export), expected)
+
+    @skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_parquet_export_matches_workbook(self):
+        df = pd.DataFrame({"label": ["Total Income", "Gross Profit", "Notes", "Finance Costs"],
+                           "y2024": [900.0, 350.0, None, 20.0], "y2025": [1000.0, 400.0, None, 25.0],
+                           "filed": pd.to_datetime(["2025-04-01"] * 4)})
+        export = io.BytesIO()
+        df.to_parquet(export, index=False)
+        export.seek(0)
+        self.assertEqual(detect_format(export), PARQUET)
+        values = read_pnl_fields(export)
+        self.assertEqual(values, extract_fields(df.drop(columns="filed")))
+        self.assertEqual((values["total_income"], values["finance_costs"]), (1000.0, 25.0))
+
+
+class BatchScoringTests(SimpleTestCase):
+    def test_batch_matches_scalar_path(self):
+        figures = [
+            (1000.0, 400.0, 120.0, 60.0, 25.0, 4.5),
+            (1000.0, 267.5, 0.0, 0.0, 0.0, 0.0),
+            (0.0, 0.0, 10.0, 0.0, 0.0, 0.0),
+            (2500.0, 2400.0, 10.0, 5.0, 1.0, 12.0),
+        ]
+        records = [
+            FinancialRecord(total_income=i, gross_profit=g, admin_expenses=a, distribution_costs=d,
+                            finance_costs=f, net_profit=g - (a + d + f), revenue_growth_rate=r)
+            for i, g, a, d, f, r in figures
+        ]
+        columns = list(zip(*figures))
+        batch = calculate_weighted_scores(ratios_from_figures(
+            columns[0], columns[1], columns[2], columns[3], columns[4],
+            [r.net_profit for r in records], columns[5]))
+        for i, record in enumerate(records):
+            score, category, _, contributions = calculate_weighted_score(record)
+            self.assertEqual(batch.scores[i], score)
+            self.assertEqual(batch.categories[i], category)
+            self.assertEqual({k: v[i] for k, v in batch.contributions.items()}, contributions)
+
+
+class AdviceTests(SimpleTestCase):
+    def test_codes_render_to_full_advice(self):
+        ratios = {"net_profit_margin": 5.0, "expense_ratio": 45.0, "gross_profit_margin": 42.0,
+                  "finance_cost_ratio": 12.0, "revenue_growth_rate": 0.0}
+        codes = advice_codes(ratios, "Medium")
+        self.assertEqual(codes, ("OM", "E2", "F1", "G1", "M1", "NM"))
+        text = render_advice(codes, ratios)
+        self.assertEqual(text, generate_rule_based_advice(ratios, "Medium"))
+        self.assertIn("Expense ratio 45.0%", text)
+
+
+class UploadTests(TestCase):
+    def test_upload_pnl_scores_and_saves(self):
+        upload = SimpleUploadedFile("pnl.xlsx", _workbook_bytes(_pnl_rows()).read())
+        response = self.client.post(reverse("upload_pnl"), {"company_name": "ABC", "period": "2025", "file": upload})
+        self.assertEqual(response.status_code, 200)
+        score = FinancialScore.objects.select_related("record").get()
+        self.assertEqual(score.record.net_profit, 400.0 - (120.0 + 60.0 + 25.0))
+        self.assertEqual(response.context["score"], score.weighted_score)
+        self.assertIsNone(score.suggestion)
+        self.assertTrue(score.advice_codes)
+        self.assertEqual(score.advice, response.context["advisory"])
+
+    # Built once: openpyxl stamps the save time into the file, so re-saving could change its digest
+    pnl_xlsx = _workbook_bytes(_pnl_rows()).read()
+
+    def _upload(self, company="ABC"):
+        upload = SimpleUploadedFile("pnl.xlsx", self.pnl_xlsx)
+        return self.client.post(reverse("upload_pnl"), {"company_name": company, "period": "2025", "file": upload})
+
+    def test_upload_accepts_csv_export(self):
+        text = io.StringIO()
+        csv.writer(text).writerows(_pnl_rows())
+        upload = SimpleUploadedFile("pnl.csv", text.getvalue().encode())
+        response = self.client.post(reverse("upload_pnl"), {"company_name": "ABC", "period": "2025", "file": upload})
+        self.assertEqual(response.context["income"], 1100.0)
+        self.assertEqual(response.context["net_profit"], 400.0 - (120.0 + 60.0 + 25.0))
+
+    def test_duplicate_upload_reuses_existing_record(self):
+        self._upload()
+        with mock.patch("analysis.ingest.read_pnl_fields") as read:
+            response = self._upload()
+        read.assert_not_called()
+        self.assertEqual(FinancialRecord.objects.count(), 1)
+        self.assertEqual(response.context["company"], "ABC")
+
+    def test_duplicate_upload_under_other_company_copies_instead_of_reusing(self):
+        self._upload()
+        with mock.patch("analysis.ingest.read_pnl_fields") as read:
+            response = self._upload(company="Other")
+        read.assert_not_called()
+        self.assertEqual(response.context["company"], "Other")
+        self.assertEqual(sorted(FinancialRecord.objects.values_list("company_name", flat=True)), ["ABC", "Other"])
+
+    @override_settings(ANALYSIS_DUPLICATE_UPLOAD_POLICY="copy")
+    def test_duplicate_upload_copy_policy_creates_row_without_parsing(self):
+        self._upload()
+        with mock.patch("analysis.ingest.read_pnl_fields") as read:
+            self._upload(company="Other")
+        read.assert_not_called()
+        self.assertEqual(sorted(FinancialRecord.objects.values_list("company_name", flat=True)), ["ABC", "Other"])
+
+    def test_fingerprints_from_other_keyword_versions_are_ignored(self):
+        self._upload()
+        UploadFingerprint.objects.update(extraction_version="stale")
+        self._upload()
+        self.assertEqual(FinancialRecord.objects.count(), 2)
+
+    def test_bulk_ingest_reports_per_file(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("ABC__2025.xlsx", _workbook_bytes(_pnl_rows()).read())
+            zf.writestr("Empty__2025.xlsx", _workbook_bytes([["nothing here"]]).read())
+            zf.writestr("notes.txt", "ignored")
+        archive.seek(0)
+        upload = SimpleUploadedFile("batch.zip", archive.read())
+        response = self.client.post(reverse("bulk_upload"), {"files": upload})
+        report = {r["file"]: r for r in response.context["report"]}
+        self.assertEqual(set(report), {"ABC__2025.xlsx", "Empty__2025.xlsx"})
+        self.assertEqual(report["ABC__2025.xlsx"]["status"], "ok")
+        self.assertEqual(report["Empty__2025.xlsx"]["status"], "error")
+        record = FinancialRecord.objects.get()
+        self.assertEqual((record.company_name, record.period), ("ABC", "2025"))
+
+    def test_all_sheets_mode_scores_each_pnl_sheet(self):
+        workbook = Workbook()
+        workbook.active.title = "2024"
+        for row in (["Total Income", 900.0], ["Gross Profit", 350.0]):
+            workbook["2024"].append(row)
+        for title in ("2025", "Subsidiary B"):
+            sheet = workbook.create_sheet(title)
+            for row in _pnl_rows():
+                sheet.append(row)
+        workbook.create_sheet("Notes").append(["Prepared by the group accountant"])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        upload = SimpleUploadedFile("group.xlsx", buffer.getvalue())
+        with override_settings(ANALYSIS_BULK_WORKERS=2):
+            response = self.client.post(reverse("upload_pnl"), {"company_name": "ABC", "period": "2025",
+                                                                "file": upload, "all_sheets": "1"})
+        report = {r["sheet"]: r for r in response.context["report"]}
+        self.assertEqual([r["status"] for r in report.values()], ["ok", "ok", "ok", "skipped"])
+        self.assertEqual(response.context["ok_count"], 3)
+        records = {(r.company_name, r.period): r for r in FinancialRecord.objects.all()}
+        self.assertEqual(set(records), {("ABC", "2024"), ("ABC", "2025"), ("Subsidiary B", "2025")})
+        self.assertEqual(records[("ABC", "2024")].total_income, 900.0)
+        # Growth comes from the other sheet of the same workbook
+        self.assertEqual(records[("ABC", "2025")].previous_record_id, records[("ABC", "2024")].id)
+        self.assertAlmostEqual(records[("ABC", "2025")].revenue_growth_rate, 200 / 900 * 100)
+
+    def test_sheet_batches_share_one_spilled_workbook(self):
+        workbook = Workbook()
+        for i in range(5):
+            sheet = workbook.create_sheet(f"{2020 + i}")
+            for row in _pnl_rows():
+                sheet.append(row)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        jobs = []
+        real_run = ingest._run_parsers
+
+        def run(parser, batch_jobs, workers):
+            jobs.extend(batch_jobs)
+            return real_run(parser, batch_jobs, 1)
+
+        with mock.patch("analysis.ingest._run_parsers", run):
+            results = ingest.parse_sheets(buffer.getvalue(), workers=2)
+        self.assertEqual([sheet for sheet, _, _ in results], workbook.sheetnames)
+        self.assertEqual([len(args[1]) for _, args in jobs], [3, 3])
+        path = jobs[0][1][0]
+        self.assertIsInstance(path, str)
+        self.assertFalse(os.path.exists(path))
+
+    def test_sheet_names_set_company_or_period(self):
+        self.assertEqual(infer_sheet_company_period("Mar 2025", "ABC", "N/A"), ("ABC", "Mar 2025"))
+        self.assertEqual(infer_sheet_company_period("Subsidiary B", "ABC", "2025"), ("Subsidiary B", "2025"))
+        self.assertEqual(infer_sheet_company_period("XYZ__2024", "ABC", "2025"), ("XYZ", "2024"))
+
+
+
+class UploadWorkerTests(TransactionTestCase):
+    """The worker opens and closes its own connections, which a TestCase transaction would not survive."""
+
+    def test_async_upload_returns_job_and_worker_completes_it(self):
+        with override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())):
+            upload = SimpleUploadedFile("pnl.xlsx", _workbook_bytes(_pnl_rows()).read())
+            response = self.client.post(reverse("upload_pnl"),
+                                        {"company_name": "ABC", "period": "2025", "file": upload, "async": "1"},
+                                        HTTP_ACCEPT="application/json")
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(FinancialRecord.objects.count(), 0)
+            status_url = response.json()["status_url"]
+
+            self.assertEqual(run_worker(once=True), 1)
+            status = self.client.get(status_url, {"format": "json"}).json()
+            self.assertEqual(status["status"], "done")
+            self.assertEqual(self.client.get(status["result_url"]).context["company"], "ABC")
+
+    def test_failed_job_deletes_its_file(self):
+        with override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())):
+            job = enqueue_upload(SimpleUploadedFile("empty.xlsx", _workbook_bytes([["nothing here"]]).read()),
+                                 "ABC", "2025")
+            path = job.file.path
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(run_worker(once=True), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, UploadJob.FAILED)
+            self.assertFalse(job.file)
+            self.assertFalse(os.path.exists(path))
+
+    def test_long_running_worker_keeps_requeueing_stale_jobs(self):
+        class Stop(Exception):
+            pass
+
+        with mock.patch("analysis.jobs.requeue_stale_jobs", wraps=requeue_stale_jobs) as requeue, \
+                mock.patch("analysis.jobs.time.sleep", side_effect=[None, None, Stop]):
+            with self.assertRaises(Stop):
+                run_worker(stale_after=0)
+        self.assertEqual(requeue.call_count, 3)
+
+
+class ConcurrentWriteTests(TransactionTestCase):
+    def test_sqlite_profile_applies_wal_pragmas(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite profile only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_concurrent_upload_workers_write_every_record_without_lock_errors(self):
+        results = benchmark_concurrent_writes(workers=(1, 4), uploads=24)
+        self.assertEqual([r["errors"] for r in results.values()], [0, 0])
+        self.assertEqual(FinancialRecord.objects.count(), 48)
+        self.assertEqual(FinancialScore.objects.count(), 48)
+
+    def test_contending_workers_wait_on_busy_timeout_instead_of_failing(self):
+        # Throughput is benchmark.py's job; this only checks that writers queue on the lock
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA busy_timeout")
+                self.assertIn(f"PRAGMA busy_timeout={cursor.fetchone()[0]}", settings.ANALYSIS_SQLITE_PRAGMAS)
+        results = benchmark_concurrent_writes(workers=(8,), uploads=40)
+        self.assertEqual(results["workers_8"]["errors"], 0, results["workers_8"].get("first_error"))
+        self.assertEqual(FinancialRecord.objects.filter(company_name__startswith="Concurrent 8.").count(), 40)
+        self.assertEqual(FinancialScore.objects.filter(record__company_name__startswith="Concurrent 8.").count(), 40)
+
+
+class RescoreTests(TestCase):
+    def test_rescore_fixes_stale_scores_and_resumes(self):
+        values = {"total_income": 1000.0, "gross_profit": 400.0, "admin_expenses": 120.0,
+                  "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": None}
+        ids = []
+        for _ in range(5):
+            record, score, _ = build_result("ABC", "2025", values)
+            record.save()
+            score.record = record
+            expected = (score.weighted_score, score.category)
+            score.weighted_score, score.category = 99.0, "High"
+            score.save()
+            ids.append(record.id)
+
+        checkpoint = self.enterContext(tempfile.TemporaryDirectory()) + "/ck.json"
+        with open(checkpoint, "w") as f:
+            json.dump({"start_id": ids[0], "end_id": ids[-1], "last_id": ids[1]}, f)
+        self.assertEqual(rescore_range(ids[0], ids[-1], chunk_size=2, checkpoint=checkpoint), (3, 3))
+        self.assertFalse(os.path.exists(checkpoint))
+        self.assertEqual(rescore_range(ids[0], ids[-1], chunk_size=2, checkpoint=checkpoint), (5, 2))
+        for score in FinancialScore.objects.all():
+            self.assertEqual((score.weighted_score, score.category), expected)
+            self.assertIn("Negative or stagnant", score.advice)
+            self.assertIsNone(score.suggestion)
+
+        with open(checkpoint, "w") as f:
+            json.dump({"start_id": ids[0], "end_id": ids[-2], "last_id": ids[1]}, f)
+        with self.assertRaises(ValueError):
+            rescore_range(ids[0], ids[-1], checkpoint=checkpoint)
+
+    def test_command_resumes_interrupted_ranges_after_new_rows(self):
+        values = {"total_income": 1000.0, "gross_profit": 400.0, "admin_expenses": 120.0,
+                  "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": None}
+        ids = []
+        for _ in range(4):
+            record, score, _ = build_result("ABC", "2025", values)
+            record.save()
+            score.record = record
+            score.weighted_score = 99.0
+            score.save()
+            ids.append(record.id)
+        prefix = self.enterContext(tempfile.TemporaryDirectory()) + "/ck"
+        with open(f"{prefix}.0.json", "w") as f:
+            json.dump({"start_id": ids[0], "end_id": ids[2], "last_id": ids[0]}, f)
+
+        out = io.StringIO()
+        call_command("rescore", checkpoint=prefix, stdout=out)
+        self.assertIn("Resuming 1 unfinished id range", out.getvalue())
+        self.assertIn("Rescored 2 records", out.getvalue())
+        self.assertEqual(FinancialScore.objects.filter(weighted_score=99.0).count(), 2)
+        self.assertFalse(os.path.exists(f"{prefix}.0.json"))
+
+        with open(f"{prefix}.1.json", "w") as f:
+            json.dump({"start_id": ids[3], "end_id": ids[3], "last_id": ids[3]}, f)
+        out = io.StringIO()
+        call_command("rescore", checkpoint=prefix, reset=True, stdout=out)
+        self.assertIn("Removed 1 checkpoint file", out.getvalue())
+        self.assertIn("Rescored 4 records", out.getvalue())
+        self.assertFalse(FinancialScore.objects.filter(weighted_score=99.0).exists())
+
+
+class ParallelRescoreTests(TransactionTestCase):
+    def test_worker_progress_goes_to_the_command_stdout(self):
+        values = {"total_income": 1000.0, "gross_profit": 400.0, "admin_expenses": 120.0,
+                  "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": None}
+        for _ in range(4):
+            record, score, _ = build_result("ABC", "2025", values)
+            record.save()
+            score.record = record
+            score.weighted_score = 99.0
+            score.save()
+
+        out = io.StringIO()
+        call_command("rescore", workers=2, chunk_size=1, stdout=out)
+        self.assertEqual(out.getvalue().count("rows processed"), 4)
+        self.assertIn("Rescored 4 records; 4 scores changed.", out.getvalue())
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        for i in range(30):
+            values = {"total_income": 1000.0, "gross_profit": 400.0 + i * 20, "admin_expenses": 120.0,
+                      "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": 0.0}
+            record, score, _ = build_result("Even" if i % 2 == 0 else "Odd", f"2025-{i:02d}", values)
+            record.save()
+            score.record = record
+            score.save()
+
+    def test_keyset_pages_walk_forward_and_back(self):
+        first = self.client.get(reverse("dashboard"))
+        self.assertEqual(len(first.context["scores"]), 25)
+        self.assertIsNone(first.context["prev_url"])
+        second = self.client.get(reverse("dashboard") + first.context["next_url"])
+        self.assertEqual(len(second.context["scores"]), 5)
+        self.assertIsNone(second.context["next_url"])
+        back = self.client.get(reverse("dashboard") + second.context["prev_url"])
+        self.assertEqual([s.id for s in back.context["scores"]], [s.id for s in first.context["scores"]])
+
+    def test_filters(self):
+        response = self.client.get(reverse("dashboard"), {"company": "Odd", "min_score": "0"})
+        self.assertEqual(len(response.context["scores"]), 15)
+        self.assertTrue(all(s.record.company_name == "Odd" for s in response.context["scores"]))
+        high = FinancialScore.objects.filter(category="High").count()
+        response = self.client.get(reverse("dashboard"), {"category": "High"})
+        self.assertEqual(len(response.context["scores"]), high)
+
+    def test_filtered_pages_walk_forward_and_back(self):
+        params = {"company": "Even", "page_size": "10"}
+        first = self.client.get(reverse("dashboard"), params)
+        ids = [s.record_id for s in first.context["scores"]]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        second = self.client.get(reverse("dashboard") + first.context["next_url"])
+        self.assertEqual(len(second.context["scores"]), 5)
+        self.assertTrue(all(s.record.company_name == "Even" for s in second.context["scores"]))
+        self.assertLess(second.context["scores"][0].record_id, ids[-1])
+        back = self.client.get(reverse("dashboard") + second.context["prev_url"])
+        self.assertEqual([s.record_id for s in back.context["scores"]], ids)
+
+    def test_score_range_pages_walk_highest_score_first(self):
+        params = {"min_score": "20", "page_size": "4"}
+        expected = list(FinancialScore.objects.filter(weighted_score__gte=20)
+                        .order_by("-weighted_score", "-record_id").values_list("id", flat=True))
+        self.assertGreater(len(expected), 8)
+        seen, response = [], self.client.get(reverse("dashboard"), params)
+        while True:
+            seen.extend(s.id for s in response.context["scores"])
+            if not response.context["next_url"]:
+                break
+            response = self.client.get(reverse("dashboard") + response.context["next_url"])
+        self.assertEqual(seen, expected)
+        back = self.client.get(reverse("dashboard") + response.context["prev_url"])
+        self.assertEqual([s.id for s in back.context["scores"]], expected[-4 - len(response.context["scores"]):
+                                                                          -len(response.context["scores"])])
+
+    def test_score_range_page_is_an_index_range_scan(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite query plans only")
+        for params, index in (({"min_score": "20", "max_score": "30", "after": "9", "after_score": "25.0"},
+                               "score_score_record_idx"),
+                              ({"category": "Low", "max_score": "30"}, "score_category_score_idx")):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse("dashboard"), params)
+            sql = next(q["sql"] for q in queries.captured_queries
+                       if "ORDER BY" in q["sql"] and '"analysis_financialscore"."weighted_score" DESC' in q["sql"])
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = " ".join(row[-1] for row in cursor.fetchall())
+            self.assertIn(index, plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_summaries_come_from_running_totals(self):
+        response = self.client.get(reverse("dashboard"), {"company": "Odd"})
+        summary = response.context["summary"]
+        odd = FinancialScore.objects.filter(record__company_name="Odd")
+        self.assertEqual(summary["count"], 15)
+        self.assertAlmostEqual(summary["weighted_score_mean"], sum(s.weighted_score for s in odd) / 15)
+        self.assertEqual(sum(summary["categories"].values()), 15)
+        # Only 2025-01..2025-12 parse as months; the rest sort after them
+        self.assertEqual(response.context["period_summaries"][0]["key"], "2025-12")
+
+    def test_period_summaries_order_parsed_periods_not_label_text(self):
+        ScoreSummary.objects.all().delete()
+        values = {"total_income": 1000.0, "gross_profit": 400.0, "admin_expenses": 120.0,
+                  "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": 0.0}
+        for period in ("Nov 2024", "Jan 2025", "Dec 2024"):
+            record, score, _ = build_result("ABC", period, values)
+            record.save()
+            score.record = record
+            score.save()
+        self.assertEqual([s.key for s in period_summaries()], ["Jan 2025", "Dec 2024", "Nov 2024"])
+
+
+class ChartDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        percentile_index.invalidate()
+
+    def _save(self, company, period, gross_profit):
+        values = {"total_income": 1000.0, "gross_profit": gross_profit, "admin_expenses": 120.0,
+                  "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": 0.0}
+        record, score, _ = build_result(company, period, values)
+        with self.captureOnCommitCallbacks(execute=True):
+            record.save()
+            score.record = record
+            score.save()
+        return score
+
+    def test_unchanged_data_is_a_304_without_queries(self):
+        self._save("ABC", "2025", 400.0)
+        url = reverse("chart_distribution")
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(sum(first.json()["counts"]), 1)
+        with self.assertNumQueries(0):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+        self._save("XYZ", "2025", 900.0)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+        self.assertEqual(sum(changed.json()["counts"]), 2)
+
+    def test_category_mix_and_company_series(self):
+        scores = [self._save("ABC", period, gross_profit)
+                  for period, gross_profit in (("2024", 300.0), ("2025", 900.0))]
+        mix = self.client.get(reverse("chart_categories")).json()
+        self.assertEqual(mix["periods"], ["2024", "2025"])
+        self.assertEqual([mix[c][1] for c in ("High", "Medium", "Low")].count(1), 1)
+        series = self.client.get(reverse("chart_company"), {"company": "ABC"}).json()
+        self.assertEqual(series["periods"], ["2024", "2025"])
+        self.assertEqual(series["scores"], [s.weighted_score for s in scores])
+
+    def test_periods_are_ordered_parsed_not_as_text(self):
+        for period in ("2024-Q4", "Jan 2025", "Nov 2024", "Dec 2024"):
+            self._save("ABC", period, 400.0)
+        # By where each period ends; 2024-Q4 and Dec 2024 tie and fall back to the label
+        expected = ["Nov 2024", "2024-Q4", "Dec 2024", "Jan 2025"]
+        self.assertEqual(self.client.get(reverse("chart_categories")).json()["periods"], expected)
+        series = self.client.get(reverse("chart_company"), {"company": "ABC"}).json()
+        self.assertEqual(series["periods"], expected)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        for i in range(12):
+            values = {"total_income": 1000.0, "gross_profit": 300.0 + i * 40, "admin_expenses": 120.0,
+                      "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": 0.0}
+            record, score, _ = build_result("Even" if i % 2 == 0 else "Odd", f"2025-{i:02d}", values)
+            record.save()
+            score.record = record
+            score.save()
+
+    def test_csv_streams_filtered_rows(self):
+        response = self.client.get(reverse("export_scores"), {"company": "Odd", "min_score": "0"})
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({row["company_name"] for row in rows}, {"Odd"})
+        expected = FinancialScore.objects.filter(record__company_name="Odd").order_by("id")
+        self.assertEqual([float(row["weighted_score"]) for row in rows], [s.weighted_score for s in expected])
+        self.assertEqual(self.client.get(reverse("export_scores"), {"format": "pdf"}).status_code, 400)
+
+    def test_xlsx_and_command_match(self):
+        response = self.client.get(reverse("export_scores"), {"format": "xlsx", "category": "High"})
+        sheet = load_workbook(io.BytesIO(b"".join(response.streaming_content)), read_only=True)["scores"]
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][-1], "category")
+        self.assertEqual(len(rows) - 1, FinancialScore.objects.filter(category="High").count())
+
+        out = io.StringIO()
+        call_command("export_scores", "--category", "High", stdout=out)
+        self.assertEqual(len(list(csv.reader(io.StringIO(out.getvalue())))), len(rows))
+
+
+class SummaryTests(TestCase):
+    FIGURES = {"total_income": 1000.0, "gross_profit": 400.0, "admin_expenses": 120.0,
+               "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": 0.0}
+
+    def assertMatchesRebuild(self):
+        def snapshot(rows):
+            return {(s.dimension, s.key): [round(getattr(s, f.attname), 6) for f in ScoreSummary._meta.fields[3:]]
+                    for s in rows if s.count}
+        self.assertEqual(snapshot(ScoreSummary.objects.all()), snapshot(summary_rows()))
+
+    def test_totals_follow_saves_bulk_inserts_rescores_and_deletes(self):
+        for company, period, gross_profit in (("ABC", "2024", 300.0), ("ABC", "2025", 420.0), ("XYZ", "2025", 900.0)):
+            record, score, _ = build_result(company, period, dict(self.FIGURES, gross_profit=gross_profit))
+            record.save()
+            score.record = record
+            score.save()
+        self.assertMatchesRebuild()
+        overall = ScoreSummary.objects.get(dimension=ScoreSummary.OVERALL)
+        self.assertEqual(overall.count, 3)
+        self.assertAlmostEqual(overall.mean(), sum(FinancialScore.objects.values_list("weighted_score", flat=True)) / 3)
+
+        ingest_sources([("DEF__2025.xlsx", _workbook_bytes(_pnl_rows()).read())], workers=1)
+        self.assertMatchesRebuild()
+
+        FinancialScore.objects.update(weighted_score=1.0, category="Low")
+        rebuild_summaries()
+        rescore_range(0, 10 ** 9)
+        self.assertMatchesRebuild()
+
+        FinancialRecord.objects.filter(company_name="ABC").delete()
+        self.assertMatchesRebuild()
+        self.assertFalse(ScoreSummary.objects.filter(dimension=ScoreSummary.COMPANY, key="ABC", count__gt=0).exists())
+
+
+class ScoreApiTests(TestCase):
+    FIGURES = {"total_income": 1000.0, "gross_profit": 400.0, "admin_expenses": 120.0,
+               "distribution_costs": 60.0, "finance_costs": 25.0, "revenue_growth_rate": 4.5}
+
+    def _post(self, payload):
+        return self.client.post(reverse("score_api"), json.dumps(payload), content_type="application/json")
+
+    def test_batch_of_figures_and_ratios_matches_scalar_path(self):
+        record, expected, _ = build_result("ABC", "2025", self.FIGURES)
+        ratios = {"net_profit_margin": expected.net_profit_margin, "expense_ratio": expected.expense_ratio,
+                  "gross_profit_margin": expected.gross_profit_margin,
+                  "finance_cost_ratio": expected.finance_cost_ratio, "revenue_growth_rate": 4.5}
+        response = self._post({"items": [self.FIGURES, ratios]})
+        self.assertEqual(response.status_code, 200)
+        for result in response.json()["results"]:
+            self.assertEqual(result["score"], expected.weighted_score)
+            self.assertEqual(result["category"], expected.category)
+            self.assertEqual(result["contributions"], calculate_weighted_score(record)[3])
+        self.assertEqual(FinancialRecord.objects.count(), 0)
+
+    @override_settings(ANALYSIS_API_TOKEN="s3cret")
+    def test_persist_saves_records_through_ingest(self):
+        figures = {k: v for k, v in self.FIGURES.items() if k != "revenue_growth_rate"}
+        items = [dict(figures, company_name="ABC", period="2024", net_profit=150.0),
+                 dict(figures, company_name="ABC", period="2025", total_income=1100.0)]
+        response = self.client.post(reverse("score_api"), json.dumps({"items": items, "persist": True}),
+                                    content_type="application/json", HTTP_AUTHORIZATION="Bearer s3cret")
+        results = response.json()["results"]
+        for result in results:
+            score = FinancialScore.objects.select_related("record").get(record_id=result["record_id"])
+            self.assertEqual((score.weighted_score, score.category), (result["score"], result["category"]))
+        first = FinancialRecord.objects.get(id=results[0]["record_id"])
+        second = FinancialRecord.objects.get(id=results[1]["record_id"])
+        self.assertEqual(first.net_profit, 150.0)
+        self.assertEqual(second.previous_record, first)
+        self.assertAlmostEqual(results[1]["ratios"]["revenue_growth_rate"], 10.0)
+        self.assertEqual(CompanyTrend.objects.get(company_name="ABC").periods, 2)
+
+    @override_settings(ANALYSIS_API_TOKEN="s3cret")
+    def test_persist_needs_the_api_token(self):
+        payload = json.dumps({"items": [dict(self.FIGURES, company_name="ABC", period="2025")], "persist": True})
+        self.assertEqual(self._post(json.loads(payload)).status_code, 403)
+        response = self.client.post(reverse("score_api"), payload, content_type="application/json",
+                                    HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(FinancialRecord.objects.count(), 0)
+
+    def test_invalid_payload_is_rejected(self):
+        self.assertEqual(self._post({"items": [{"total_income": "lots"}]}).status_code, 400)
+        self.assertEqual(self._post([]).status_code, 400)
+
+
+class WhatIfTests(TestCase):
+    def setUp(self):
+        record, score, _ = build_result("ABC", "2025", dict(ScoreApiTests.FIGURES, gross_profit=420.0))
+        record.save()
+        score.record = record
+        score.save()
+        self.record, self.score = record, score
+
+    def _post(self, payload, record_id=None):
+        return self.client.post(reverse("whatif_api", args=[record_id or self.record.id]), json.dumps(payload),
+                                content_type="application/json")
+
+    def test_grid_and_threshold_crossings(self):
+        ranges = {"admin_expenses": {"min": -40, "max": 0, "steps": 5}, "finance_costs": [-20, 20, 5],
+                  "revenue_growth_rate": [0, 10]}
+        data = self._post({"ranges": ranges, "grid": True}).json()
+        self.assertEqual(data["baseline"], {"score": self.score.weighted_score, "category": self.score.category})
+        self.assertEqual(data["scenarios"], 5 * 5 * 9)
+        self.assertEqual(sum(data["categories"].values()), data["scenarios"])
+        self.assertEqual(max(data["grid"]["scores"]), data["best"]["score"])
+
+        medium = next(c for c in data["crossings"] if c["category"] == "Medium")
+        self.assertEqual(medium["direction"], "up")
+        self.assertIn("admin_expenses", medium["single_input"])
+        base = baseline_figures(self.record)
+        for field, change in medium["single_input"].items():
+            # The reported change reaches Medium and a step less does not
+            self.assertEqual(score_changes(base, {field: change}, 1).categories[0], "Medium")
+            self.assertNotEqual(score_changes(base, {field: change - 0.5 * (change > 0 or -1)}, 1).categories[0],
+                                "Medium")
+        self.assertEqual(medium["combined"]["category"], "Medium")
+        sensitivity = {row["input"]: row for row in data["sensitivity"]}
+        self.assertLess(sensitivity["admin_expenses"]["points_per_unit"], 0)
+        self.assertAlmostEqual(sensitivity["revenue_growth_rate"]["points_per_unit"], 0.202, places=3)
+
+    def test_invalid_ranges_are_rejected(self):
+        self.assertEqual(self._post({"ranges": {"rent": [0, 10]}}).status_code, 400)
+        self.assertEqual(self._post({"ranges": {"admin_expenses": [10, 0]}}).status_code, 400)
+        too_many = {field: [-10, 10, 101] for field in ("total_income", "admin_expenses", "finance_costs")}
+        self.assertEqual(self._post({"ranges": too_many}).status_code, 400)
+        self.assertEqual(self._post({}, record_id=self.record.id + 1).status_code, 404)
+        self.assertEqual(self._post({}).json()["scenarios"], 9 ** 4)
+
+
+class ModelServingTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "model.pkl")
+        override = override_settings(ANALYSIS_ML_MODEL_PATH=self.path, ANALYSIS_ML_RELOAD_INTERVAL=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _train(self, offset):
+        import joblib
+        from sklearn.linear_model import LinearRegression
+
+        X = pd.DataFrame([[i, (i * 7) % 11, (i * 3) % 13, i % 7, i % 5] for i in range(40)],
+                         columns=["net_profit_margin", "expense_ratio", "gross_profit_margin",
+                                  "finance_cost_ratio", "revenue_growth_rate"])
+        joblib.dump(LinearRegression().fit(X, X["net_profit_margin"] + offset), self.path)
+
+    def test_upload_stores_ml_score_and_hot_reloads(self):
+        self.assertEqual(predict_ml_scores({})[0], None)
+        self._train(offset=10)
+        upload = SimpleUploadedFile("pnl.xlsx", _workbook_bytes(_pnl_rows()).read())
+        self.client.post(reverse("upload_pnl"), {"company_name": "ABC", "period": "2025", "file": upload})
+        score = FinancialScore.objects.get()
+        self.assertAlmostEqual(score.ml_score, score.net_profit_margin + 10, places=1)
+        first_version = score.ml_model_version
+
+        self._train(offset=20)
+        os.utime(self.path, ns=(1, 1))  # distinct mtime even on coarse-grained filesystems
+        scores, version = predict_ml_scores({"net_profit_margin": [5.0], "expense_ratio": [0.0],
+                                             "gross_profit_margin": [0.0], "finance_cost_ratio": [0.0],
+                                             "revenue_growth_rate": [0.0]})
+        self.assertAlmostEqual(float(scores[0]), 25.0, places=1)
+        self.assertNotEqual(version, first_version)
+
+    def test_streamed_training_from_stored_scores_is_served(self):
+        for i in range(60):
+            record, score, _ = build_result(f"C{i}", "2025", {
+                "total_income": 1000.0, "gross_profit": 300.0 + 5 * i, "admin_expenses": 100.0 + (i * 7) % 40,
+                "distribution_costs": 50.0, "finance_costs": 10.0 + i % 9, "revenue_growth_rate": i % 11})
+            record.save()
+            score.record = record
+            score.save()
+        # Smoke-test target: weighted_score is the rule-based formula of the same ratios
+        with self.assertRaisesMessage(CommandError, "--target is required"):
+            call_command("train_model", dry_run=True, stdout=io.StringIO())
+        model, metadata = train_streaming(db_source("weighted_score", chunk_size=16), epochs=20, holdout=0.2)
+        self.assertEqual(metadata["train_rows"] + metadata["holdout"]["rows"], 60)
+        self.assertLess(metadata["holdout"]["mae"], 10.0)
+
+        metadata = save_artifact(model, metadata, self.path)
+        with open(self.path + ".json") as f:
+            self.assertEqual(json.load(f)["version"], metadata["version"])
+        self.assertEqual(predict_ml_scores({name: [1.0] for name in metadata["features"]})[1], metadata["version"])
+
+
+class BenchmarkTests(TestCase):
+    def test_generated_workbooks_extract_to_expected_values(self):
+        for seed in range(10):
+            data, expected = generate_workbook(rows=40, seed=seed)
+            self.assertEqual(generate_workbook(rows=40, seed=seed)[1], expected)
+            self.assertEqual(extract_fields(pd.read_excel(io.BytesIO(data), header=None)), expected)
+            self.assertEqual(stream_extract(io.BytesIO(data)), expected)
+
+    def test_report_covers_every_stage_and_flags_regressions(self):
+        report = json.loads(json.dumps(run_benchmarks(sizes=(30,), iterations=1, client=self.client,
+                                                      startup_runs=0)))
+        self.assertEqual(report["results"]["30"]["upload_pnl"]["runs"], 1)
+        self.assertEqual(FinancialRecord.objects.count(), 0)
+
+        slower = json.loads(json.dumps(report))
+        slower["results"]["30"]["read_excel"]["median"] *= 3
+        self.assertEqual([r["stage"] for r in compare_reports(report, slower)], ["read_excel"])
+
+    def test_cold_start_does_not_import_heavy_dependencies(self):
+        self.assertEqual(probe_startup()["heavy"], [])
+
+
+class MetricsTests(TestCase):
+    @override_settings(ANALYSIS_SLOW_REQUEST_SECONDS=0)
+    def test_upload_stages_are_exported_and_slow_requests_logged(self):
+        upload = SimpleUploadedFile("pnl.xlsx", _workbook_bytes(_pnl_rows()).read())
+        with self.assertLogs("analysis.slow_requests", "WARNING") as logs:
+            self.client.post(reverse("upload_pnl"), {"company_name": "ABC", "period": "2025", "file": upload})
+        self.assertIn("stream_extract=", logs.output[0])
+        self.assertIn("db_write=", logs.output[0])
+
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('analysis_stage_seconds_bucket{view="upload_pnl",stage="score",le="+Inf"}', body)
+        self.assertIn('analysis_upload_rows_count{view="upload_pnl"}', body)
+        self.assertIn('analysis_request_seconds_count{view="upload_pnl"}', body)
+
+
+class PeerRankingTests(TransactionTestCase):
+    # Catch-up follows the data version, which score writes bump on commit
+    def setUp(self):
+        percentile_index.invalidate()
+
+    def _save(self, company, period, gross_profit):
+        record, score, _ = build_result(company, period, {
+            "total_income": 1000.0, "gross_profit": gross_profit, "admin_expenses": 100.0,
+            "distribution_costs": 50.0, "finance_costs": 20.0, "revenue_growth_rate": 5.0})
+        record.save()
+        score.record = record
+        score.save()
+        return score
+
+    def test_percentiles_follow_new_rows_without_rebuild(self):
+        low = self._save("A", "2024", 300.0)
+        self._save("B", "2025", 500.0)
+        percentile_index.refresh()
+        self.assertEqual(percentile_index.percentile("weighted_score", low.weighted_score), 25.0)
+
+        top = self._save("C", "2025", 700.0)
+        with mock.patch.object(percentile_index, "rebuild") as rebuild:
+            percentile_index.refresh()
+        rebuild.assert_not_called()
+        self.assertAlmostEqual(percentile_index.percentile("weighted_score", top.weighted_score), 500 / 6)
+        self.assertEqual(percentile_index.percentile("weighted_score", top.weighted_score, "2025"), 75.0)
+        self.assertEqual(percentile_index.count(period="2024"), 1)
+        # Lower is better for the expense ratio, which is identical for all three
+        self.assertEqual(percentile_index.percentile("expense_ratio", top.expense_ratio), 50.0)
+
+    def test_refresh_skips_the_database_until_the_data_version_moves(self):
+        self._save("A", "2024", 300.0)
+        percentile_index.refresh()
+        with self.assertNumQueries(0):
+            percentile_index.refresh()
+            percentile_index.histogram("weighted_score", [0, 50, 100])
+        self._save("B", "2024", 500.0)
+        with self.assertNumQueries(1):
+            percentile_index.refresh()
+        self.assertEqual(percentile_index.count(), 2)
+
+    def test_rows_committed_out_of_id_order_are_caught_up(self):
+        index = PercentileIndex(rebuild_after=0)
+
+        def save(company, gross_profit, score_id):
+            record, score, _ = build_result(company, "2024", {
+                "total_income": 1000.0, "gross_profit": gross_profit, "admin_expenses": 100.0,
+                "distribution_costs": 50.0, "finance_costs": 20.0, "revenue_growth_rate": 5.0})
+            record.save()
+            score.record, score.id = record, score_id
+            score.save()
+            return score
+
+        save("A", 300.0, 1)
+        save("B", 500.0, 1000)
+        index.refresh()
+        self.assertEqual(index.count(), 2)
+
+        # A lower id that commits after a higher one
+        late = save("C", 700.0, 500)
+        index.refresh()
+        self.assertEqual(index.count(period="2024"), 3)
+        self.assertAlmostEqual(index.percentile("weighted_score", late.weighted_score), 500 / 6)
+
+        # In-place changes need the rebuild, which swaps in new arrays
+        FinancialScore.objects.update(weighted_score=10.0)
+        index.refresh()
+        self.assertNotEqual(index.percentile("weighted_score", 10.0), 50.0)
+        index.rebuild()
+        self.assertEqual(index.percentile("weighted_score", 10.0), 50.0)
+
+    def test_dashboard_histogram_and_result_standing(self):
+        self._save("A", "2024", 300.0)
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(sum(b["count"] for b in response.context["histogram"]), 1)
+
+        upload = SimpleUploadedFile("pnl.xlsx", _workbook_bytes(_pnl_rows()).read())
+        response = self.client.post(reverse("upload_pnl"), {"company_name": "ABC", "period": "2025", "file": upload})
+        self.assertEqual(response.context["peer_counts"], {"all": 2, "period": 1})
+        self.assertEqual(dict(response.context["peer_standing"])["Weighted Score"]["period"], 50.0)
+
+
+class TrendTests(TestCase):
+    def _upload(self, period, rows=None):
+        upload = SimpleUploadedFile("pnl.xlsx", _workbook_bytes(rows or _pnl_rows()).read())
+        return self.client.post(reverse("upload_pnl"), {"company_name": "ABC", "period": period, "file": upload})
+
+    def test_growth_and_deltas_come_from_previous_period(self):
+        self._upload("2024")
+        rows = _pnl_rows()
+        rows[-1][-1] = 1210.0  # Total Income up 10% on 1100
+        response = self._upload("2025", rows)
+
+        record = FinancialRecord.objects.get(period="2025")
+        self.assertAlmostEqual(record.revenue_growth_rate, 10.0)
+        self.assertEqual(record.growth_source, FinancialRecord.GROWTH_FROM_HISTORY)
+        self.assertEqual(record.previous_record.period, "2024")
+        self.assertEqual(response.context["deltas"]["previous_period"], "2024")
+
+        trend = CompanyTrend.objects.get(company_name="ABC")
+        scores = list(FinancialScore.objects.order_by("record__period").values_list("weighted_score", flat=True))
+        self.assertEqual(trend.periods, 2)
+        self.assertAlmostEqual(trend.score_mean, sum(scores) / 2)
+        self.assertEqual([entry[0] for entry in trend.recent], ["2024", "2025"])
+
+    def test_explicit_zero_growth_on_sheet_is_kept(self):
+        self._upload("2024")
+        rows = _pnl_rows() + [[None, "Revenue Growth", 0.0]]
+        rows[-2][-1] = 1210.0
+        self._upload("2025", rows)
+        record = FinancialRecord.objects.get(period="2025")
+        self.assertEqual((record.revenue_growth_rate, record.growth_source), (0.0, FinancialRecord.GROWTH_FROM_SHEET))
+
+    @override_settings(ANALYSIS_DUPLICATE_UPLOAD_POLICY="copy")
+    def test_copied_upload_resolves_its_own_history(self):
+        self._upload("2024")
+        rows = _pnl_rows()
+        rows[-1][-1] = 1210.0
+        content = _workbook_bytes(rows).read()
+        for company in ("ABC", "Other"):
+            self.client.post(reverse("upload_pnl"), {"company_name": company, "period": "2025",
+                                                     "file": SimpleUploadedFile("pnl.xlsx", content)})
+        copy = FinancialRecord.objects.get(company_name="Other")
+        self.assertEqual((copy.revenue_growth_rate, copy.growth_source), (0.0, ""))
+        self.assertIsNone(copy.previous_record)
+
+    def test_periods_are_parsed_not_compared_as_strings(self):
+        values = {"total_income": 1000.0, "gross_profit": 400.0, "admin_expenses": 100.0,
+                  "distribution_costs": 50.0, "finance_costs": 20.0, "revenue_growth_rate": 0.0}
+        for period in ("Nov 2024", "Dec 2024", "2024-Q4", "2024", "Notes 2"):
+            build_result("A", period, values)[0].save()
+        self.assertEqual(find_previous("A", "Mar 2025").period, "Dec 2024")
+        self.assertEqual(find_previous("A", "2025-03").period, "Dec 2024")
+        self.assertEqual(find_previous("A", "2025-Q1").period, "2024-Q4")
+        self.assertEqual(find_previous("A", "FY2025").period, "2024")
+        self.assertIsNone(find_previous("A", "Nov 2024"))
+        self.assertIsNone(find_previous("A", "Notes 3"))
+
+    def test_backfill_repicks_growth_advice_when_category_holds(self):
+        for period, income in [("2024", 1000.0), ("2025", 1100.0)]:
+            record, score, _ = build_result("A", period, {
+                "total_income": income, "gross_profit": 600.0, "admin_expenses": 100.0,
+                "distribution_costs": 50.0, "finance_costs": 20.0, "revenue_growth_rate": 0.0})
+            record.save()
+            score.record = record
+            score.save()
+        backfill_trends()
+        score = FinancialScore.objects.get(record__period="2025")
+        self.assertEqual(score.category, "Medium")
+        self.assertIn("G3", score.advice_codes.split(","))
+        self.assertNotIn("Negative or stagnant", score.advice)
+
+    def test_backfill_links_out_of_order_history_and_rebuilds_trends(self):
+        for company, period, income in [("A", "2025", 1200.0), ("A", "2023", 1000.0), ("A", "2024", 800.0),
+                                        ("B", "N/A", 500.0), ("B", "2024", 400.0)]:
+            record, score, _ = build_result(company, period, {
+                "total_income": income, "gross_profit": 400.0, "admin_expenses": 100.0,
+                "distribution_costs": 50.0, "finance_costs": 20.0, "revenue_growth_rate": 0.0})
+            record.save()
+            score.record = record
+            score.save()
+
+        totals = backfill_trends()
+        self.assertEqual(totals["companies"], 2)
+        growth = dict(FinancialRecord.objects.filter(company_name="A").values_list("period", "revenue_growth_rate"))
+        self.assertEqual(growth["2023"], 0.0)
+        self.assertAlmostEqual(growth["2024"], -20.0)
+        self.assertAlmostEqual(growth["2025"], 50.0)
+        self.assertEqual(FinancialRecord.objects.get(company_name="A", period="2025").previous_record.period, "2024")
+        self.assertIsNone(FinancialRecord.objects.get(company_name="B", period="2024").previous_record)
+
+        scores = [s.weighted_score for s in FinancialScore.objects.filter(record__company_name="A")]
+        trend = CompanyTrend.objects.get(company_name="A")
+        self.assertEqual((trend.periods, trend.last_record.period), (3, "2025"))
+        self.assertAlmostEqual(trend.score_mean, sum(scores) / 3)
+        self.assertAlmostEqual(trend.score_std, float(pd.Series(scores).std(ddof=0)))
+        self.assertEqual(backfill_trends()["records_updated"], 0)
+
+
+class _StubCompletions(BaseHTTPRequestHandler):
+    delay = 0.0
+    calls = 0
+
+    def do_POST(self):
+        type(self).calls += 1
+        json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.delay)
+        body = json.dumps({"choices": [{"message": {"content": "  Stub insight.  "}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            # The client already gave up (timeout tests)
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class LlmAdviceTests(TestCase):
+    RATIOS = {"net_profit_margin": 19.6, "expense_ratio": 18.6, "gross_profit_margin": 40.0,
+              "finance_cost_ratio": 2.5, "revenue_growth_rate": 0.0}
+
+    def setUp(self):
+        cache.clear()
+        _StubCompletions.delay, _StubCompletions.calls = 0.0, 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubCompletions)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.config = {"BASE_URL": f"http://127.0.0.1:{self.server.server_port}/v1", "API_KEY_ENV": "",
+                       "TIMEOUT": 0.5, "RETRIES": 0, "MAX_CONCURRENCY": 2}
+
+    def test_answers_are_fetched_off_request_and_cached_by_bucket(self):
+        with override_settings(ANALYSIS_LLM_ADVICE=self.config):
+            self.assertEqual(llm_advice(self.RATIOS, "Medium"), (PENDING, None))
+            get_advice_service().schedule(self.RATIOS, "Medium").result(timeout=5)
+            nearby = dict(self.RATIOS, net_profit_margin=20.1)
+            self.assertEqual(llm_advice(nearby, "Medium"), (READY, "Stub insight."))
+        self.assertEqual(_StubCompletions.calls, 1)
+
+    def test_slow_backend_falls_back_to_rule_based_report(self):
+        _StubCompletions.delay = 2.0
+        with override_settings(ANALYSIS_LLM_ADVICE=self.config):
+            upload = SimpleUploadedFile("pnl.xlsx", _workbook_bytes(_pnl_rows()).read())
+            start = time.perf_counter()
+            response = self.client.post(reverse("upload_pnl"),
+                                        {"company_name": "ABC", "period": "2025", "file": upload})
+            self.assertLess(time.perf_counter() - start, 1.0)
+            score = FinancialScore.objects.get()
+            self.assertEqual(self.client.get(response.context["llm_advice_url"]).json()["status"], PENDING)
+
+            with self.assertLogs("analysis.advice", "WARNING") as logs:
+                get_advice_service().schedule(score.advice_ratios(), score.category).result(timeout=5)
+            data = self.client.get(response.context["llm_advice_url"]).json()
+        self.assertEqual(data, {"status": FALLBACK, "advice": score.advice})
+        self.assertIn("LLM advice attempt 1/1 failed", logs.output[0])
@@ -0,0 +1,291 @@
+# analysis/trends.py
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CompanyTrend, FinancialRecord, FinancialScore
+
+DELTA_FIELDS = ("weighted_score", "net_profit_margin", "expense_ratio", "gross_profit_margin", "finance_cost_ratio")
+
+# SQLite caps the number of bound parameters per statement
+_ID_BATCH = 900
+
+
+def _window() -> int:
+    return getattr(settings, "ANALYSIS_TREND_WINDOW", 4)
+
+
+_MONTHS = {name: i for i, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+_YEAR = r"((?:19|20)\d{2})"
+_PERIOD_PATTERNS = (
+    # (kind, pattern, month of the period end from the match)
+    ("year", re.compile(rf"(?:FY\s*)?{_YEAR}"), lambda m: (int(m[1]), 12)),
+    ("quarter", re.compile(rf"{_YEAR}\s*[-/ ]?\s*Q([1-4])"), lambda m: (int(m[1]), int(m[2]) * 3)),
+    ("quarter", re.compile(rf"Q([1-4])\s*[-/ ]?\s*{_YEAR}"), lambda m: (int(m[2]), int(m[1]) * 3)),
+    ("month", re.compile(rf"{_YEAR}[-/.](0?[1-9]|1[0-2])"), lambda m: (int(m[1]), int(m[2]))),
+    ("month", re.compile(rf"(0?[1-9]|1[0-2])[-/.]{_YEAR}"), lambda m: (int(m[2]), int(m[1]))),
+    ("month", re.compile(rf"([A-Za-z]{{3}})[A-Za-z]*\.?[-/ ]?\s*{_YEAR}"),
+     lambda m: (int(m[2]), _MONTHS[m[1].lower()]) if m[1].lower() in _MONTHS else None),
+)
+
+
+@lru_cache(maxsize=4096)
+def period_key(period: str) -> Optional[Tuple[str, int]]:
+    """
+    Parse a period label to (kind, month ordinal of its end): "2024" and
+    "FY2024" are years, "2024-Q3"/"Q3 2024" quarters, "2024-06", "06/2024"
+    and "Jun 2024" months. Anything else ("N/A", "Sheet1") is None and
+    takes no part in history. Keys of different kinds are not comparable.
+    """
+    text = (period or "").strip()
+    for kind, pattern, parse in _PERIOD_PATTERNS:
+        match = pattern.fullmatch(text)
+        if match:
+            parsed = parse(match)
+            if parsed is not None:
+                year, month = parsed
+                return kind, year * 12 + month - 1
+    return None
+
+
+def is_ordered_period(period: str) -> bool:
+    return period_key(period) is not None
+
+
+def period_sort_key(period: str) -> Tuple[bool, int, str]:
+    """Orders periods of mixed kinds by where each one ends; unparsed periods come first."""
+    key = period_key(period)
+    return key is not None, key[1] if key else 0, period
+
+
+def _trend_sort_key(entry) -> Tuple[bool, int, str]:
+    return period_sort_key(entry[0])
+
+
+# ───────────────────────────────────────────────────────────────
+# Previous Period Lookup (single uploads)
+# ───────────────────────────────────────────────────────────────
+def find_previous(company: str, period: str, exclude_id: Optional[int] = None) -> Optional[FinancialRecord]:
+    """
+    Latest record of the same company for the closest earlier period of
+    the same kind (year, quarter or month). Periods are parsed, not
+    compared as strings, so "Mar 2025" follows "Dec 2024".
+    """
+    key = period_key(period)
+    if key is None:
+        return None
+    queryset = FinancialRecord.objects.filter(company_name=company)
+    if exclude_id is not None:
+        queryset = queryset.exclude(id=exclude_id)
+    earlier = [p for p in queryset.values_list("period", flat=True).distinct()
+               if (k := period_key(p)) is not None and k[0] == key[0] and k[1] < key[1]]
+    if not earlier:
+        return None
+    closest = max(period_key(p)[1] for p in earlier)
+    return (queryset.filter(period__in=[p for p in earlier if period_key(p)[1] == closest])
+            .order_by("-id").first())
+
+
+def growth_between(current_income: float, previous_income: Optional[float]) -> Optional[float]:
+    if not previous_income:
+        return None
+    return (current_income - previous_income) / abs(previous_income) * 100
+
+
+def resolve_growth(company: str, period: str,
+                   values: Dict[str, float]) -> Tuple[Dict[str, float], Optional[FinancialRecord], str]:
+    """
+    Fill revenue_growth_rate from the previous period when the sheet has no
+    growth row (the value is None). A growth figure on the sheet wins, even
+    an explicit 0. Returns (values, previous record, growth source).
+    """
+    previous = find_previous(company, period)
+    if values.get("revenue_growth_rate") is not None:
+        return values, previous, FinancialRecord.GROWTH_FROM_SHEET
+    growth = growth_between(values["total_income"], previous.total_income if previous else None)
+    if growth is None:
+        return values, previous, ""
+    return dict(values, revenue_growth_rate=growth), previous, FinancialRecord.GROWTH_FROM_HISTORY
+
+
+def ratio_deltas(record: FinancialRecord) -> Optional[Dict[str, float]]:
+    """Period-over-period change of the score and each ratio (percentage points)."""
+    if record.previous_record_id is None:
+        return None
+    current = FinancialScore.objects.filter(record_id=record.id).first()
+    previous = FinancialScore.objects.filter(record_id=record.previous_record_id).first()
+    if current is None or previous is None:
+        return None
+    deltas = {field: getattr(current, field) - getattr(previous, field) for field in DELTA_FIELDS}
+    deltas["previous_period"] = record.previous_record.period
+    return deltas
+
+
+# ───────────────────────────────────────────────────────────────
+# Incremental Company Statistics
+# ───────────────────────────────────────────────────────────────
+def update_company_trend(record: FinancialRecord, financial_score: FinancialScore) -> CompanyTrend:
+    """Fold one newly saved record into its company's running statistics (Welford update)."""
+    with transaction.atomic():
+        trend, _ = (CompanyTrend.objects.select_for_update().select_related("last_record")
+                    .get_or_create(company_name=record.company_name))
+        x = financial_score.weighted_score
+        trend.periods += 1
+        delta = x - trend.score_mean
+        trend.score_mean += delta / trend.periods
+        trend.score_m2 += delta * (x - trend.score_mean)
+
+        recent = trend.recent + [[record.period, x, record.revenue_growth_rate or 0.0]]
+        trend.recent = sorted(recent, key=_trend_sort_key)[-_window():]
+        last = trend.last_record
+        if last is None or _trend_sort_key([record.period]) >= _trend_sort_key([last.period]):
+            trend.last_record = record
+        trend.save()
+    return trend
+
+
+# ───────────────────────────────────────────────────────────────
+# Vectorized Backfill
+# ───────────────────────────────────────────────────────────────
+def _company_batches(companies: Optional[Iterable[str]], batch_size: int) -> Iterable[List[str]]:
+    if companies is None:
+        companies = (FinancialRecord.objects.order_by("company_name").values_list("company_name", flat=True)
+                     .distinct().iterator())
+    batch = []
+    for company in companies:
+        batch.append(company)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _link_history(df):
+    """Per-row previous record id/income: the latest record of the closest earlier period, via groupby/shift."""
+    import numpy as np
+
+    keys = df["period"].map(period_key)
+    df = df.assign(kind=keys.map(lambda k: k[0] if k else None), ordinal=keys.map(lambda k: k[1] if k else -1))
+    ordered = df[df["kind"].notna()]
+    # Labels naming the same period ("2024-06", "Jun 2024") share one ordinal
+    latest = (ordered.sort_values(["company_name", "kind", "ordinal", "id"])
+              .groupby(["company_name", "kind", "ordinal"], sort=False).tail(1))
+    by_kind = latest.groupby(["company_name", "kind"])
+    latest = latest.assign(prev_id=by_kind["id"].shift(), prev_income=by_kind["total_income"].shift())
+    linked = df.merge(latest[["company_name", "kind", "ordinal", "prev_id", "prev_income"]],
+                      on=["company_name", "kind", "ordinal"], how="left")
+
+    growth = linked["revenue_growth_rate"]
+    from_sheet = (linked["growth_source"] == FinancialRecord.GROWTH_FROM_SHEET) | (
+        (linked["growth_source"] == "") & growth.notna() & (growth != 0))
+    from_history = ~from_sheet & linked["prev_income"].notna() & (linked["prev_income"] != 0)
+    history_growth = (linked["total_income"] - linked["prev_income"]) / linked["prev_income"].abs() * 100
+
+    linked["new_growth"] = np.where(from_history, history_growth, growth)
+    linked["new_source"] = np.select([from_sheet, from_history],
+                                     [FinancialRecord.GROWTH_FROM_SHEET, FinancialRecord.GROWTH_FROM_HISTORY],
+                                     default="")
+    return linked
+
+
+def _trend_rows(df, window: int) -> List[CompanyTrend]:
+    import pandas as pd
+
+    scored = df[df["weighted_score"].notna()]
+    if scored.empty:
+        return []
+    sort_keys = pd.DataFrame(scored["period"].map(period_sort_key).tolist(), index=scored.index,
+                             columns=["ordered", "ordinal", "label"])
+    scored = pd.concat([scored, sort_keys], axis=1).assign(
+        growth=lambda d: d["revenue_growth_rate"].fillna(0.0),
+    ).sort_values(["company_name", "ordered", "ordinal", "label", "id"])
+    grouped = scored.groupby("company_name", sort=False)["weighted_score"]
+    stats = grouped.agg(["count", "mean"]).assign(variance=grouped.var(ddof=0).fillna(0.0))
+    stats.columns = ["periods", "score_mean", "variance"]
+    last_ids = scored.groupby("company_name", sort=False)["id"].last()
+    recent = scored.groupby("company_name", sort=False).tail(window)
+
+    trends = {
+        company: CompanyTrend(company_name=company, periods=int(row.periods), score_mean=float(row.score_mean),
+                              score_m2=float(row.variance) * int(row.periods), recent=[],
+                              last_record_id=int(last_ids[company]))
+        for company, row in stats.iterrows()
+    }
+    for company, period, score, growth in recent[["company_name", "period", "weighted_score", "growth"]].itertuples(
+            index=False, name=None):
+        trends[company].recent.append([period, float(score), float(growth)])
+    return list(trends.values())
+
+
+def backfill_trends(companies: Optional[Iterable[str]] = None, batch_size: int = 500,
+                    progress=None) -> Dict[str, int]:
+    """
+    Recompute previous-period links, history-based growth and CompanyTrend
+    rows with pandas groupby/shift, ``batch_size`` companies at a time.
+    Records whose growth changed are rescored in batch. Returns counts.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from .rescoring import RECORD_COLUMNS, rescore_chunk
+
+    window = _window()
+    totals = {"companies": 0, "records_updated": 0, "scores_changed": 0}
+    columns = ("id", "company_name", "period", "total_income", "revenue_growth_rate", "growth_source",
+               "previous_record_id", "financialscore__weighted_score")
+
+    for batch in _company_batches(companies, batch_size):
+        df = pd.DataFrame(
+            list(FinancialRecord.objects.filter(company_name__in=batch).values_list(*columns)),
+            columns=("id", "company_name", "period", "total_income", "revenue_growth_rate", "growth_source",
+                     "previous_record_id", "weighted_score"),
+        )
+        if df.empty:
+            continue
+        df["revenue_growth_rate"] = df["revenue_growth_rate"].astype(float)
+        linked = _link_history(df)
+
+        old_prev = linked["previous_record_id"].astype(float)
+        changed = linked[
+            ~np.isclose(linked["new_growth"].astype(float), linked["revenue_growth_rate"], equal_nan=True)
+            | (linked["new_source"] != linked["growth_source"])
+            | ~((linked["prev_id"] == old_prev) | (linked["prev_id"].isna() & old_prev.isna()))
+        ]
+        updates = [
+            FinancialRecord(id=int(row.id), previous_record_id=None if pd.isna(row.prev_id) else int(row.prev_id),
+                            revenue_growth_rate=None if pd.isna(row.new_growth) else float(row.new_growth),
+                            growth_source=row.new_source)
+            for row in changed.itertuples(index=False)
+        ]
+        regrown = changed.loc[~np.isclose(changed["new_growth"].astype(float), changed["revenue_growth_rate"],
+                                          equal_nan=True), "id"].astype(int).tolist()
+
+        with transaction.atomic():
+            FinancialRecord.objects.bulk_update(updates, ["previous_record_id", "revenue_growth_rate",
+                                                          "growth_source"], batch_size=500)
+            for start in range(0, len(regrown), _ID_BATCH):
+                rows = list(FinancialRecord.objects.filter(id__in=regrown[start:start + _ID_BATCH],
+                                                           financialscore__isnull=False)
+                            .values_list(*RECORD_COLUMNS))
+                if rows:
+                    totals["scores_changed"] += rescore_chunk(rows, growth_changed=True)
+
+            scores = pd.DataFrame(
+                list(FinancialRecord.objects.filter(company_name__in=batch)
+                     .values_list("id", "company_name", "period", "revenue_growth_rate",
+                                  "financialscore__weighted_score")),
+                columns=("id", "company_name", "period", "revenue_growth_rate", "weighted_score"),
+            )
+            CompanyTrend.objects.filter(company_name__in=batch).delete()
+            CompanyTrend.objects.bulk_create(_trend_rows(scores, window), batch_size=500)
+
+        totals["companies"] += len(batch)
+        totals["records_updated"] += len(updates)
+        if progress:
+            progress(totals)
+    return totals
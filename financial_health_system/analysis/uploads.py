@@ -0,0 +1,39 @@
+# analysis/uploads.py
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Computes the SHA-256 of each uploaded file while its chunks stream in,
+    then passes the data on to the next handler, which stores the file.
+    Digests end up in ``request.upload_digests[field_name]``.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hash.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.request is not None:
+            if not hasattr(self.request, "upload_digests"):
+                self.request.upload_digests = {}
+            self.request.upload_digests[self.field_name] = self._hash.hexdigest()
+        return None
+
+
+def upload_digest(request, field_name: str) -> str:
+    """SHA-256 of an uploaded file, hashing it now if the handler was not installed."""
+    digests = getattr(request, "upload_digests", {})
+    if field_name in digests:
+        return digests[field_name]
+    digest = hashlib.sha256()
+    for chunk in request.FILES[field_name].chunks():
+        digest.update(chunk)
+    request.FILES[field_name].seek(0)
+    return digest.hexdigest()
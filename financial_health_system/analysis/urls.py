@@ -1,7 +1,18 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path("upload/", views.upload_pnl, name="upload_pnl"),
+    path("upload/bulk/", views.bulk_upload, name="bulk_upload"),
+    path("jobs/<uuid:job_id>/", views.upload_job, name="upload_job"),
+    path("jobs/<uuid:job_id>/result/", views.upload_job_result, name="upload_job_result"),
     path("dashboard/", views.dashboard, name="dashboard"),
+    path("export/", views.export_scores, name="export_scores"),
+    path("charts/distribution/", views.chart_distribution, name="chart_distribution"),
+    path("charts/categories/", views.chart_categories, name="chart_categories"),
+    path("charts/company/", views.chart_company, name="chart_company"),
+    path("api/score/", api.score_api, name="score_api"),
+    path("api/whatif/<int:record_id>/", api.whatif_api, name="whatif_api"),
+    path("metrics", views.metrics, name="metrics"),
+    path("advice/<int:record_id>/", views.llm_advice_status, name="llm_advice"),
 ]
@@ -1,8 +1,10 @@
 
 
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+# The LLM path below is disabled; its dependencies (openai, python-dotenv)
+# must be imported inside that code if it is revived, not at module level.
+# import os
+# from dotenv import load_dotenv
+# from openai import OpenAI
 
 # # ---------------------------
 # # 🔧 Setup and Configuration
@@ -120,7 +122,10 @@ from openai import OpenAI
 #         return f"⚠️ AI generation failed: {e}"
 
 # analysis/utils.py
-from typing import Dict, Tuple
+from functools import lru_cache
+from typing import Dict, NamedTuple, Tuple
+
+import numpy as np
 
 # ───────────────────────────────────────────────────────────────
 # Expert Weights (from your feature derivation)
@@ -145,11 +150,16 @@ def _round2(x: float) -> float:
     return round(float(x or 0.0), 2)
 
 
+# Category thresholds (score >= threshold)
+HIGH_THRESHOLD = 80
+MEDIUM_THRESHOLD = 50
+
+
 def _categorize(score: float) -> Tuple[str, str]:
     """Determine financial health category & base suggestion."""
-    if score >= 80:
+    if score >= HIGH_THRESHOLD:
         return "High", "Strong financial health. Consider reinvestment or expansion."
-    elif score >= 50:
+    elif score >= MEDIUM_THRESHOLD:
         return "Medium", "Moderate health. Optimize costs and margins to improve stability."
     else:
         return "Low", "Weak financial position. Prioritize cost reduction and cash flow recovery."
@@ -193,134 +203,236 @@ def calculate_weighted_score(record) -> Tuple[float, str, str, Dict[str, float]]
 
 
 # ───────────────────────────────────────────────────────────────
-# Data-Backed Rule-Based Advisory System
+# Vectorized Batch Scoring
 # ───────────────────────────────────────────────────────────────
-def generate_rule_based_advice(ratios: dict, category: str) -> str:
+RATIO_FIELDS = ("net_profit_margin", "expense_ratio", "gross_profit_margin", "finance_cost_ratio", "revenue_growth_rate")
+
+
+class BatchScores(NamedTuple):
+    scores: np.ndarray
+    categories: np.ndarray
+    contributions: Dict[str, np.ndarray]
+
+
+def _round2_array(values: np.ndarray) -> np.ndarray:
     """
-    Generates intelligent, research-backed advisory text.
-    Derived from behavioral and financial patterns of 500+ Sri Lankan SMEs (2025 dataset).
+    Vectorized _round2 that agrees with Python's round() bit for bit.
+    np.round scales by 100 first, which can tip values sitting on a .5
+    boundary (2.675 → 2.68); those few are re-rounded in Python.
     """
-    npm = ratios.get("net_profit_margin", 0.0)
-    exp = ratios.get("expense_ratio", 0.0)
-    gpm = ratios.get("gross_profit_margin", 0.0)
-    fcr = ratios.get("finance_cost_ratio", 0.0)
-    rgr = ratios.get("revenue_growth_rate", 0.0)
-
-    advice = []
-    advice.append("Research-Backed Financial Advisory Report\n")
-    advice.append(
-        "Findings are based on behavioral data collected from over 500 Sri Lankan SMEs. "
-        "Patterns indicate that profitability, cost control, and financial discipline are key drivers "
-        "of financial stability.\n"
-    )
-
-    # --- Category Summary ---
-    if category == "High":
-        advice.append(
-            f"✅ Overall: Financial health is HIGH. "
-            f"Net profit margin {npm:.2f}% and gross margin {gpm:.2f}%. "
-            "This profile aligns with firms showing strong profitability and disciplined budgeting.\n"
-        )
-    elif category == "Medium":
-        advice.append(
-            f"⚠️ Overall: Financial health is MODERATE. "
-            f"Net margin {npm:.2f}%, gross margin {gpm:.2f}%. "
-            "Similar SMEs in this group often face gradual expense creep or moderate finance costs.\n"
-        )
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    suspect = (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6) | (np.abs(values) > 1e13)
+    for i in np.flatnonzero(suspect):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+def ratios_from_figures(total_income, gross_profit, admin_expenses, distribution_costs,
+                        finance_costs, net_profit, revenue_growth_rate=None) -> Dict[str, np.ndarray]:
+    """Vectorized ratio computation, same formulas as calculate_weighted_score."""
+    income = np.asarray(total_income, dtype=float)
+    has_income = income != 0
+    safe_income = np.where(has_income, income, 1.0)
+
+    def pct(numerator):
+        return np.where(has_income, (np.asarray(numerator, dtype=float) / safe_income) * 100, 0.0)
+
+    expenses = (np.asarray(admin_expenses, dtype=float) + np.asarray(distribution_costs, dtype=float)
+                + np.asarray(finance_costs, dtype=float))
+    if revenue_growth_rate is None:
+        growth = np.zeros_like(income)
     else:
-        advice.append(
-            f"❌ Overall: Financial health is LOW. "
-            f"Net margin {npm:.2f}%, gross margin {gpm:.2f}%. "
-            "Surveyed firms in this category reported higher administrative expenses and delayed loan repayments.\n"
-        )
+        growth = np.nan_to_num(np.asarray(revenue_growth_rate, dtype=float), nan=0.0)
+    return {
+        "net_profit_margin": pct(net_profit),
+        "expense_ratio": pct(expenses),
+        "gross_profit_margin": pct(gross_profit),
+        "finance_cost_ratio": pct(finance_costs),
+        "revenue_growth_rate": growth,
+    }
 
-    # --- Expense Behavior ---
-    if exp > 60:
-        advice.append(
-            f"• Expense Pressure: Expense ratio {exp:.1f}%. "
-            "55% of SMEs with this level of spending reported difficulty maintaining profitability. "
-            "Enforce monthly budgets and automate cost tracking to reduce OPEX by 10–15%.\n"
-        )
-    elif exp > 40:
-        advice.append(
-            f"• Expense Efficiency: Expense ratio {exp:.1f}%. "
-            "This level was linked to average-performing SMEs. Target 5–10% reduction via supplier optimization.\n"
-        )
-    else:
-        advice.append(
-            f"• Expense Discipline: Expense ratio {exp:.1f}% — efficient. "
-            "Maintain quarterly expense audits to sustain performance.\n"
-        )
 
-    # --- Finance Costs ---
-    if fcr > 10:
-        advice.append(
-            f"• Debt Pressure: Finance cost ratio {fcr:.1f}%. "
-            "SMEs with similar ratios often experienced liquidity strain. "
-            "Refinance or consolidate loans; maintain interest coverage >2×.\n"
-        )
-    elif fcr > 5:
-        advice.append(
-            f"• Finance Costs: Finance ratio {fcr:.1f}%. "
-            "Typical for moderate firms — manageable but sensitive to rate hikes. "
-            "Monitor credit cycles closely.\n"
-        )
-    else:
-        advice.append(
-            f"• Healthy Debt Profile: Finance ratio {fcr:.1f}% — within safe limits. "
-            "Keep repayment discipline and review rates annually.\n"
-        )
+def calculate_weighted_scores(ratios) -> BatchScores:
+    """
+    Score N records in one pass. ``ratios`` is a DataFrame or a mapping of
+    the five RATIO_FIELDS to equal-length arrays; a missing (NaN) growth
+    rate counts as 0 like ``record.revenue_growth_rate or 0``.
+    Results match calculate_weighted_score exactly, element by element.
+    """
+    columns = {name: np.asarray(ratios[name], dtype=float) for name in RATIO_FIELDS}
+    growth = np.nan_to_num(columns["revenue_growth_rate"], nan=0.0)
 
-    # --- Growth & Profitability ---
-    if rgr <= 0:
-        advice.append(
-            "• Revenue Growth: Negative or stagnant. SMEs with zero growth scored 30–40% lower in financial health. "
-            "Focus on cross-selling, customer retention, and digital marketing.\n"
-        )
-    elif rgr < 8:
-        advice.append(
-            f"• Growth Stability: {rgr:.1f}% growth — modest. "
-            "Introduce monthly revenue analysis and explore new sales channels.\n"
-        )
-    else:
-        advice.append(
-            f"• Growth Momentum: {rgr:.1f}% growth — strong. "
-            "Prioritize sustainable growth through reinvestment and margin protection.\n"
-        )
+    contributions = {
+        "Net Profit Margin": _round2_array(columns["net_profit_margin"] * WEIGHTS["net_profit_margin"]),
+        "Expense Ratio (Inverted)": _round2_array((100 - columns["expense_ratio"]) * WEIGHTS["expense_ratio"]),
+        "Gross Profit Margin": _round2_array(columns["gross_profit_margin"] * WEIGHTS["gross_profit_margin"]),
+        "Finance Cost Ratio (Inverted)": _round2_array((100 - columns["finance_cost_ratio"]) * WEIGHTS["finance_cost_ratio"]),
+        "Revenue Growth Rate": _round2_array(growth * WEIGHTS["revenue_growth_rate"])
+    }
+
+    # Sum left to right like the scalar path's sum() over the dict
+    total = np.zeros_like(growth)
+    for values in contributions.values():
+        total = total + values
+    scores = _round2_array(total)
+
+    categories = np.where(scores >= HIGH_THRESHOLD, "High",
+                          np.where(scores >= MEDIUM_THRESHOLD, "Medium", "Low")).astype(object)
+    return BatchScores(scores, categories, contributions)
 
-    # --- Margin Insights ---
-    if gpm > 40 and npm < 10:
-        advice.append(
-            "• Margin Gap: High gross margin but low net margin implies expense or debt leakage. "
-            "Review operational and financial efficiency.\n"
-        )
-    elif gpm < 25:
-        advice.append(
-            f"• Low Gross Margin: {gpm:.1f}% gross margin. "
-            "Below the median (25%) from the study. Adjust pricing and procurement.\n"
-        )
-    else:
-        advice.append(
-            f"• Healthy Margins: {gpm:.1f}% gross margin — consistent with stable performers. "
-            "Continue to optimize product mix and reduce wastage.\n"
-        )
 
+# ───────────────────────────────────────────────────────────────
+# Data-Backed Rule-Based Advisory System
+# ───────────────────────────────────────────────────────────────
+# Each advice section picks one rule branch; a branch is identified by a
+# short code and rendered from a template with the record's ratios.
+ADVICE_HEADER = (
+    "Research-Backed Financial Advisory Report\n",
+    "Findings are based on behavioral data collected from over 500 Sri Lankan SMEs. "
+    "Patterns indicate that profitability, cost control, and financial discipline are key drivers "
+    "of financial stability.\n",
+)
+
+ADVICE_FOOTER = "\n_Note: Derived from the 2025 Sri Lankan SME Financial Behavior Study._"
+
+ADVICE_TEMPLATES = {
+    # --- Category Summary ---
+    "OH": (
+        "✅ Overall: Financial health is HIGH. "
+        "Net profit margin {npm:.2f}% and gross margin {gpm:.2f}%. "
+        "This profile aligns with firms showing strong profitability and disciplined budgeting.\n"
+    ),
+    "OM": (
+        "⚠️ Overall: Financial health is MODERATE. "
+        "Net margin {npm:.2f}%, gross margin {gpm:.2f}%. "
+        "Similar SMEs in this group often face gradual expense creep or moderate finance costs.\n"
+    ),
+    "OL": (
+        "❌ Overall: Financial health is LOW. "
+        "Net margin {npm:.2f}%, gross margin {gpm:.2f}%. "
+        "Surveyed firms in this category reported higher administrative expenses and delayed loan repayments.\n"
+    ),
+    # --- Expense Behavior ---
+    "E1": (
+        "• Expense Pressure: Expense ratio {exp:.1f}%. "
+        "55% of SMEs with this level of spending reported difficulty maintaining profitability. "
+        "Enforce monthly budgets and automate cost tracking to reduce OPEX by 10–15%.\n"
+    ),
+    "E2": (
+        "• Expense Efficiency: Expense ratio {exp:.1f}%. "
+        "This level was linked to average-performing SMEs. Target 5–10% reduction via supplier optimization.\n"
+    ),
+    "E3": (
+        "• Expense Discipline: Expense ratio {exp:.1f}% — efficient. "
+        "Maintain quarterly expense audits to sustain performance.\n"
+    ),
+    # --- Finance Costs ---
+    "F1": (
+        "• Debt Pressure: Finance cost ratio {fcr:.1f}%. "
+        "SMEs with similar ratios often experienced liquidity strain. "
+        "Refinance or consolidate loans; maintain interest coverage >2×.\n"
+    ),
+    "F2": (
+        "• Finance Costs: Finance ratio {fcr:.1f}%. "
+        "Typical for moderate firms — manageable but sensitive to rate hikes. "
+        "Monitor credit cycles closely.\n"
+    ),
+    "F3": (
+        "• Healthy Debt Profile: Finance ratio {fcr:.1f}% — within safe limits. "
+        "Keep repayment discipline and review rates annually.\n"
+    ),
+    # --- Growth & Profitability ---
+    "G1": (
+        "• Revenue Growth: Negative or stagnant. SMEs with zero growth scored 30–40% lower in financial health. "
+        "Focus on cross-selling, customer retention, and digital marketing.\n"
+    ),
+    "G2": (
+        "• Growth Stability: {rgr:.1f}% growth — modest. "
+        "Introduce monthly revenue analysis and explore new sales channels.\n"
+    ),
+    "G3": (
+        "• Growth Momentum: {rgr:.1f}% growth — strong. "
+        "Prioritize sustainable growth through reinvestment and margin protection.\n"
+    ),
+    # --- Margin Insights ---
+    "M1": (
+        "• Margin Gap: High gross margin but low net margin implies expense or debt leakage. "
+        "Review operational and financial efficiency.\n"
+    ),
+    "M2": (
+        "• Low Gross Margin: {gpm:.1f}% gross margin. "
+        "Below the median (25%) from the study. Adjust pricing and procurement.\n"
+    ),
+    "M3": (
+        "• Healthy Margins: {gpm:.1f}% gross margin — consistent with stable performers. "
+        "Continue to optimize product mix and reduce wastage.\n"
+    ),
     # --- Strategy Recommendations ---
-    if category == "High":
-        advice.append(
-            "• Next Step: Develop a 12-month reinvestment plan. "
-            "Top 20% of SMEs reinvested at least 10% of profit into innovation or tech upgrades.\n"
-        )
-    elif category == "Medium":
-        advice.append(
-            "• Next Step: 90-day improvement roadmap — (1) cut OPEX 5–10%, "
-            "(2) strengthen credit discipline, (3) implement real-time dashboards.\n"
-        )
+    "NH": (
+        "• Next Step: Develop a 12-month reinvestment plan. "
+        "Top 20% of SMEs reinvested at least 10% of profit into innovation or tech upgrades.\n"
+    ),
+    "NM": (
+        "• Next Step: 90-day improvement roadmap — (1) cut OPEX 5–10%, "
+        "(2) strengthen credit discipline, (3) implement real-time dashboards.\n"
+    ),
+    "NL": (
+        "• Next Step: 60-day stabilization plan — (1) cut 10–15% non-essential spend, "
+        "(2) restructure high-cost loans, (3) protect cash flow.\n"
+    ),
+}
+
+
+def _advice_params(ratios: dict) -> Dict[str, float]:
+    return {
+        "npm": ratios.get("net_profit_margin", 0.0),
+        "exp": ratios.get("expense_ratio", 0.0),
+        "gpm": ratios.get("gross_profit_margin", 0.0),
+        "fcr": ratios.get("finance_cost_ratio", 0.0),
+        "rgr": ratios.get("revenue_growth_rate", 0.0),
+    }
+
+
+def advice_codes(ratios: dict, category: str) -> Tuple[str, ...]:
+    """Rule branch chosen for each advice section, e.g. ("OM", "E2", "F3", "G1", "M3", "NM")."""
+    p = _advice_params(ratios)
+    level = "H" if category == "High" else "M" if category == "Medium" else "L"
+
+    expense = "E1" if p["exp"] > 60 else "E2" if p["exp"] > 40 else "E3"
+    finance = "F1" if p["fcr"] > 10 else "F2" if p["fcr"] > 5 else "F3"
+    growth = "G1" if p["rgr"] <= 0 else "G2" if p["rgr"] < 8 else "G3"
+    if p["gpm"] > 40 and p["npm"] < 10:
+        margin = "M1"
+    elif p["gpm"] < 25:
+        margin = "M2"
     else:
-        advice.append(
-            "• Next Step: 60-day stabilization plan — (1) cut 10–15% non-essential spend, "
-            "(2) restructure high-cost loans, (3) protect cash flow.\n"
-        )
+        margin = "M3"
+    return ("O" + level, expense, finance, growth, margin, "N" + level)
+
+
+def compact_advice(ratios: dict, category: str) -> Tuple[Tuple[str, ...], Dict[str, float]]:
+    """Compact advice: the rule-branch ids plus the numeric parameters they are rendered with."""
+    return advice_codes(ratios, category), _advice_params(ratios)
+
+
+@lru_cache(maxsize=512)
+def _advice_template(codes: Tuple[str, ...]) -> str:
+    """Full report template for one combination of rule branches."""
+    sections = list(ADVICE_HEADER)
+    sections.extend(ADVICE_TEMPLATES[code] for code in codes)
+    sections.append(ADVICE_FOOTER)
+    return "\n".join(sections)
+
+
+def render_advice(codes: Tuple[str, ...], ratios: dict) -> str:
+    """Render advisory text for the given rule branches and ratios."""
+    return _advice_template(tuple(codes)).format(**_advice_params(ratios))
 
-    advice.append("\n_Note: Derived from the 2025 Sri Lankan SME Financial Behavior Study._")
-    return "\n".join(advice)
+
+def generate_rule_based_advice(ratios: dict, category: str) -> str:
+    """
+    Generates intelligent, research-backed advisory text.
+    Derived from behavioral and financial patterns of 500+ Sri Lankan SMEs (2025 dataset).
+    """
+    return render_advice(advice_codes(ratios, category), ratios)
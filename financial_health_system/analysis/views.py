@@ -126,16 +126,133 @@
 
 
 # analysis/views.py
-import pandas as pd
-from django.shortcuts import render
-from .models import FinancialRecord, FinancialScore
-from .utils import calculate_weighted_score, generate_rule_based_advice
-
-
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.http import condition
+from .advice import DISABLED, READY, llm_advice
+from .charts import cached_payload, category_mix, company_series, data_version, score_distribution
+from .export import CSV, EXPORT_FORMATS, export_filename, export_stream
+from .extraction import LabelIndex
+from .filters import filter_scores, parse_float, parse_int
+from .ingest import IngestError, describe_result, ingest_sheets, ingest_sources, iter_sources, process_upload
+from .jobs import enqueue_upload
+from .metrics import instrument, observe_upload, render_metrics, stage
+from .models import ScoreSummary, UploadJob
+from .ranking import RANKED_METRICS, peer_standing, percentile_index, score_histogram
+from .summaries import describe, get_summary, period_summaries
+from .trends import ratio_deltas
+from .uploads import upload_digest
+from .whatif import input_defaults
+
+
+DASHBOARD_PAGE_SIZE = 25
+DASHBOARD_MAX_PAGE_SIZE = 200
+
+
+@instrument("dashboard")
 def dashboard(request):
-    from .models import FinancialScore
-    scores = FinancialScore.objects.select_related("record").order_by("-id")[:10]
-    return render(request, "analysis/dashboard.html", {"scores": scores})
+    """
+    Keyset-paginated scores: ``after`` pages forward (older, or lower
+    scoring), ``before`` pages back. Each page is one indexed range scan in
+    page order, however deep it is:
+
+    - company/period filter: newest first on the record id, walking
+      record_company_id_idx, record_period_id_idx or
+      record_company_period_idx from the record side;
+    - score range (min_score/max_score) alone: highest score first on
+      (weighted_score, record id), with ``after_score``/``before_score`` as
+      the score half of the cursor, over score_score_record_idx or
+      score_category_score_idx with a category;
+    - otherwise newest first on FinancialScore.record_id
+      (score_category_record_idx for a category filter).
+    """
+    from .models import FinancialRecord, FinancialScore
+    scores, filters = filter_scores(FinancialScore.objects.select_related("record"), request.GET)
+    by_score = False
+    if filters["company"] or filters["period"]:
+        # Django writes record__id as the score's record_id column, which a
+        # record-side index cannot order, so drive the query from the record
+        rows, _ = filter_scores(FinancialRecord.objects.select_related("financialscore")
+                                .filter(financialscore__isnull=False), request.GET,
+                                record_prefix="", score_prefix="financialscore__")
+        key = "id"
+    else:
+        rows, key = scores, "record_id"
+        by_score = filters["min_score"] is not None or filters["max_score"] is not None
+
+    page_size = min(parse_int(request.GET.get("page_size")) or DASHBOARD_PAGE_SIZE, DASHBOARD_MAX_PAGE_SIZE)
+    after, before = parse_int(request.GET.get("after")), parse_int(request.GET.get("before"))
+    after_score, before_score = parse_float(request.GET.get("after_score")), parse_float(request.GET.get("before_score"))
+    order = ("weighted_score", key) if by_score else (key,)
+
+    with stage("query"):
+        if before is not None:
+            if by_score and before_score is not None:
+                # (weighted_score, record_id) > cursor, as a range the index can seek
+                rows = rows.filter(Q(weighted_score__gte=before_score),
+                                   Q(weighted_score__gt=before_score) | Q(record_id__gt=before))
+            else:
+                rows = rows.filter(**{f"{key}__gt": before})
+            page = list(rows.order_by(*order)[:page_size + 1])
+            has_newer = len(page) > page_size
+            page = page[:page_size][::-1]
+            has_older = True
+        else:
+            if after is not None:
+                if by_score and after_score is not None:
+                    rows = rows.filter(Q(weighted_score__lte=after_score),
+                                       Q(weighted_score__lt=after_score) | Q(record_id__lt=after))
+                else:
+                    rows = rows.filter(**{f"{key}__lt": after})
+            page = list(rows.order_by(*(f"-{column}" for column in order))[:page_size + 1])
+            has_older = len(page) > page_size
+            page = page[:page_size]
+            has_newer = after is not None
+        if key == "id":
+            page = [record.financialscore for record in page]
+
+    query = request.GET.copy()
+    for key in ("after", "before", "after_score", "before_score"):
+        query.pop(key, None)
+
+    export_query = query.copy()
+    export_query.pop("page_size", None)
+
+    def page_url(direction, score):
+        params = query.copy()
+        params[direction] = score.record_id
+        if by_score:
+            params[f"{direction}_score"] = repr(score.weighted_score)
+        return "?" + params.urlencode()
+
+    with stage("peer_histogram"):
+        histogram = score_histogram(filters["period"] or None)
+
+    with stage("summaries"):
+        # Running totals: one row per group, however many scores there are
+        if filters["company"]:
+            summary = get_summary(ScoreSummary.COMPANY, filters["company"])
+        elif filters["period"]:
+            summary = get_summary(ScoreSummary.PERIOD, filters["period"])
+        else:
+            summary = get_summary()
+        summaries = [describe(s) for s in period_summaries()]
+
+    with stage("render"):
+        return render(request, "analysis/dashboard.html", {
+            "histogram": histogram,
+            "summary": describe(summary) if summary else None,
+            "period_summaries": summaries,
+            "scores": page,
+            "filters": filters,
+            "export_query": export_query.urlencode(),
+            "categories": ["High", "Medium", "Low"],
+            "next_url": page_url("after", page[-1]) if page and has_older else None,
+            "prev_url": page_url("before", page[0]) if page and has_newer else None,
+        })
 
 
 def get_value_anywhere(df, keywords):
@@ -145,123 +262,210 @@ def get_value_anywhere(df, keywords):
     - Handles merged cells
     - Ignores spaces, case, and special characters
     - Returns the rightmost numeric value in the matched row
+
+    For several fields, build the index once with ``extract_fields`` instead.
+    """
+    return LabelIndex.from_dataframe(df).lookup(keywords)
+
+
+
+def _wants_json(request):
+    return request.GET.get("format") == "json" or "application/json" in request.headers.get("Accept", "")
+
+
+def _result_context(record, financial_score, details):
+    """Context for result_card.html."""
+    with stage("peer_rank"):
+        standing = peer_standing(financial_score)
+    with stage("history"):
+        deltas = ratio_deltas(record)
+    with stage("llm_schedule"):
+        # Only looks up the cache / queues the call; never waits for the model
+        llm_status, _ = llm_advice(details["ratios"], financial_score.category)
+    return {
+        "company": record.company_name,
+        "period": record.period,
+        "income": record.total_income,
+        "gross_profit": record.gross_profit,
+        "admin_exp": record.admin_expenses,
+        "dist_exp": record.distribution_costs,
+        "finance_exp": record.finance_costs,
+        "net_profit": record.net_profit,
+        "score": financial_score.weighted_score,
+        "category": financial_score.category,
+        "ml_score": financial_score.ml_score,
+        "ml_model_version": financial_score.ml_model_version,
+        "contributions": details["contributions"],
+        "ratios": details["ratios"],
+        "advisory": details["advisory"],
+        "peer_standing": [(metric.replace("_", " ").title(), standing[metric]) for metric in RANKED_METRICS],
+        "peer_counts": {"all": percentile_index.count(), "period": percentile_index.count(period=record.period)},
+        "growth_source": record.get_growth_source_display(),
+        "deltas": deltas,
+        "llm_advice_url": reverse("llm_advice", args=[record.id]) if llm_status != DISABLED else None,
+        "whatif_url": reverse("whatif_api", args=[record.id]),
+        "whatif_inputs": input_defaults(),
+    }
+
+
+# ───────────────────────────────────────────────────────────────
+# Chart Data (JSON, cached per data version, conditional GET)
+# ───────────────────────────────────────────────────────────────
+def _chart_etag(request, *args, **kwargs):
+    # Cache-only lookup: a matching If-None-Match is answered with 304 before any query
+    return data_version()
+
+
+def _chart_json(name, params, build):
+    response = HttpResponse(cached_payload(name, params, build), content_type="application/json")
+    # Browsers may keep the body but must revalidate; unchanged data costs a 304
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@instrument("chart_distribution")
+@condition(etag_func=_chart_etag)
+def chart_distribution(request):
+    period = request.GET.get("period", "").strip() or None
+    bins = min(max(parse_int(request.GET.get("bins")) or 10, 1), 50)
+    return _chart_json("distribution", {"period": period, "bins": bins}, lambda: score_distribution(period, bins))
+
+
+@instrument("chart_categories")
+@condition(etag_func=_chart_etag)
+def chart_categories(request):
+    limit = min(max(parse_int(request.GET.get("limit")) or 24, 1), 120)
+    return _chart_json("categories", {"limit": limit}, lambda: category_mix(limit))
+
+
+@instrument("chart_company")
+@condition(etag_func=_chart_etag)
+def chart_company(request):
+    company = request.GET.get("company", "").strip()
+    return _chart_json("company", {"company": company}, lambda: company_series(company))
+
+
+@instrument("export_scores")
+def export_scores(request):
     """
-    import re
+    Every record and score matching the dashboard filters, streamed as CSV
+    (default) or XLSX (``?format=xlsx``), whatever the number of rows.
+    """
+    fmt = request.GET.get("format", CSV).strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown export format; use one of {', '.join(EXPORT_FORMATS)}.")
+    chunks, content_type = export_stream(request.GET, fmt)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{export_filename(fmt)}"'
+    return response
+
 
-    # Clean DataFrame text
-    df_clean = df.copy().astype(str).applymap(lambda x: x.strip().replace("\u00A0", " ").lower() if pd.notna(x) else "")
+@instrument("upload_pnl")
+def upload_pnl(request):
+    if request.method == "POST":
+        try:
+            file = request.FILES["file"]
+            company = request.POST.get("company_name", "Unknown")
+            period = request.POST.get("period", "N/A")
+            observe_upload(size_bytes=file.size)
+
+            # --- Multi-sheet mode: one record per P&L sheet, sheets parsed in parallel ---
+            if request.POST.get("all_sheets"):
+                with stage("sheets"):
+                    report = ingest_sheets(file.name, file.read(), company, period)
+                ok_count = sum(1 for r in report if r["status"] == "ok")
+                if not ok_count:
+                    return render(request, "analysis/upload.html", {
+                        "error": "No sheet has P&L figures like 'Total Income' and 'Gross Profit'.",
+                        "report": report,
+                    })
+                return render(request, "analysis/upload.html", {"report": report, "ok_count": ok_count})
+
+            # --- Background mode: store the file and return a job id ---
+            if request.POST.get("async"):
+                job = enqueue_upload(file, company, period, digest=upload_digest(request, "file"))
+                status_url = reverse("upload_job", args=[job.id])
+                if _wants_json(request):
+                    return JsonResponse({"job_id": str(job.id), "status": job.status, "status_url": status_url},
+                                        status=202)
+                return redirect(status_url)
+
+            # --- Extract, score and save (identical re-uploads skip parsing) ---
+            try:
+                record, financial_score, details = process_upload(file, company, period,
+                                                                  digest=upload_digest(request, "file"))
+            except IngestError as e:
+                return render(request, "analysis/upload.html", {"error": str(e)})
+
+            context = _result_context(record, financial_score, details)
+
+            with stage("render"):
+                return render(request, "analysis/result_card.html", context)
+
+        except Exception as e:
+            return render(request, "analysis/upload.html", {"error": f"Error: {e}"})
 
-    for keyword in keywords:
-        # Flexible regex for partial matches (handles missing or extra spaces)
-        pattern = re.compile(keyword.lower().replace(" ", ".*"))
+    return render(request, "analysis/upload.html")
 
-        # Find any row containing the keyword in any column
-        mask = df_clean.apply(lambda col: col.apply(lambda cell: bool(pattern.search(cell))))
-        matched_rows = df[mask.any(axis=1)]
 
-        if not matched_rows.empty:
-            # Take the first match
-            row = matched_rows.iloc[0]
 
-            # Extract all numeric values from the row
-            numeric_values = pd.to_numeric(row, errors="coerce")
-            valid_nums = numeric_values[numeric_values.notna()]
+def bulk_upload(request):
+    """Score a ZIP (or several files) of P&L workbooks in one request."""
+    if request.method == "POST":
+        files = request.FILES.getlist("files")
+        if not files:
+            return render(request, "analysis/bulk_upload.html", {"error": "Please choose a ZIP or workbook files."})
+        try:
+            sources = [source for f in files for source in iter_sources(f)]
+            max_files = getattr(settings, "ANALYSIS_BULK_MAX_FILES", 1000)
+            if len(sources) > max_files:
+                return render(request, "analysis/bulk_upload.html", {
+                    "error": f"Too many workbooks ({len(sources)}); the limit is {max_files}."
+                })
+            report = ingest_sources(sources, period=request.POST.get("period") or "N/A")
+        except Exception as e:
+            return render(request, "analysis/bulk_upload.html", {"error": f"Error: {e}"})
 
-            if not valid_nums.empty:
-                # Return the last (rightmost) numeric value
-                return float(valid_nums.iloc[-1])
+        return render(request, "analysis/bulk_upload.html", {
+            "report": report,
+            "ok_count": sum(1 for r in report if r["status"] == "ok"),
+        })
 
-    # Nothing found
-    return 0.0
+    return render(request, "analysis/bulk_upload.html")
 
 
+def upload_job(request, job_id):
+    """Status of a background upload job (JSON for API clients, a polling page otherwise)."""
+    job = get_object_or_404(UploadJob, pk=job_id)
+    if _wants_json(request):
+        data = {"job_id": str(job.id), "status": job.status, "error": job.error or None}
+        if job.status == UploadJob.DONE:
+            data["result_url"] = reverse("upload_job_result", args=[job.id])
+            data["record_id"] = job.record_id
+        return JsonResponse(data)
+    return render(request, "analysis/upload_job.html", {"job": job})
 
-def upload_pnl(request):
-    if request.method == "POST":
-        try:
-            file = request.FILES["file"]
-            df = pd.read_excel(file, header=None)
-            company = request.POST.get("company_name", "Unknown")
-            period = request.POST.get("period", "N/A")
 
-            # --- Extract key metrics dynamically ---
-            total_income = get_value_anywhere(df, ["Total Income", "Total Revenue", "Income"])
-            gross_profit = get_value_anywhere(df, ["Gross Profit"])
-            admin_expenses = get_value_anywhere(df, ["Total ADMINISTRATIVE EXPENSES", "Administrative Expenses", "Administration"])
-            distribution_costs = get_value_anywhere(df, ["Total DISTRIBUTION COSTS", "Distribution Costs", "Selling & Distribution"])
-            finance_costs = get_value_anywhere(df, ["Total FINANCE AND OTHER", "Finance Costs", "Financial Expenses", "Interest"])
-            growth_rate = get_value_anywhere(df, ["Revenue Growth", "Growth Rate"])
-
-            # --- Validate essential fields ---
-            if total_income == 0 or gross_profit == 0:
-                return render(request, "analysis/upload.html", {
-                    "error": "Missing key fields like 'Total Income' or 'Gross Profit'."
-                })
+def upload_job_result(request, job_id):
+    job = get_object_or_404(UploadJob.objects.select_related("record__financialscore"), pk=job_id)
+    if job.status != UploadJob.DONE or job.record is None:
+        return redirect("upload_job", job_id=job.id)
+    financial_score = job.record.financialscore
+    context = _result_context(job.record, financial_score, describe_result(job.record, financial_score))
+    return render(request, "analysis/result_card.html", context)
 
-            # --- Compute derived metric ---
-            net_profit = gross_profit - (admin_expenses + distribution_costs + finance_costs)
-
-            # --- Save financial record ---
-            record = FinancialRecord.objects.create(
-                company_name=company,
-                period=period,
-                total_income=total_income,
-                gross_profit=gross_profit,
-                admin_expenses=admin_expenses,
-                distribution_costs=distribution_costs,
-                finance_costs=finance_costs,
-                net_profit=net_profit,
-                revenue_growth_rate=growth_rate or 0
-            )
-
-            # --- Weighted score calculation ---
-            score, category, suggestion, contributions = calculate_weighted_score(record)
-
-            # --- Ratios dictionary ---
-            ratios = {
-                "net_profit_margin": (record.net_profit / record.total_income) * 100,
-                "expense_ratio": ((record.admin_expenses + record.distribution_costs + record.finance_costs) / record.total_income) * 100,
-                "gross_profit_margin": (record.gross_profit / record.total_income) * 100,
-                "finance_cost_ratio": (record.finance_costs / record.total_income) * 100,
-                "revenue_growth_rate": record.revenue_growth_rate or 0
-            }
-
-            # --- Generate rule-based advice ---
-            advisory = generate_rule_based_advice(ratios, category)
-
-            # --- Save financial score ---
-            FinancialScore.objects.create(
-                record=record,
-                net_profit_margin=ratios["net_profit_margin"],
-                expense_ratio=ratios["expense_ratio"],
-                gross_profit_margin=ratios["gross_profit_margin"],
-                finance_cost_ratio=ratios["finance_cost_ratio"],
-                weighted_score=score,
-                category=category,
-                suggestion=advisory
-            )
-
-            # --- Prepare context for result page ---
-            context = {
-                "company": company,
-                "period": period,
-                "income": total_income,
-                "gross_profit": gross_profit,
-                "admin_exp": admin_expenses,
-                "dist_exp": distribution_costs,
-                "finance_exp": finance_costs,
-                "net_profit": net_profit,
-                "score": score,
-                "category": category,
-                "contributions": contributions,
-                "ratios": ratios,
-                "advisory": advisory
-            }
-
-            return render(request, "analysis/result_card.html", context)
 
-        except Exception as e:
-            return render(request, "analysis/upload.html", {"error": f"Error: {e}"})
+def metrics(request):
+    """Latency histograms and upload counters of this process, in Prometheus text format."""
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
-    return render(request, "analysis/upload.html")
 
+def llm_advice_status(request, record_id):
+    """
+    Poll target for the result card: the LLM report once it is ready,
+    otherwise the status with the rule-based report to show meanwhile.
+    """
+    from .models import FinancialScore
+    financial_score = get_object_or_404(FinancialScore.objects.select_related("record"), record_id=record_id)
+    status, text = llm_advice(financial_score.advice_ratios(), financial_score.category)
+    return JsonResponse({"status": status, "advice": text if status == READY else financial_score.advice})
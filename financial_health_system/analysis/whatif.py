@@ -0,0 +1,230 @@
+# analysis/whatif.py
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .utils import BatchScores, calculate_weighted_scores, ratios_from_figures
+
+INPUTS = ("total_income", "gross_profit", "admin_expenses", "distribution_costs", "finance_costs",
+          "revenue_growth_rate")
+
+# revenue_growth_rate moves in percentage points; every other input in percent of its current value
+POINT_INPUTS = ("revenue_growth_rate",)
+
+CATEGORY_ORDER = ("Low", "Medium", "High")
+
+# Used when a request gives no ranges: 9 steps each → 6561 scenarios
+DEFAULT_RANGES = {
+    "total_income": (-20.0, 20.0, 9),
+    "admin_expenses": (-20.0, 20.0, 9),
+    "distribution_costs": (-20.0, 20.0, 9),
+    "finance_costs": (-20.0, 20.0, 9),
+}
+DEFAULT_STEPS = 9
+MAX_STEPS = 101
+
+# Central-difference half-width for sensitivities, in the input's unit
+SENSITIVITY_STEP = 10.0
+# Resolution of the single-input threshold search, in the input's unit (coarser for very wide ranges)
+SEARCH_STEP = 0.5
+SEARCH_MAX_POINTS = 2000
+
+
+def _max_scenarios() -> int:
+    return getattr(settings, "ANALYSIS_WHATIF_MAX_SCENARIOS", 50000)
+
+
+def unit(field: str) -> str:
+    return "pp" if field in POINT_INPUTS else "%"
+
+
+def input_defaults() -> List[dict]:
+    """One row per input for the what-if form; inputs without a default range start fixed at 0."""
+    rows = []
+    for field in INPUTS:
+        low, high, steps = DEFAULT_RANGES.get(field, (0.0, 0.0, 1))
+        rows.append({"field": field, "label": field.replace("_", " ").title(), "unit": unit(field),
+                     "min": low, "max": high, "steps": steps})
+    return rows
+
+
+# ───────────────────────────────────────────────────────────────
+# Ranges and Scenario Figures
+# ───────────────────────────────────────────────────────────────
+def parse_ranges(ranges) -> Dict[str, Tuple[float, float, int]]:
+    """
+    ``{"admin_expenses": {"min": -20, "max": 0, "steps": 5}, ...}`` (or
+    ``[min, max]`` / ``[min, max, steps]``) → {field: (min, max, steps)}.
+    Empty or missing ranges fall back to DEFAULT_RANGES. Raises ValueError.
+    """
+    if not ranges:
+        return dict(DEFAULT_RANGES)
+    if not isinstance(ranges, dict):
+        raise ValueError("ranges must be an object keyed by input name")
+
+    parsed = {}
+    for field, spec in ranges.items():
+        if field not in INPUTS:
+            raise ValueError(f"Unknown input {field!r}; use one of {', '.join(INPUTS)}")
+        if isinstance(spec, dict):
+            spec = (spec.get("min"), spec.get("max"), spec.get("steps", DEFAULT_STEPS))
+        if not isinstance(spec, (list, tuple)) or len(spec) not in (2, 3):
+            raise ValueError(f"ranges.{field} must be {{min, max, steps}} or [min, max, steps]")
+        low, high, steps = (*spec, DEFAULT_STEPS)[:3]
+        if any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in (low, high)):
+            raise ValueError(f"ranges.{field}: min and max must be numbers")
+        if isinstance(steps, bool) or not isinstance(steps, int) or not 1 <= steps <= MAX_STEPS:
+            raise ValueError(f"ranges.{field}.steps must be an integer from 1 to {MAX_STEPS}")
+        if low > high:
+            raise ValueError(f"ranges.{field}: min is above max")
+        if field not in POINT_INPUTS and low < -100:
+            raise ValueError(f"ranges.{field}: a figure cannot drop by more than 100%")
+        parsed[field] = (float(low), float(high), 1 if low == high else steps)
+
+    total = int(np.prod([steps for _, _, steps in parsed.values()]))
+    if total > _max_scenarios():
+        raise ValueError(f"{total} scenarios requested; at most {_max_scenarios()} per request")
+    return parsed
+
+
+def baseline_figures(record) -> Dict[str, float]:
+    return {field: float(getattr(record, field) or 0.0) for field in (*INPUTS, "net_profit")}
+
+
+def score_changes(base: Dict[str, float], changes: Dict[str, np.ndarray], size: int) -> BatchScores:
+    """Score ``size`` scenarios at once; ``changes`` maps inputs to per-scenario changes (others unchanged)."""
+    figures = {}
+    for field in INPUTS:
+        change = np.broadcast_to(np.asarray(changes.get(field, 0.0), dtype=float), (size,))
+        figures[field] = base[field] + change if field in POINT_INPUTS else base[field] * (1 + change / 100)
+    # Stored net profit moved by the gross profit and cost changes (exact when nothing changes)
+    net_profit = base["net_profit"] + (figures["gross_profit"] - base["gross_profit"]) - sum(
+        figures[field] - base[field] for field in ("admin_expenses", "distribution_costs", "finance_costs"))
+    ratios = ratios_from_figures(figures["total_income"], figures["gross_profit"], figures["admin_expenses"],
+                                 figures["distribution_costs"], figures["finance_costs"], net_profit,
+                                 figures["revenue_growth_rate"])
+    return calculate_weighted_scores(ratios)
+
+
+def _one_at_a_time(axes: Dict[str, np.ndarray]) -> Tuple[Dict[str, np.ndarray], List[Tuple[str, int, int]], int]:
+    """Stack per-input sweeps (others at baseline) into one batch; returns changes, (field, start, stop), size."""
+    size = sum(len(values) for values in axes.values())
+    changes = {field: np.zeros(size) for field in axes}
+    spans, start = [], 0
+    for field, values in axes.items():
+        changes[field][start:start + len(values)] = values
+        spans.append((field, start, start + len(values)))
+        start += len(values)
+    return changes, spans, size
+
+
+# ───────────────────────────────────────────────────────────────
+# Simulation
+# ───────────────────────────────────────────────────────────────
+def _sensitivities(base, ranges) -> List[dict]:
+    """Score points per unit change of each input (central difference), plus the score at each range end."""
+    axes = {field: np.array([-SENSITIVITY_STEP, SENSITIVITY_STEP]) for field in INPUTS}
+    for field, (low, high, _) in ranges.items():
+        axes[field] = np.array([-SENSITIVITY_STEP, SENSITIVITY_STEP, low, high])
+    changes, spans, size = _one_at_a_time(axes)
+    scores = score_changes(base, changes, size).scores
+
+    rows = []
+    for field, start, stop in spans:
+        values = scores[start:stop]
+        row = {"input": field, "unit": unit(field),
+               "points_per_unit": round(float(values[1] - values[0]) / (2 * SENSITIVITY_STEP), 4)}
+        if field in ranges:
+            row["score_at_min"], row["score_at_max"] = float(values[2]), float(values[3])
+        rows.append(row)
+    return sorted(rows, key=lambda row: -abs(row["points_per_unit"]))
+
+
+def _single_input_crossings(base, ranges, targets) -> Dict[str, Dict[str, float]]:
+    """For each target category, the smallest change of one input alone (within its range) that reaches it."""
+    axes = {}
+    for field, (low, high, _) in ranges.items():
+        step = max(SEARCH_STEP, (high - low) / SEARCH_MAX_POINTS)
+        values = np.union1d(np.arange(low, high + step / 2, step), [low, high])
+        axes[field] = values[(values >= low) & (values <= high)]
+    changes, spans, size = _one_at_a_time(axes)
+    categories = score_changes(base, changes, size).categories
+
+    found = {target: {} for target in targets}
+    for field, start, stop in spans:
+        values = axes[field]
+        for target in targets:
+            hits = np.flatnonzero(categories[start:stop] == target)
+            if len(hits):
+                found[target][field] = float(values[hits[np.argmin(np.abs(values[hits]))]])
+    return found
+
+
+def _scenario(fields, grid_changes, batch, index) -> dict:
+    return {
+        "changes": {field: float(grid_changes[field][index]) for field in fields},
+        "score": float(batch.scores[index]),
+        "category": str(batch.categories[index]),
+    }
+
+
+def simulate(record, ranges=None, include_grid: bool = False) -> dict:
+    """
+    Score every combination of the requested input changes for one record
+    in a single vectorized pass through calculate_weighted_scores.
+    Returns the baseline, the grid's score spread and category counts, the
+    sensitivity of the score to each input, and for every other category
+    the smallest changes (one input alone, or a grid combination with the
+    least total change) that move the record into it.
+    """
+    ranges = parse_ranges(ranges)
+    base = baseline_figures(record)
+    baseline = score_changes(base, {}, 1)
+    baseline_category = str(baseline.categories[0])
+
+    fields = list(ranges)
+    axes = [np.linspace(low, high, steps) for low, high, steps in ranges.values()]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    grid_changes = {field: values.ravel() for field, values in zip(fields, mesh)}
+    size = int(mesh[0].size)
+    batch = score_changes(base, grid_changes, size)
+
+    # Least total change, measured in each input's own unit
+    effort = np.sum([np.abs(values) for values in grid_changes.values()], axis=0)
+    targets = [category for category in CATEGORY_ORDER if category != baseline_category]
+    single = _single_input_crossings(base, ranges, targets)
+    crossings = []
+    for target in targets:
+        hits = np.flatnonzero(batch.categories == target)
+        combined: Optional[dict] = None
+        if len(hits):
+            combined = _scenario(fields, grid_changes, batch, hits[np.argmin(effort[hits])])
+        crossings.append({
+            "category": target,
+            "direction": "up" if CATEGORY_ORDER.index(target) > CATEGORY_ORDER.index(baseline_category) else "down",
+            "single_input": single[target],
+            "combined": combined,
+        })
+
+    result = {
+        "record_id": record.pk,
+        "baseline": {"score": float(baseline.scores[0]), "category": baseline_category},
+        "ranges": {field: {"min": low, "max": high, "steps": steps, "unit": unit(field)}
+                   for field, (low, high, steps) in ranges.items()},
+        "scenarios": size,
+        "score_min": float(batch.scores.min()),
+        "score_max": float(batch.scores.max()),
+        "categories": {category: int(np.count_nonzero(batch.categories == category)) for category in CATEGORY_ORDER},
+        "best": _scenario(fields, grid_changes, batch, int(np.argmax(batch.scores))),
+        "worst": _scenario(fields, grid_changes, batch, int(np.argmin(batch.scores))),
+        "sensitivity": _sensitivities(base, ranges),
+        "crossings": crossings,
+    }
+    if include_grid:
+        result["grid"] = {
+            "changes": {field: values.tolist() for field, values in grid_changes.items()},
+            "scores": batch.scores.tolist(),
+            "categories": batch.categories.tolist(),
+        }
+    return result
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -73,13 +76,69 @@ WSGI_APPLICATION = "financial_health_system.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+#
+# ANALYSIS_DATABASE picks the profile:
+#   "sqlite"   - db.sqlite3 tuned for several upload workers writing at once.
+#                WAL lets readers run alongside the one writer; busy_timeout
+#                makes a writer wait for the lock instead of failing with
+#                "database is locked"; IMMEDIATE transactions take the write
+#                lock up front, so two workers never deadlock upgrading a
+#                read lock. Tests use a file database so WAL applies there too.
+#   "postgres" - PostgreSQL through psycopg's connection pool (pip install
+#                "psycopg[binary,pool]"), configured by the POSTGRES_* variables.
+#                Pooled connections replace CONN_MAX_AGE, which must stay 0.
+#
+# The connection pool and SQLite's transaction_mode need Django 5.1+; on
+# older versions both profiles fall back to persistent connections and
+# DEFERRED transactions (busy_timeout still keeps writers from failing).
+
+ANALYSIS_DATABASE = os.environ.get("ANALYSIS_DATABASE", "sqlite")
+
+# Run on every new SQLite connection: through init_command on Django 5.1+,
+# otherwise by the connection_created hook in analysis.apps.
+ANALYSIS_SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+]
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+if ANALYSIS_DATABASE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "financial_health"),
+            "USER": os.environ.get("POSTGRES_USER", "postgres"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": 0,
+            "OPTIONS": {},
+        }
+    }
+    if django.VERSION >= (5, 1):
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": 2,
+            "max_size": int(os.environ.get("POSTGRES_POOL_SIZE", "20")),
+            "timeout": 10,
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = 600
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "CONN_MAX_AGE": 600,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {"timeout": 20},
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
     }
-}
+    if django.VERSION >= (5, 1):
+        DATABASES["default"]["OPTIONS"].update(init_command=";".join(ANALYSIS_SQLITE_PRAGMAS),
+                                               transaction_mode="IMMEDIATE")
 
 
 # Password validation
@@ -118,7 +177,109 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Uploaded files (background upload jobs are stored here until processed)
+
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Analysis app
+# Read .xlsx uploads row by row (openpyxl read-only) and stop once every
+# P&L field is found, instead of loading the whole sheet with pandas.
+
+ANALYSIS_STREAMING_EXTRACTION = True
+
+# Hash uploads as they stream in so re-uploaded workbooks are recognised
+# without parsing them again.
+
+FILE_UPLOAD_HANDLERS = [
+    "analysis.uploads.HashingUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+# What upload_pnl does with a workbook identical to an earlier one:
+#   "reuse" - show the existing record and score, create nothing, when the
+#             submitted company and period match it; otherwise as "copy"
+#   "copy"  - create a new record/score (with the submitted company and
+#             period) from the cached figures, still without parsing
+
+ANALYSIS_DUPLICATE_UPLOAD_POLICY = "reuse"
+
+# Bulk ingestion: worker processes for parsing (None = one per CPU core) and
+# the most workbooks accepted in a single bulk upload.
+
+ANALYSIS_BULK_WORKERS = None
+
+ANALYSIS_BULK_MAX_FILES = 1000
+
+# Background uploads: threads in each web process that drain the job queue
+# right after a job is queued. 0 leaves jobs to `manage.py run_upload_worker`.
+
+ANALYSIS_JOB_INPROCESS_WORKERS = 0
+
+# Most items accepted in one /api/score/ request.
+
+ANALYSIS_API_MAX_BATCH = 10000
+
+# /api/score/ only saves items ("persist": true) for requests carrying
+# "Authorization: Bearer <token>" with this token; None refuses every persist.
+
+ANALYSIS_API_TOKEN = os.environ.get("ANALYSIS_API_TOKEN") or None
+
+# Most scenarios (product of the range steps) scored in one /api/whatif/ request.
+
+ANALYSIS_WHATIF_MAX_SCENARIOS = 50000
+
+# Trained model (analysis/ml/model_training.py output) used for ml_score.
+# Loaded lazily once per worker process; the file is re-checked at most every
+# ANALYSIS_ML_RELOAD_INTERVAL seconds and reloaded in place when it changes.
+# Without the file, ml_score is left empty.
+
+ANALYSIS_ML_MODEL_PATH = BASE_DIR / "financial_health_model.pkl"
+
+ANALYSIS_ML_RELOAD_INTERVAL = 5.0
+
+# Per-stage latency histograms are always collected (per process) and served
+# at /metrics. Requests slower than this many seconds are also logged with
+# their stage breakdown to the "analysis.slow_requests" logger; None = off.
+
+ANALYSIS_SLOW_REQUEST_SECONDS = None
+
+# Peer percentiles come from sorted in-memory arrays built from FinancialScore
+# on first use and topped up with newly uploaded rows by the first query after
+# the data version (see ANALYSIS_CHART_CACHE_SECONDS) moves; with a
+# per-process cache, other processes' uploads wait for the rebuild. Values
+# changed in place (manage.py rescore) show up after this many seconds, when a
+# background thread rebuilds the arrays and swaps them in; 0 turns that off.
+
+ANALYSIS_PERCENTILE_REBUILD_SECONDS = 3600
+
+# Dashboard chart JSON (/charts/...) is cached per data version, a token in
+# the default cache that changes whenever scores are added, rescored or
+# deleted; it doubles as the ETag, so polling clients get 304s. With several
+# processes and a per-process cache (the default LocMemCache), a process may
+# serve data up to this many seconds old; use a shared cache to avoid that.
+
+ANALYSIS_CHART_CACHE_SECONDS = 300
+
+# Latest periods kept per company for rolling trend figures (CompanyTrend.recent).
+
+ANALYSIS_TREND_WINDOW = 4
+
+# Optional LLM insights on the result card, generated off the request path
+# (see analysis/advice.py for every key and its default). None = off. E.g.
+# ANALYSIS_LLM_ADVICE = {
+#     "BASE_URL": "https://api.openai.com/v1",  # any OpenAI-compatible server
+#     "MODEL": "gpt-3.5-turbo",
+#     "API_KEY_ENV": "OPENAI_API_KEY",
+#     "TIMEOUT": 10.0, "RETRIES": 2, "MAX_CONCURRENCY": 4,
+# }
+# Answers are cached in the default Django cache; use a shared cache
+# (Redis, Memcached, database) when running several worker processes.
+
+ANALYSIS_LLM_ADVICE = None